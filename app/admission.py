@@ -0,0 +1,132 @@
+"""Contrôle d'admission : limitation de débit par client et délestage.
+
+Chaque requête reçoit une classe de priorité (request_priority) :
+- critical : sondes et métriques (/livez, /readyz, /health, /metrics),
+  toujours servies, ni limitées ni comptées ;
+- read : consultations (GET, HEAD) ;
+- write : modifications, y compris /complete/<id> et /delete/<id>.
+
+RateLimiter limite le débit de chaque adresse IP (seau à jetons) et répond
+429. LoadShedder borne les requêtes en cours dans le worker et répond 503 :
+les écritures, qui attendent le verrou d'écriture SQLite, sont limitées à
+LOAD_SHED_MAX_WRITES et cèdent la place aux lectures ; avec
+LOAD_SHED_MAX_CONCURRENT inférieur à WEB_THREADS, un thread reste toujours
+libre pour les sondes, qui ne dépassent donc pas le délai du healthcheck.
+Le délestage est activé par LOAD_SHED_ENABLED ; ses limites par défaut
+supposent des workers gthread.
+
+Les compteurs sont propres à chaque worker : avec WEB_WORKERS processus, un
+client peut obtenir jusqu'à WEB_WORKERS fois RATE_LIMIT_PER_SECOND.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter, Gauge
+
+REQUESTS_SHED = Counter(
+    'requests_shed_total', 'Requêtes refusées par le contrôle d\'admission',
+    ['reason', 'priority'])
+REQUESTS_IN_FLIGHT = Gauge(
+    'requests_in_flight', 'Requêtes en cours admises par le délesteur', ['priority'],
+    multiprocess_mode='livesum')
+
+PRIORITIES = ('critical', 'read', 'write')
+CRITICAL_PATHS = frozenset(['/livez', '/readyz', '/health', '/metrics'])
+READ_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+# Routes GET qui modifient les tâches (liens de la page d'accueil)
+WRITE_ENDPOINTS = frozenset(['complete_task', 'delete_task'])
+
+
+def request_priority(request):
+    """Classe de priorité d'une requête Flask"""
+    if request.path in CRITICAL_PATHS:
+        return 'critical'
+    if request.method in READ_METHODS and request.endpoint not in WRITE_ENDPOINTS:
+        return 'read'
+    return 'write'
+
+
+class RateLimiter:
+    """Seau à jetons par client : `rate` requêtes par seconde, rafales de `burst`.
+
+    Les seaux des `max_clients` clients les plus récents sont conservés ;
+    un client oublié retrouve un seau plein.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_clients = max_clients
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Consomme un jeton ; retourne 0 si admis, sinon le délai d'attente (s)"""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class LoadShedder:
+    """Borne les requêtes en cours du worker, par classe de priorité.
+
+    Une lecture est admise tant que moins de `max_concurrent` requêtes
+    (lectures et écritures) sont en cours ; une écriture doit en outre
+    trouver moins de `max_writes` écritures en cours. Les requêtes critiques
+    sont toujours admises.
+    """
+
+    def __init__(self, max_concurrent, max_writes):
+        self.max_concurrent = max_concurrent
+        self.max_writes = min(max_writes, max_concurrent)
+        self._in_flight = {'read': 0, 'write': 0}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, priority):
+        """Réserve une place pour `priority` ; False si la requête est délestée"""
+        if priority == 'critical':
+            return True
+        with self._lock:
+            in_flight = self._in_flight
+            if in_flight['read'] + in_flight['write'] >= self.max_concurrent:
+                return False
+            if priority == 'write' and in_flight['write'] >= self.max_writes:
+                return False
+            in_flight[priority] += 1
+        REQUESTS_IN_FLIGHT.labels(priority).inc()
+        return True
+
+    def release(self, priority):
+        if priority == 'critical':
+            return
+        with self._lock:
+            self._in_flight[priority] -= 1
+        REQUESTS_IN_FLIGHT.labels(priority).dec()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._in_flight)
+        stats['max_concurrent'] = self.max_concurrent
+        stats['max_writes'] = self.max_writes
+        return stats
+
+
+def retry_after(seconds):
+    """Valeur de l'en-tête Retry-After (secondes entières, au moins 1)"""
+    return str(max(1, int(math.ceil(seconds))))
@@ -0,0 +1,278 @@
+"""API JSON des tâches (/api/tasks)"""
+import gzip
+import json
+
+from flask import request, url_for
+from werkzeug.http import generate_etag
+
+try:
+    from .cache import load_task_page
+    from .validation import clean_task, get_page_args, get_search_args
+except ImportError:
+    from cache import load_task_page
+    from validation import clean_task, get_page_args, get_search_args
+
+TASK_FIELDS = ('id', 'task', 'completed')
+
+
+def task_to_dict(row, fields=TASK_FIELDS):
+    """Représentation JSON d'une ligne (id, task, completed)"""
+    task = {'id': row[0], 'task': row[1], 'completed': bool(row[2])}
+    return {field: task[field] for field in fields}
+
+
+def get_fields():
+    """Champs demandés via ?fields=id,task ; ValueError si inconnus"""
+    value = request.args.get('fields')
+    if not value:
+        return TASK_FIELDS
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    unknown = set(fields) - set(TASK_FIELDS)
+    if unknown or not fields:
+        raise ValueError('Champs inconnus: {}'.format(', '.join(sorted(unknown))))
+    return fields
+
+
+def json_response(app, payload, status=200):
+    """Réponse JSON compacte, compressée en gzip si le client l'accepte.
+
+    Les réponses 200 portent un ETag calculé sur le JSON non compressé
+    (suffixé de -gzip pour la variante compressée) et répondent 304 à un
+    If-None-Match correspondant.
+    """
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+    etag = generate_etag(body)
+
+    response = app.response_class(status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) >= app.config['API_GZIP_MIN_SIZE'] and 'gzip' in request.accept_encodings:
+        body = gzip.compress(body, compresslevel=app.config['API_GZIP_LEVEL'])
+        response.headers['Content-Encoding'] = 'gzip'
+        etag += '-gzip'
+    response.set_data(body)
+
+    if status == 200:
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    return response
+
+
+def error_response(app, message, status):
+    return json_response(app, {'error': message}, status)
+
+
+def precondition_failed(row):
+    """Vrai si If-Match ne correspond pas à la version actuelle de la tâche"""
+    if not request.if_match:
+        return False
+    body = json.dumps(task_to_dict(row), separators=(',', ':'), ensure_ascii=False).encode()
+    etag = generate_etag(body)
+    return not (request.if_match.contains(etag) or request.if_match.contains(etag + '-gzip'))
+
+
+def expected_version(row):
+    """Version à vérifier par l'écriture : la ligne lue si If-Match est présent"""
+    return row if request.if_match else None
+
+
+def write_conflict(app):
+    """Réponse à une écriture qui n'a modifié aucune ligne.
+
+    Avec If-Match, la tâche a changé (ou disparu) depuis sa lecture : 412 ;
+    sinon elle a été supprimée entre-temps : 404.
+    """
+    if request.if_match:
+        return error_response(app, 'La tâche a été modifiée entre-temps', 412)
+    return error_response(app, 'Tâche introuvable', 404)
+
+
+def read_patch(payload):
+    """Valide le corps d'un PATCH ; retourne les colonnes à modifier"""
+    if not isinstance(payload, dict) or not payload:
+        raise ValueError('Le corps doit être un objet JSON non vide')
+    changes = {}
+    for field, value in payload.items():
+        if field == 'completed' and isinstance(value, bool):
+            changes['completed'] = value
+        elif field == 'task' and clean_task(value) is not None:
+            changes['task'] = clean_task(value)
+        else:
+            raise ValueError('Champ invalide: {}'.format(field))
+    return changes
+
+
+def create_api_list_routes(app, repository, cache):
+    """Crée les routes de collection /api/tasks"""
+    @app.route('/api/tasks', methods=['GET'])
+    def api_list_tasks():
+        try:
+            fields = get_fields()
+        except ValueError as e:
+            return error_response(app, str(e), 400)
+
+        try:
+            _, page = load_task_page(cache, repository, get_page_args(app))
+            return json_response(app, {
+                'tasks': [task_to_dict(row, fields) for row in page.tasks],
+                'next_after': page.tasks.next_after,
+            })
+        except Exception as e:
+            app.logger.error(
+                'Erreur API lors de la consultation des tâches: {}'.format(str(e)),
+                extra={'action': 'api_list_tasks_error'})
+            return error_response(app, 'Erreur lors du chargement des tâches', 500)
+
+    @app.route('/api/tasks', methods=['POST'])
+    def api_add_task():
+        payload = request.get_json(silent=True)
+        task = clean_task(payload.get('task') if isinstance(payload, dict) else None)
+        if task is None:
+            app.logger.warning('Tentative d\'ajout de tâche vide (API)', extra={
+                'action': 'api_add_task_empty',
+                'ip_address': request.remote_addr
+            })
+            return error_response(app, 'Le champ task est obligatoire', 400)
+
+        try:
+            task_id = repository.add(task)
+
+            app.logger.info('Nouvelle tâche ajoutée (API)', extra={
+                'action': 'api_add_task_success',
+                'task_id': task_id,
+                'ip_address': request.remote_addr
+            })
+
+            response = json_response(app, task_to_dict((task_id, task, False)), 201)
+            response.headers['Location'] = url_for('api_get_task', task_id=task_id)
+            return response
+        except Exception as e:
+            app.logger.error(
+                'Erreur API lors de l\'ajout de tâche: {}'.format(str(e)),
+                extra={'action': 'api_add_task_error'})
+            return error_response(app, "Erreur lors de l'ajout de la tâche", 500)
+
+
+def create_api_search_route(app, repository):
+    """Crée la route de recherche plein texte de l'API"""
+    @app.route('/api/tasks/search', methods=['GET'])
+    def api_search_tasks():
+        try:
+            fields = get_fields()
+        except ValueError as e:
+            return error_response(app, str(e), 400)
+
+        search_args = get_search_args(app)
+        if search_args.match is None:
+            return error_response(app, 'Le paramètre q est obligatoire', 400)
+
+        try:
+            tasks, next_offset = repository.search(search_args,
+                                                   app.config['SEARCH_RANK_WINDOW'])
+            return json_response(app, {
+                'tasks': [task_to_dict(row, fields) for row in tasks],
+                'next_offset': next_offset,
+            })
+        except Exception as e:
+            app.logger.error(
+                'Erreur API lors de la recherche de tâches: {}'.format(str(e)),
+                extra={'action': 'api_search_tasks_error'})
+            return error_response(app, 'Erreur lors de la recherche', 500)
+
+
+def create_api_get_route(app, repository):
+    """Crée la route de lecture d'une tâche"""
+    @app.route('/api/tasks/<int:task_id>', methods=['GET'])
+    def api_get_task(task_id):
+        try:
+            fields = get_fields()
+        except ValueError as e:
+            return error_response(app, str(e), 400)
+
+        try:
+            row = repository.get(task_id)
+        except Exception as e:
+            app.logger.error(
+                'Erreur API lors de la lecture de tâche: {}'.format(str(e)),
+                extra={'action': 'api_get_task_error', 'task_id': task_id})
+            return error_response(app, 'Erreur lors de la lecture de la tâche', 500)
+
+        if row is None:
+            return error_response(app, 'Tâche introuvable', 404)
+        return json_response(app, task_to_dict(row, fields))
+
+
+def create_api_update_route(app, repository):
+    """Crée la route de modification partielle d'une tâche"""
+    @app.route('/api/tasks/<int:task_id>', methods=['PATCH'])
+    def api_update_task(task_id):
+        try:
+            changes = read_patch(request.get_json(silent=True))
+        except ValueError as e:
+            return error_response(app, str(e), 400)
+
+        try:
+            row = repository.get(task_id)
+            if row is None:
+                return error_response(app, 'Tâche introuvable', 404)
+            if precondition_failed(row):
+                return error_response(app, 'La tâche a été modifiée entre-temps', 412)
+
+            # Version vérifiée de nouveau dans l'écriture : la tâche a pu
+            # changer depuis la lecture
+            row = repository.update(task_id, changes, expected_version(row))
+            if row is None:
+                return write_conflict(app)
+
+            app.logger.info('Tâche modifiée (API)', extra={
+                'action': 'api_update_task',
+                'task_id': task_id,
+                'ip_address': request.remote_addr
+            })
+
+            return json_response(app, task_to_dict(row))
+        except Exception as e:
+            app.logger.error(
+                'Erreur API lors de la modification de tâche: {}'.format(str(e)),
+                extra={'action': 'api_update_task_error', 'task_id': task_id})
+            return error_response(app, 'Erreur lors de la modification de la tâche', 500)
+
+
+def create_api_delete_route(app, repository):
+    """Crée la route de suppression d'une tâche"""
+    @app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
+    def api_delete_task(task_id):
+        try:
+            row = repository.get(task_id)
+            if row is None:
+                return error_response(app, 'Tâche introuvable', 404)
+            if precondition_failed(row):
+                return error_response(app, 'La tâche a été modifiée entre-temps', 412)
+
+            if not repository.delete(task_id, expected=expected_version(row)):
+                return write_conflict(app)
+
+            app.logger.info('Tâche supprimée (API)', extra={
+                'action': 'api_delete_task',
+                'task_id': task_id,
+                'ip_address': request.remote_addr
+            })
+
+            return '', 204
+        except Exception as e:
+            app.logger.error(
+                'Erreur API lors de la suppression de tâche: {}'.format(str(e)),
+                extra={'action': 'api_delete_task_error', 'task_id': task_id})
+            return error_response(app, 'Erreur lors de la suppression de la tâche', 500)
+
+
+def create_api_routes(app, repository, cache):
+    """Enregistre les routes de l'API JSON.
+
+    Leurs écritures attendent toujours la validation, même en mode
+    write-behind 'relaxed' : la réponse décrit l'état enregistré.
+    """
+    create_api_list_routes(app, repository, cache)
+    create_api_search_route(app, repository)
+    create_api_get_route(app, repository)
+    create_api_update_route(app, repository)
+    create_api_delete_route(app, repository)
@@ -1,38 +1,104 @@
-from flask import Flask, render_template, request, redirect, url_for
+from flask import (Flask, Response, g, has_app_context, make_response, render_template, request,
+                   redirect, url_for, stream_template)
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.http import generate_etag
+from logging.handlers import QueueHandler, QueueListener
+from prometheus_client import Counter
 from prometheus_flask_exporter import PrometheusMetrics
-import sqlite3
 import os
+import hmac
 import logging
 import json
+import queue
+import threading
+import atexit
+import itertools
+import time
+from collections import defaultdict
 from datetime import datetime
 
 try:
+    from .api import create_api_routes
+    from .cache import FragmentCache, TaskListCache, load_task_page
     from .config import config
+    from .db import ConnectionPool, tasks_changed
+    from .events import EventBroker, TooManyStreams
+    from .health import HealthChecker
+    from .instrumentation import (DB_ACQUIRE_SECONDS, RowCountGauge, time_logger, time_templates,
+                                  timed)
+    from .repository import STORAGE_BACKENDS, SQLiteTaskRepository
+    from .snapshot import create_snapshot_commands
+    from .transfer import create_transfer_commands, create_transfer_routes
+    from .validation import clean_task, clean_user_id, get_page_args, get_search_args
+    from .writer import WRITE_BEHIND_MODES, WriteBehindWriter
 except ImportError:
+    from api import create_api_routes
+    from cache import FragmentCache, TaskListCache, load_task_page
     from config import config
+    from db import ConnectionPool, tasks_changed
+    from events import EventBroker, TooManyStreams
+    from health import HealthChecker
+    from instrumentation import (DB_ACQUIRE_SECONDS, RowCountGauge, time_logger, time_templates,
+                                 timed)
+    from repository import STORAGE_BACKENDS, SQLiteTaskRepository
+    from snapshot import create_snapshot_commands
+    from transfer import create_transfer_commands, create_transfer_routes
+    from validation import clean_task, clean_user_id, get_page_args, get_search_args
+    from writer import WRITE_BEHIND_MODES, WriteBehindWriter
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total',
+    'Enregistrements de log perdus car la file de logs était pleine')
+LOG_RECORDS_SUPPRESSED = Counter(
+    'log_records_suppressed_total',
+    'Enregistrements de log écartés par échantillonnage', ['action'])
+
+
+def get_serializer(name='json'):
+    """Sérialiseur JSON des logs : 'json', 'orjson' ou 'auto'"""
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson':
+        if orjson is None:
+            raise ValueError('orjson n\'est pas installé')
+        return lambda entry: orjson.dumps(entry, default=str).decode()
+    return json.dumps
 
 
 class JSONFormatter(logging.Formatter):
+    EXTRA_FIELDS = ('user_id', 'task_id', 'action', 'sample_rate')
+
+    # Le pid ne change qu'au fork : inutile de le relire pour chaque
+    # enregistrement (voir logging.logProcesses dans configure_logging)
+    _process = os.getpid()
+
+    def __init__(self, serializer=None):
+        super().__init__()
+        self.serialize = serializer or json.dumps
+
     def format(self, record):
         log_entry = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.utcfromtimestamp(record.created).isoformat(),
             'level': record.levelname,
             'message': record.getMessage(),
             'module': record.module,
             'function': record.funcName,
             'line': record.lineno,
-            'process': record.process,
+            'process': record.process or JSONFormatter._process,
             'thread': record.thread
         }
 
-        if hasattr(record, 'user_id'):
-            log_entry['user_id'] = record.user_id
-        if hasattr(record, 'task_id'):
-            log_entry['task_id'] = record.task_id
-        if hasattr(record, 'action'):
-            log_entry['action'] = record.action
+        for field in self.EXTRA_FIELDS:
+            if hasattr(record, field):
+                log_entry[field] = getattr(record, field)
 
-        return json.dumps(log_entry)
+        return self.serialize(log_entry)
 
     def formatException(self, exc_info):
         result = super(JSONFormatter, self).formatException(exc_info)
@@ -43,19 +109,208 @@ class JSONFormatter(logging.Formatter):
             "message": f"{result}",
             "exception": True
         }
-        return json.dumps(json_result)
+        return self.serialize(json_result)
+
+
+def _reset_cached_pid():
+    JSONFormatter._process = os.getpid()
+
+
+os.register_at_fork(after_in_child=_reset_cached_pid)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Handler asynchrone : les enregistrements sont placés dans une file
+    bornée et formatés puis écrits par un thread QueueListener.
+
+    Quand la file est pleine, la politique 'drop' abandonne l'enregistrement
+    immédiatement ; 'block' attend au plus `timeout` secondes avant de
+    l'abandonner. Les pertes sont comptées dans `dropped`.
+    """
+
+    def __init__(self, handler, maxsize=10000, policy='drop', timeout=1.0):
+        if policy not in ('drop', 'block'):
+            raise ValueError('Politique de file de logs invalide: {}'.format(policy))
+        super().__init__(queue.Queue(maxsize))
+        self.handler = handler
+        self.policy = policy
+        self.timeout = timeout
+        self.dropped = 0
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._pid != os.getpid():
+                if self._pid is not None:
+                    # Le thread d'écoute du processus parent n'existe pas
+                    # dans un worker forké : nouvelle file, nouveau thread
+                    self.queue = queue.Queue(self.queue.maxsize)
+                self._pid = os.getpid()
+                self.listener = QueueListener(self.queue, self.handler,
+                                              respect_handler_level=True)
+                self.listener.start()
+
+    def stop(self):
+        """Vide la file puis arrête le thread d'écoute"""
+        with self._start_lock:
+            if self.listener is not None and self._pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self._pid = None
+
+    def close(self):
+        self.stop()
+        super().close()
+
+    def prepare(self, record):
+        # Pas de formatage dans le thread de la requête : le JSON est
+        # construit par le handler du thread d'écoute
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            if self.policy == 'block':
+                self.queue.put(record, timeout=self.timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+class SampleEvery:
+    """Garde un enregistrement sur `n`"""
+
+    def __init__(self, n):
+        self.rate = n
+        self._counter = itertools.count()
+
+    def allow(self):
+        return next(self._counter) % self.rate == 0
+
+
+class RateLimit:
+    """Garde au plus `per_second` enregistrements par seconde (seau à jetons)"""
+
+    def __init__(self, per_second):
+        self.per_second = per_second
+        self.rate = None
+        self._tokens = float(per_second)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.per_second,
+                               self._tokens + (now - self._updated) * self.per_second)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+def parse_sampling_rules(spec):
+    """Lit les règles d'échantillonnage par action.
+
+    Format : "health_check_success=1/100,view_tasks=10/s" (1 sur 100 pour
+    la première action, au plus 10 par seconde pour la seconde). Un
+    dictionnaire {action: règle} est accepté tel quel.
+    """
+    if isinstance(spec, dict):
+        return dict(spec)
+
+    rules = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            action, rule = (part.strip() for part in item.split('='))
+            amount, unit = rule.split('/')
+            if unit == 's' and float(amount) > 0:
+                rules[action] = RateLimit(float(amount))
+            elif unit != 's' and amount == '1' and int(unit) >= 1:
+                rules[action] = SampleEvery(int(unit))
+            else:
+                raise ValueError
+        except ValueError:
+            raise ValueError('Règle d\'échantillonnage invalide: {}'.format(item)) from None
+    return rules
+
+
+class ActionSamplingFilter(logging.Filter):
+    """Échantillonne les enregistrements selon leur champ `action`.
+
+    Les actions sans règle et les niveaux WARNING ou supérieurs passent
+    toujours. Les enregistrements écartés sont comptés par action.
+    """
+
+    def __init__(self, rules):
+        super().__init__()
+        self.rules = rules
+        self.suppressed = defaultdict(int)
+
+    def filter(self, record):
+        rule = self.rules.get(getattr(record, 'action', None))
+        if rule is None or record.levelno >= logging.WARNING:
+            return True
+        if rule.allow():
+            if rule.rate:
+                record.sample_rate = rule.rate
+            return True
+
+        self.suppressed[record.action] += 1
+        LOG_RECORDS_SUPPRESSED.labels(record.action).inc()
+        return False
+
+
+class UserIdFilter(logging.Filter):
+    """Renseigne le champ user_id avec l'utilisateur de la requête (listes
+    par utilisateur, voir setup_shards)"""
+
+    def filter(self, record):
+        if not hasattr(record, 'user_id') and has_app_context() and 'user_id' in g:
+            record.user_id = g.user_id
+        return True
 
 
 def configure_logging(app, config_name):
     """Configure le logging JSON pour l'application"""
     if not app.debug and config_name != 'testing':
         json_handler = logging.StreamHandler()
-        json_handler.setFormatter(JSONFormatter())
+        json_handler.setFormatter(
+            JSONFormatter(get_serializer(app.config['LOG_SERIALIZER'])))
         json_handler.setLevel(logging.INFO)
 
+        if app.config['LOG_ASYNC']:
+            # Le pid est fourni par JSONFormatter, le module multiprocessing
+            # n'est pas utilisé
+            logging.logProcesses = False
+            logging.logMultiprocessing = False
+            json_handler = BoundedQueueHandler(
+                json_handler,
+                maxsize=app.config['LOG_QUEUE_SIZE'],
+                policy=app.config['LOG_QUEUE_POLICY'],
+                timeout=app.config['LOG_QUEUE_TIMEOUT'])
+            json_handler.start()
+            atexit.register(json_handler.stop)
+
+        for handler in app.logger.handlers:
+            handler.close()
         app.logger.handlers.clear()
         app.logger.addHandler(json_handler)
+        for log_filter in list(app.logger.filters):
+            if isinstance(log_filter, ActionSamplingFilter):
+                app.logger.removeFilter(log_filter)
+        app.logger.addFilter(
+            ActionSamplingFilter(parse_sampling_rules(app.config['LOG_SAMPLING'])))
         app.logger.setLevel(logging.INFO)
+        # Sans cela, chaque enregistrement de l'application serait aussi
+        # écrit une seconde fois par le handler du logger racine
+        app.logger.propagate = False
 
         root_logger = logging.getLogger()
         if not root_logger.handlers:
@@ -63,44 +318,347 @@ def configure_logging(app, config_name):
             root_logger.setLevel(logging.INFO)
 
 
+def setup_metrics(app):
+    """Configure l'export Prometheus (agrégé entre workers si multi-processus)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_flask_exporter.multiprocess import GunicornInternalPrometheusMetrics
+        return GunicornInternalPrometheusMetrics(app)
+    return PrometheusMetrics(app)
+
+
+def setup_admission(app):
+    """Limitation de débit par client et délestage par priorité.
+
+    Retourne (RateLimiter, LoadShedder), chacun None s'il est désactivé.
+    """
+    rate = app.config['RATE_LIMIT_PER_SECOND']
+    if rate <= 0 and not app.config['LOAD_SHED_ENABLED']:
+        return None, None
+    try:
+        from .admission import (REQUESTS_SHED, LoadShedder, RateLimiter, request_priority,
+                                retry_after)
+    except ImportError:
+        from admission import (REQUESTS_SHED, LoadShedder, RateLimiter, request_priority,
+                               retry_after)
+
+    limiter = None
+    if rate > 0:
+        limiter = RateLimiter(rate, app.config['RATE_LIMIT_BURST'],
+                              max_clients=app.config['RATE_LIMIT_MAX_CLIENTS'])
+    shedder = None
+    if app.config['LOAD_SHED_ENABLED']:
+        shedder = LoadShedder(app.config['LOAD_SHED_MAX_CONCURRENT'],
+                              app.config['LOAD_SHED_MAX_WRITES'])
+    app.extensions['rate_limiter'] = limiter
+    app.extensions['load_shedder'] = shedder
+
+    @app.before_request
+    def admit_request():
+        priority = request_priority(request)
+        if priority == 'critical':
+            return None
+        if limiter is not None:
+            wait = limiter.acquire(request.remote_addr or '')
+            if wait:
+                REQUESTS_SHED.labels('rate_limited', priority).inc()
+                app.logger.warning('Requête refusée : débit limité', extra={
+                    'action': 'request_rate_limited',
+                    'path': request.path,
+                    'ip_address': request.remote_addr
+                })
+                return {'error': 'Trop de requêtes'}, 429, {'Retry-After': retry_after(wait)}
+        if shedder is not None:
+            if not shedder.try_acquire(priority):
+                REQUESTS_SHED.labels('overloaded', priority).inc()
+                app.logger.warning('Requête délestée', extra={
+                    'action': 'request_shed',
+                    'priority': priority,
+                    'path': request.path,
+                    'ip_address': request.remote_addr
+                })
+                return {'error': 'Serveur surchargé'}, 503, {
+                    'Retry-After': retry_after(app.config['LOAD_SHED_RETRY_AFTER'])}
+            g.admitted_priority = priority
+        return None
+
+    @app.teardown_request
+    def release_request(exc):
+        # Une réponse en streaming libère sa place dès la fin de la vue
+        priority = g.pop('admitted_priority', None)
+        if priority is not None:
+            shedder.release(priority)
+
+    return limiter, shedder
+
+
 def setup_database(app):
-    """Configure les fonctions de base de données"""
-    def get_db_path():
-        return app.config['DATABASE_PATH']
+    """Configure le stockage des tâches choisi par STORAGE_BACKEND"""
+    backend = app.config['STORAGE_BACKEND']
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError('Moteur de stockage invalide: {}'.format(backend))
+
+    if app.config['SHARD_COUNT'] and backend != 'sqlite':
+        raise ValueError('SHARD_COUNT exige STORAGE_BACKEND=sqlite')
+
+    if backend == 'memory':
+        # Importé à la demande, comme le profilage : le démarrage d'un worker
+        # SQLite ne paie pas les modules qu'il n'utilise pas
+        try:
+            from .memory import MemoryTaskRepository
+        except ImportError:
+            from memory import MemoryTaskRepository
+        repository = MemoryTaskRepository(
+            app,
+            stripes=app.config['MEMORY_LOCK_STRIPES'],
+            snapshot_path=app.config['MEMORY_SNAPSHOT_PATH'],
+            snapshot_interval=app.config['MEMORY_SNAPSHOT_INTERVAL'],
+            logger=app.logger)
+    elif app.config['SHARD_COUNT']:
+        repository = setup_shards(app)
+    else:
+        repository = setup_sqlite(app)
+    app.extensions['task_repository'] = repository
+    atexit.register(repository.close)
 
     def init_db():
-        db_path = get_db_path()
-        if '/' in db_path:
-            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        """Crée ou met à jour le schéma (migrations versionnées)"""
+        version = repository.init()
+        app.logger.info('Base de données initialisée', extra={
+            'action': 'db_init',
+            'backend': backend,
+            'schema_version': version
+        })
+        return version
+
+    app.extensions['db_init'] = init_db
+    return repository, init_db
+
+
+def setup_sqlite(app):
+    """Configure le pool de connexions et les écritures SQLite"""
+    pool = ConnectionPool(app.config)
+    app.extensions['db_pool'] = pool
+    acquire = pool.acquire
+    if app.config['INSTRUMENTATION_ENABLED']:
+        acquire = timed(DB_ACQUIRE_SECONDS, pool.acquire)
+
+    def get_db():
+        """Connexion du pool liée au contexte applicatif courant"""
+        if 'db' not in g:
+            g.db = acquire()
+        return g.db
+
+    @app.teardown_appcontext
+    def release_db(exc):
+        conn = g.pop('db', None)
+        if conn is not None:
+            pool.release(conn)
+
+    return SQLiteTaskRepository(
+        app, pool, get_db,
+        writer=setup_writer(app, pool),
+        relaxed=app.config['WRITE_BEHIND_MODE'] == 'relaxed',
+        timeout=app.config['WRITE_BEHIND_TIMEOUT'],
+        logger=app.logger)
+
+
+def setup_shards(app):
+    """Listes par utilisateur réparties entre SHARD_COUNT bases SQLite"""
+    # Importé à la demande, comme le moteur mémoire
+    try:
+        from .shards import HashRing, ShardedTaskRepository, ShardPool, create_shard_commands
+    except ImportError:
+        from shards import HashRing, ShardedTaskRepository, ShardPool, create_shard_commands
+    if app.config['WRITE_BEHIND_MODE'] != 'off':
+        raise ValueError('SHARD_COUNT exige WRITE_BEHIND_MODE=off')
+
+    pool = ConnectionPool(app.config)
+    shards = ShardPool(pool, app.config['SHARD_MAX_IDLE_CONNECTIONS'])
+    ring = HashRing(app.config['SHARD_COUNT'])
+    app.extensions['db_pool'] = pool
+    app.extensions['shard_pool'] = shards
+    app.extensions['db_writer'] = None
+    acquire = shards.acquire
+    if app.config['INSTRUMENTATION_ENABLED']:
+        acquire = timed(DB_ACQUIRE_SECONDS, shards.acquire)
+    header = app.config['USER_ID_HEADER']
+    default_user_id = app.config['DEFAULT_USER_ID']
+
+    @app.before_request
+    def load_user_id():
+        value = request.headers.get(header)
+        user_id = default_user_id if value is None else clean_user_id(value)
+        if user_id is None:
+            return {'error': 'En-tête {} invalide'.format(header)}, 400
+        g.user_id = user_id
+
+    def get_user_id():
+        # Hors requête (commandes), --user renseigne g.user_id
+        return g.get('user_id', default_user_id)
+
+    def get_db():
+        """Connexion vers la partition de l'utilisateur courant"""
+        if 'db' not in g:
+            g.shard = ring.shard_for(get_user_id())
+            g.db = acquire(g.shard)
+        return g.db
+
+    @app.teardown_appcontext
+    def release_db(exc):
+        conn = g.pop('db', None)
+        if conn is not None:
+            shards.release(g.pop('shard'), conn)
+
+    for log_filter in list(app.logger.filters):
+        if isinstance(log_filter, UserIdFilter):
+            app.logger.removeFilter(log_filter)
+    app.logger.addFilter(UserIdFilter())
+
+    repository = ShardedTaskRepository(app, pool, shards, ring, get_db, get_user_id,
+                                       logger=app.logger)
+    create_shard_commands(app, repository)
+    return repository
+
+
+def setup_instrumentation(app, repository):
+    """Mesures du chemin critique (les requêtes SQL sont mesurées par les
+    connexions du pool, voir ConnectionPool.connect)"""
+    enabled = app.config['INSTRUMENTATION_ENABLED']
+    time_logger(app.logger, enabled)
+    if not enabled:
+        return
+
+    time_templates(app)
+    interval = app.config['INSTRUMENTATION_ROW_COUNT_INTERVAL']
+    if interval <= 0:
+        return
+    row_count = RowCountGauge(repository.count_all, interval, logger=app.logger)
+    app.extensions['row_count_gauge'] = row_count
+    atexit.register(row_count.stop)
+
+    @app.before_request
+    def start_row_count():
+        row_count.start()
+
+
+def setup_cache(app):
+    """Configure le cache de la liste des tâches"""
+    # Les pages ne sont pas distinguées par utilisateur : pas de cache
+    # pour les listes par utilisateur
+    cache = TaskListCache(0 if app.config['SHARD_COUNT'] else app.config['TASK_CACHE_SIZE'])
+    app.extensions['task_cache'] = cache
+    tasks_changed.connect(cache.on_tasks_changed, sender=app)
+    return cache
+
+
+def setup_events(app, repository):
+    """Diffusion des modifications aux flux /events (None si désactivée)"""
+    # Le journal d'une partition mêle les listes de ses utilisateurs
+    if not app.config['EVENTS_ENABLED'] or app.config['SHARD_COUNT']:
+        return None
+    broker = EventBroker(
+        repository,
+        buffer_size=app.config['EVENTS_BUFFER_SIZE'],
+        batch_size=app.config['EVENTS_BATCH_SIZE'],
+        poll_interval=app.config['EVENTS_POLL_INTERVAL_MS'] / 1000.0,
+        max_streams=app.config['EVENTS_MAX_STREAMS'],
+        logger=app.logger)
+    app.extensions['event_broker'] = broker
+    tasks_changed.connect(broker.notify, sender=app)
+    atexit.register(broker.stop)
+    return broker
 
-        conn = sqlite3.connect(db_path)
-        conn.execute('''CREATE TABLE IF NOT EXISTS tasks
-                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                         task TEXT NOT NULL,
-                         completed BOOLEAN DEFAULT FALSE)''')
-        conn.close()
 
-        app.logger.info('Base de données initialisée',
-                        extra={'action': 'db_init'})
+def setup_maintenance(app, repository):
+    """Maintenance SQLite en arrière-plan (None si désactivée)"""
+    if not app.config['MAINTENANCE_ENABLED'] or repository.backend != 'sqlite':
+        return None
+    # Importé à la demande, comme le profilage
+    try:
+        from .maintenance import MaintenanceScheduler, create_maintenance_commands, maintenance_jobs
+    except ImportError:
+        from maintenance import MaintenanceScheduler, create_maintenance_commands, maintenance_jobs
 
-    return get_db_path, init_db
+    scheduler = MaintenanceScheduler(
+        maintenance_jobs(app.config),
+        repository.database_paths,
+        repository.pool.connect,
+        app.config['MAINTENANCE_LOCK_PATH'] or app.config['DATABASE_PATH'] + '.maintenance.lock',
+        logger=app.logger)
+    app.extensions['maintenance'] = scheduler
+    atexit.register(scheduler.stop)
 
+    @app.before_request
+    def start_maintenance():
+        # Démarré par la première requête du processus : le maître gunicorn
+        # crée l'application sans la servir
+        scheduler.ensure_started()
 
-def create_index_route(app, get_db_path):
+    create_maintenance_commands(app, scheduler)
+    return scheduler
+
+
+def setup_writer(app, pool):
+    """Thread d'écriture groupée selon WRITE_BEHIND_MODE (None si 'off')"""
+    mode = app.config['WRITE_BEHIND_MODE']
+    if mode not in WRITE_BEHIND_MODES:
+        raise ValueError('Mode write-behind invalide: {}'.format(mode))
+
+    writer = None
+    if mode != 'off':
+        writer = WriteBehindWriter(
+            pool.connect,
+            max_batch=app.config['WRITE_BEHIND_MAX_BATCH'],
+            max_delay=app.config['WRITE_BEHIND_MAX_DELAY_MS'] / 1000.0,
+            maxsize=app.config['WRITE_BEHIND_QUEUE_SIZE'],
+            put_timeout=app.config['WRITE_BEHIND_TIMEOUT'])
+    app.extensions['db_writer'] = writer
+    return writer
+
+
+def create_index_route(app, repository, cache, broker):
     """Crée la route index"""
     @app.route('/')
     def index():
         try:
-            conn = sqlite3.connect(get_db_path())
-            tasks = conn.execute('SELECT * FROM tasks').fetchall()
-            conn.close()
+            page_args = get_page_args(app)
+            # Lu avant les tâches : la page ne peut pas être en retard sur le
+            # jeton de reprise des mises à jour en direct
+            last_event_id = broker.position() if broker is not None else None
+            stream = request.args.get('stream', app.config['INDEX_STREAMING'],
+                                      type=lambda value: value in ('1', 'true'))
+
+            if stream:
+                app.logger.info('Page d\'accueil consultée (streaming)', extra={
+                    'action': 'view_tasks',
+                    'after': page_args.after,
+                    'limit': page_args.limit
+                })
+                return stream_template('index.html',
+                                       tasks=repository.page(page_args),
+                                       page_args=page_args, last_event_id=last_event_id)
+
+            generation, page = load_task_page(cache, repository, page_args)
+            if page.html is None and app.config['TASK_CACHE_HTML']:
+                html = render_template('index.html', tasks=page.tasks,
+                                       page_args=page_args, last_event_id=last_event_id)
+                page = page._replace(html=html, etag=generate_etag(html.encode()))
+                cache.put(page_args, page, generation)
+
+            html = page.html or render_template('index.html', tasks=page.tasks,
+                                                page_args=page_args,
+                                                last_event_id=last_event_id)
 
             app.logger.info('Page d\'accueil consultée', extra={
                 'action': 'view_tasks',
-                'task_count': len(tasks)
+                'task_count': len(page.tasks),
+                'after': page_args.after
             })
 
-            return render_template('index.html', tasks=tasks)
+            response = make_response(html)
+            response.set_etag(page.etag or generate_etag(html.encode()))
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
         except Exception as e:
             app.logger.error(
                 'Erreur lors de la consultation des tâches: {}'.format(str(e)),
@@ -108,11 +666,68 @@ def create_index_route(app, get_db_path):
             return "Erreur lors du chargement des tâches", 500
 
 
-def create_add_route(app, get_db_path):
+def create_events_route(app, broker):
+    """Crée la route des mises à jour en direct (Server-Sent Events)"""
+    @app.route('/events')
+    def events():
+        # Last-Event-ID à la reconnexion, paramètre fourni par la page sinon
+        cursor = request.headers.get('Last-Event-ID', type=int)
+        if cursor is None:
+            cursor = request.args.get('last_event_id', type=int)
+        try:
+            stream = broker.stream(None if cursor is None else max(cursor, 0),
+                                   heartbeat=app.config['EVENTS_HEARTBEAT_SECONDS'],
+                                   duration=app.config['EVENTS_STREAM_SECONDS'])
+        except TooManyStreams as e:
+            app.logger.warning(str(e), extra={'action': 'events_rejected'})
+            return {'error': str(e)}, 503, {'Retry-After': '5'}
+        except Exception as e:
+            app.logger.error(
+                'Erreur lors de l\'ouverture du flux: {}'.format(str(e)),
+                extra={'action': 'events_error'})
+            return {'error': 'Flux indisponible'}, 500
+
+        return Response(stream, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            # Pas de mise en tampon par un proxy nginx
+            'X-Accel-Buffering': 'no'
+        })
+
+
+def create_search_route(app, repository):
+    """Crée la route de recherche plein texte"""
+    @app.route('/search')
+    def search():
+        search_args = get_search_args(app)
+        query = request.args.get('q', '')
+        if search_args.match is None:
+            return render_template('search.html', query=query, tasks=[],
+                                   next_offset=None, search_args=search_args)
+
+        try:
+            tasks, next_offset = repository.search(search_args,
+                                                   app.config['SEARCH_RANK_WINDOW'])
+
+            app.logger.info('Recherche de tâches', extra={
+                'action': 'search_tasks',
+                'result_count': len(tasks),
+                'offset': search_args.offset
+            })
+
+            return render_template('search.html', query=query, tasks=tasks,
+                                   next_offset=next_offset, search_args=search_args)
+        except Exception as e:
+            app.logger.error(
+                'Erreur lors de la recherche de tâches: {}'.format(str(e)),
+                extra={'action': 'search_tasks_error'})
+            return "Erreur lors de la recherche", 500
+
+
+def create_add_route(app, repository):
     """Crée la route add"""
     @app.route('/add', methods=['POST'])
     def add_task():
-        task = request.form.get('task', '').strip()
+        task = clean_task(request.form.get('task', ''))
 
         if not task:
             app.logger.warning('Tentative d\'ajout de tâche vide', extra={
@@ -122,11 +737,8 @@ def create_add_route(app, get_db_path):
             return redirect(url_for('index'))
 
         try:
-            conn = sqlite3.connect(get_db_path())
-            cursor = conn.execute('INSERT INTO tasks (task) VALUES (?)', (task,))
-            task_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            # En mode 'relaxed', la tâche n'est pas encore validée : pas d'id
+            task_id = repository.add(task, wait=False)
 
             app.logger.info('Nouvelle tâche ajoutée: {}'.format(task), extra={
                 'action': 'add_task_success',
@@ -143,16 +755,79 @@ def create_add_route(app, get_db_path):
             return "Erreur lors de l'ajout de la tâche", 500
 
 
-def create_task_routes(app, get_db_path):
+def read_bulk_tasks(app):
+    """Lit les tâches d'un ajout en masse (tableau JSON ou flux NDJSON).
+
+    Retourne les tâches valides et les positions des éléments refusés.
+    Lève ValueError si le corps est illisible ou dépasse BULK_MAX_TASKS.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = (json.loads(line) for line in request.stream if line.strip())
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise ValueError('Le corps doit être un tableau JSON ou du NDJSON')
+
+    max_tasks = app.config['BULK_MAX_TASKS']
+    tasks, invalid = [], []
+    for index, item in enumerate(items):
+        if index >= max_tasks:
+            raise ValueError('Trop de tâches (maximum {})'.format(max_tasks))
+        task = clean_task(item.get('task') if isinstance(item, dict) else item)
+        if task is None:
+            invalid.append(index)
+        else:
+            tasks.append(task)
+    return tasks, invalid
+
+
+def create_bulk_route(app, repository):
+    """Crée la route d'ajout de tâches en masse"""
+    @app.route('/tasks/bulk', methods=['POST'])
+    def add_tasks_bulk():
+        try:
+            tasks, invalid = read_bulk_tasks(app)
+        except ValueError as e:
+            app.logger.warning('Ajout en masse illisible: {}'.format(str(e)), extra={
+                'action': 'bulk_add_invalid',
+                'ip_address': request.remote_addr
+            })
+            return {'error': str(e)}, 400
+
+        if invalid or not tasks:
+            app.logger.warning('Ajout en masse avec tâches vides', extra={
+                'action': 'bulk_add_empty',
+                'invalid_count': len(invalid),
+                'ip_address': request.remote_addr
+            })
+            return {'error': 'Tâches vides ou invalides', 'invalid': invalid}, 400
+
+        ids = []
+        try:
+            chunk_size = app.config['BULK_CHUNK_SIZE']
+            for start in range(0, len(tasks), chunk_size):
+                ids.extend(repository.add_many(tasks[start:start + chunk_size]))
+
+            app.logger.info('Tâches ajoutées en masse', extra={
+                'action': 'bulk_add_success',
+                'task_count': len(ids),
+                'ip_address': request.remote_addr
+            })
+
+            return {'count': len(ids), 'ids': ids}, 201
+        except Exception as e:
+            app.logger.error(
+                'Erreur lors de l\'ajout en masse: {}'.format(str(e)),
+                extra={'action': 'bulk_add_error', 'task_count': len(ids)})
+            return {'error': "Erreur lors de l'ajout des tâches", 'ids': ids}, 500
+
+
+def create_task_routes(app, repository):
     """Crée les routes complete et delete"""
     @app.route('/complete/<int:task_id>')
     def complete_task(task_id):
         try:
-            conn = sqlite3.connect(get_db_path())
-            conn.execute('UPDATE tasks SET completed = TRUE WHERE id = ?',
-                         (task_id,))
-            conn.commit()
-            conn.close()
+            repository.complete(task_id, wait=False)
 
             app.logger.info('Tâche complétée', extra={
                 'action': 'complete_task',
@@ -170,10 +845,7 @@ def create_task_routes(app, get_db_path):
     @app.route('/delete/<int:task_id>')
     def delete_task(task_id):
         try:
-            conn = sqlite3.connect(get_db_path())
-            conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-            conn.commit()
-            conn.close()
+            repository.delete(task_id, wait=False)
 
             app.logger.info('Tâche supprimée', extra={
                 'action': 'delete_task',
@@ -189,34 +861,145 @@ def create_task_routes(app, get_db_path):
             return "Erreur lors de la suppression de la tâche", 500
 
 
-def create_health_route(app, get_db_path):
-    """Crée la route health"""
+def setup_health(app, repository):
+    """Vérification du stockage partagée par les sondes"""
+    checker = HealthChecker(repository.check,
+                            ttl=app.config['HEALTH_CHECK_TTL'],
+                            idle=app.config['HEALTH_CHECK_IDLE'],
+                            logger=app.logger)
+    app.extensions['health_checker'] = checker
+    atexit.register(checker.stop)
+    return checker
+
+
+def create_health_routes(app, repository, checker):
+    """Crée les routes de sonde : livez, readyz et health.
+
+    Aucune n'accède au stockage ni ne journalise une sonde réussie : les
+    changements d'état sont journalisés par HealthChecker.
+    """
+    @app.route('/livez')
+    def livez():
+        return {'status': 'alive'}, 200
+
+    @app.route('/readyz')
+    def readyz():
+        result = checker.result()
+        payload = {'status': 'ready' if result['ready'] else 'unready',
+                   'checked_at': result['checked_at'], 'age': result['age'],
+                   'check_ms': result['check_ms'], 'details': result['details']}
+        if result['error'] is not None:
+            payload['error'] = result['error']
+        return payload, 200 if result['ready'] else 503
+
     @app.route('/health')
     def health():
-        try:
-            conn = sqlite3.connect(get_db_path())
-            conn.execute('SELECT 1').fetchone()
-            conn.close()
+        result = checker.result()
+        if result['ready']:
+            return {'status': 'healthy', 'database': 'connected',
+                    'storage': repository.stats()}, 200
+
+        app.logger.error('Health check échoué: {}'.format(result['error']), extra={
+            'action': 'health_check_error'
+        })
+        return {'status': 'unhealthy', 'error': result['error']}, 500
+
 
-            app.logger.info('Health check réussi', extra={
-                'action': 'health_check_success',
+def register_routes(app, repository, cache, checker, broker):
+    """Enregistre toutes les routes de l'application"""
+    create_index_route(app, repository, cache, broker)
+    if broker is not None:
+        create_events_route(app, broker)
+    create_search_route(app, repository)
+    create_add_route(app, repository)
+    create_bulk_route(app, repository)
+    create_task_routes(app, repository)
+    create_health_routes(app, repository, checker)
+    create_api_routes(app, repository, cache)
+    create_transfer_routes(app, repository)
+
+
+def register_profiling(app):
+    """Enregistre le profilage de production si PROFILING_ENABLED"""
+    if not app.config['PROFILING_ENABLED']:
+        return
+    token = app.config['PROFILING_TOKEN'].encode()
+    if not token:
+        raise ValueError('PROFILING_TOKEN est requis avec PROFILING_ENABLED')
+    try:
+        from .profiling import PROFILE_FORMATS, ProfilerBusy, RequestProfiler, StackSampler
+    except ImportError:
+        from profiling import PROFILE_FORMATS, ProfilerBusy, RequestProfiler, StackSampler
+
+    sampler = StackSampler(app.config['PROFILING_SAMPLE_INTERVAL_MS'] / 1000.0)
+    request_profiler = RequestProfiler(app.config['PROFILING_DIR'],
+                                       app.config['PROFILING_MAX_CONCURRENT'])
+
+    def authorized():
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token)
+
+    @app.route('/admin/profile')
+    def profile():
+        if not authorized():
+            app.logger.warning('Profilage refusé', extra={
+                'action': 'profile_forbidden',
                 'ip_address': request.remote_addr
             })
+            return {'error': 'Accès refusé'}, 403
 
-            return {'status': 'healthy', 'database': 'connected'}, 200
-        except Exception as e:
-            app.logger.error('Health check échoué: {}'.format(str(e)), extra={
-                'action': 'health_check_error'
-            })
-            return {'status': 'unhealthy', 'error': str(e)}, 500
+        output = request.args.get('format', 'collapsed')
+        if output not in PROFILE_FORMATS:
+            return {'error': 'Format inconnu: {}'.format(output)}, 400
+        seconds = request.args.get('seconds', 5.0, type=float)
+        seconds = min(max(seconds, 0.01), app.config['PROFILING_MAX_SECONDS'])
 
+        try:
+            result = sampler.sample(seconds)
+        except ProfilerBusy as e:
+            return {'error': str(e)}, 409
 
-def register_routes(app, get_db_path):
-    """Enregistre toutes les routes de l'application"""
-    create_index_route(app, get_db_path)
-    create_add_route(app, get_db_path)
-    create_task_routes(app, get_db_path)
-    create_health_route(app, get_db_path)
+        app.logger.info('Profil échantillonné', extra={
+            'action': 'profile_sampled',
+            'seconds': seconds,
+            'samples': result.samples,
+            'ip_address': request.remote_addr
+        })
+        if output == 'speedscope':
+            return result.speedscope(name='pid {}'.format(os.getpid()))
+        return result.collapsed(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+    @app.before_request
+    def start_request_profile():
+        if 'X-Profile' in request.headers and authorized():
+            profile = request_profiler.start()
+            g.request_profile = profile if profile is not None else False
+
+    def stop_request_profile():
+        """Écrit le profil de la requête ; retourne la valeur de X-Profile"""
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return None
+        if profile is False:
+            return 'busy'
+        try:
+            return request_profiler.stop(profile, request.method, request.path)
+        except OSError as e:
+            app.logger.error('Profil de requête non enregistré: {}'.format(str(e)),
+                             extra={'action': 'request_profile_error'})
+            return 'error'
+
+    @app.after_request
+    def add_profile_header(response):
+        result = stop_request_profile()
+        if result is not None:
+            response.headers['X-Profile'] = result
+        return response
+
+    @app.teardown_request
+    def discard_request_profile(exc):
+        # Requête interrompue par une exception : le profil est tout de même
+        # écrit et sa place libérée
+        stop_request_profile()
 
 
 def register_error_handlers(app):
@@ -240,18 +1023,74 @@ def register_error_handlers(app):
         return "Erreur interne du serveur", 500
 
 
+def setup_templates(app):
+    """Cache disque du code compilé des templates (TEMPLATE_BYTECODE_CACHE).
+
+    Sans lui, chaque nouveau processus recompile chaque template à sa
+    première utilisation : c'est l'essentiel de la durée de la première
+    requête d'un worker. Avec TEMPLATE_PRECOMPILE, les templates sont
+    chargés dès la création de l'application.
+
+    Les lignes de tâche (task_row.html) sont rendues une fois par version
+    et conservées dans le cache de fragments : la liste est assemblée à
+    partir des fragments en cache (global `task_rows` des templates).
+    """
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(
+            app.config['TEMPLATE_BYTECODE_CACHE_DIR'] or None))
+
+    # Macro appelée directement : évite de créer un contexte de template
+    # par ligne
+    task_row = app.jinja_env.get_template('task_row.html').module.task_row
+
+    def render_row(task_id, text, completed):
+        return str(task_row(task_id, text, completed))
+
+    fragments = FragmentCache(render_row, app.config['TEMPLATE_FRAGMENT_CACHE_SIZE'])
+    app.extensions['fragment_cache'] = fragments
+    app.add_template_global(fragments.rows, 'task_rows')
+
+    if app.config['TEMPLATE_PRECOMPILE']:
+        # Compilés (ou chargés du cache disque) à la création de
+        # l'application plutôt qu'à la première requête qui les affiche
+        for name in app.jinja_env.list_templates(extensions=['html']):
+            app.jinja_env.get_template(name)
+
+
 def create_app(config_name=None):
-    """Factory pour créer l'application Flask"""
+    """Factory pour créer l'application Flask.
+
+    Aucune application n'est créée à l'import des modules : le point
+    d'entrée WSGI est wsgi.py, qui charge aussi le fichier .env.
+    """
     app = Flask(__name__)
 
     config_name = config_name or os.getenv('FLASK_ENV', 'development')
     app.config.from_object(config[config_name])
+    setup_templates(app)
 
     configure_logging(app, config_name)
-    PrometheusMetrics(app)
+    setup_metrics(app)
+    setup_admission(app)
 
-    get_db_path, init_db = setup_database(app)
-    register_routes(app, get_db_path)
+    repository, init_db = setup_database(app)
+    if app.config['DATABASE_MIGRATE_ON_STARTUP']:
+        try:
+            init_db()
+        except Exception as e:
+            # L'application démarre quand même : /health signale l'erreur
+            app.logger.error(
+                'Erreur lors de l\'initialisation de la base: {}'.format(str(e)),
+                extra={'action': 'db_init_error'})
+    setup_instrumentation(app, repository)
+    cache = setup_cache(app)
+    checker = setup_health(app, repository)
+    broker = setup_events(app, repository)
+    setup_maintenance(app, repository)
+    register_routes(app, repository, cache, checker, broker)
+    create_transfer_commands(app, repository)
+    create_snapshot_commands(app, repository)
+    register_profiling(app)
     register_error_handlers(app)
 
     app.logger.info('Application Flask démarrée', extra={
@@ -262,22 +1101,15 @@ def create_app(config_name=None):
     return app
 
 
-app = create_app()
+def __getattr__(name):
+    # Compatibilité avec les lanceurs qui importent `app.app:app` : instance
+    # créée au premier accès seulement (préférer wsgi.py)
+    if name == 'app':
+        instance = globals()['app'] = create_app()
+        return instance
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
 
 if __name__ == '__main__':
-    with app.app_context():
-        def init_db():
-            db_path = app.config['DATABASE_PATH']
-            if '/' in db_path:
-                os.makedirs(os.path.dirname(db_path), exist_ok=True)
-
-            conn = sqlite3.connect(db_path)
-            conn.execute('''CREATE TABLE IF NOT EXISTS tasks
-                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                             task TEXT NOT NULL,
-                             completed BOOLEAN DEFAULT FALSE)''')
-            conn.close()
-
-        init_db()
-
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    # Serveur de développement : python app.py (en production, serve.py)
+    create_app().run(host='0.0.0.0', port=5000, debug=False)
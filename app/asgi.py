@@ -0,0 +1,263 @@
+"""Variante asyncio (ASGI) de l'application : WEB_INTERFACE=asgi dans serve.py.
+
+Les routes et les templates sont ceux de create_app(). La boucle asyncio
+(uvicorn) gère les connexions, la lecture des corps de requête et l'envoi
+des réponses ; seules les vues Flask s'exécutent dans un pool de `threads`
+threads dédié. Une connexion keep-alive inactive ou un client lent
+n'occupent donc aucun thread, et la taille du pool borne le nombre de
+connexions SQLite du worker quel que soit le nombre de clients.
+
+Le corps d'une requête n'est pas chargé en mémoire : la vue le lit à la
+demande (RequestBody), bloc par bloc, comme sous gunicorn ; un import
+volumineux reste donc lu au fil de l'eau.
+
+Les flux /events sont servis par la boucle elle-même
+(EventBroker.astream) : un abonné n'occupe aucun thread.
+
+Usage : uvicorn --factory app.asgi:create_asgi_app (ou python serve.py)
+"""
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+try:
+    from .app import create_app
+    from .events import TooManyStreams
+except ImportError:
+    from app import create_app
+    from events import TooManyStreams
+
+
+# Taille du tampon de lecture du corps d'une requête
+BODY_BUFFER_SIZE = 64 * 1024
+
+
+class RequestBody(io.RawIOBase):
+    """Corps d'une requête ASGI lu à la demande depuis le thread de la vue.
+
+    Chaque message http.request est demandé à la boucle asyncio (`loop`)
+    au moment où la vue en a besoin, et attendu par le thread : au plus un
+    bloc est en mémoire, et un client lent ne fait attendre que sa vue.
+    Une déconnexion termine le corps.
+    """
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self._chunk = memoryview(b'')
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self):
+        while not self._chunk and not self._done:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect' or not message.get('more_body'):
+                self._done = True
+            self._chunk = memoryview(message.get('body', b''))
+
+    def readinto(self, buffer):
+        self._next_chunk()
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+def build_environ(scope, body):
+    """Environnement WSGI (PEP 3333) d'une requête HTTP ASGI.
+
+    `body` est le fichier du corps de la requête (wsgi.input).
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope['http_version']),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        if name in environ:
+            # Plusieurs en-têtes Cookie se joignent par "; " (RFC 6265)
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = environ[name] + separator + value
+        environ[name] = value
+    return environ
+
+
+class AsgiApplication:
+    """Application ASGI servant l'application Flask `app`"""
+
+    def __init__(self, app, threads=4):
+        self.app = app
+        self.broker = app.extensions.get('event_broker')
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='asgi-view')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            if scope['path'] == '/events' and self.broker is not None:
+                await self.events(scope, receive, send)
+            else:
+                await self.view(scope, receive, send)
+        else:
+            raise RuntimeError('Type de connexion non géré: {}'.format(scope['type']))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # Vues Flask
+
+    async def view(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        body = io.BufferedReader(RequestBody(receive, loop), BODY_BUFFER_SIZE)
+        start, chunks = await loop.run_in_executor(
+            self.executor, self.run_view, build_environ(scope, body), send, loop)
+        if start is not None:
+            await send(start)
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+    def run_view(self, environ, send, loop):
+        """Exécute la vue dans un thread du pool.
+
+        Une réponse d'un seul bloc est retournée à la boucle, qui l'envoie.
+        Dès qu'un deuxième bloc est produit (réponse en streaming), les blocs
+        sont envoyés au fil de l'eau depuis ce thread, qui attend leur envoi :
+        le générateur de la réponse reste ainsi dans un seul thread.
+        Retourne (début de réponse non envoyé, blocs restants).
+        """
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                            for name, value in headers]}
+
+        def flush(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        result = self.app(environ, start_response)
+        pending = []
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                if pending:
+                    if 'start' in response:
+                        flush(response.pop('start'))
+                    flush({'type': 'http.response.body', 'body': pending.pop(),
+                           'more_body': True})
+                pending.append(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response.pop('start', None), pending
+
+    # Mises à jour en direct
+
+    async def events(self, scope, receive, send):
+        """Équivalent asynchrone de la route /events"""
+        config = self.app.config
+        headers = dict(scope['headers'])
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        cursor = parse_int(headers.get(b'last-event-id', b'').decode('latin-1'))
+        if cursor is None:
+            cursor = parse_int(query.get('last_event_id', [''])[0])
+
+        try:
+            stream = await self.broker.astream(
+                None if cursor is None else max(cursor, 0),
+                heartbeat=config['EVENTS_HEARTBEAT_SECONDS'],
+                duration=config['EVENTS_STREAM_SECONDS'], executor=self.executor)
+        except TooManyStreams as e:
+            self.app.logger.warning(str(e), extra={'action': 'events_rejected'})
+            await send_json(send, 503, {'error': str(e)}, [(b'retry-after', b'5')])
+            return
+        except Exception as e:
+            self.app.logger.error(
+                'Erreur lors de l\'ouverture du flux: {}'.format(str(e)),
+                extra={'action': 'events_error'})
+            await send_json(send, 500, {'error': 'Flux indisponible'})
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')]})
+        # Le flux attend les événements jusqu'à `duration` : la déconnexion
+        # du client l'interrompt sans attendre le prochain envoi
+        pump = asyncio.ensure_future(pump_stream(stream, send))
+        disconnect = asyncio.ensure_future(wait_disconnect(receive))
+        try:
+            await asyncio.wait((pump, disconnect), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            pump.cancel()
+            disconnect.cancel()
+            await asyncio.gather(pump, disconnect, return_exceptions=True)
+            await stream.aclose()
+        if not pump.cancelled():
+            pump.result()
+            await send({'type': 'http.response.body', 'body': b''})
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def pump_stream(stream, send):
+    async for chunk in stream:
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode()
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode())] + list(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def create_asgi_app(config_name=None):
+    """Crée l'application Flask et son adaptateur ASGI (WEB_THREADS threads)"""
+    app = create_app(config_name)
+    return AsgiApplication(app, app.config['WEB_THREADS'])
@@ -0,0 +1,199 @@
+"""Cache mémoire des pages de la liste de tâches"""
+import itertools
+import threading
+from collections import OrderedDict, namedtuple
+
+from markupsafe import Markup
+from prometheus_client import Counter
+
+CACHE_REQUESTS = Counter(
+    'task_cache_requests_total',
+    'Consultations du cache de la liste des tâches', ['result'])
+CACHE_INVALIDATIONS = Counter(
+    'task_cache_invalidations_total',
+    'Invalidations du cache de la liste des tâches', ['reason'])
+FRAGMENT_CACHE_REQUESTS = Counter(
+    'task_fragment_cache_requests_total',
+    'Consultations du cache des lignes de tâche rendues', ['result'])
+
+
+# Lignes de tâche assemblées par appel depuis le template
+FRAGMENT_CHUNK_ROWS = 200
+
+# Page de tâches en cache ; html et etag ne sont renseignés que pour la
+# page d'accueil quand TASK_CACHE_HTML est actif
+CachedPage = namedtuple('CachedPage', ['tasks', 'html', 'etag'])
+
+
+class LRUCache:
+    """Dictionnaire borné avec éviction de l'entrée la moins récemment lue"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def get_many(self, keys):
+        """Valeurs de `keys` (None pour une absente), sous un seul verrou"""
+        data = self._data
+        with self._lock:
+            values = [data.get(key) for key in keys]
+            for key, value in zip(keys, values):
+                if value is not None:
+                    data.move_to_end(key)
+        return values
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TaskListCache:
+    """Cache des pages de tâches, invalidé à chaque modification.
+
+    Les routes d'écriture du processus invalident le cache via le signal
+    `tasks_changed`. Les écritures des autres workers sont détectées avec
+    `PRAGMA data_version`, qui change pour une connexion dès qu'une autre
+    connexion a validé une modification de la base.
+    """
+
+    def __init__(self, maxsize):
+        self.pages = LRUCache(maxsize)
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        return self.pages.maxsize > 0
+
+    def invalidate(self, reason='write'):
+        with self._lock:
+            self.generation += 1
+            self.pages.clear()
+        CACHE_INVALIDATIONS.labels(reason).inc()
+
+    def on_tasks_changed(self, sender, **extra):
+        """Récepteur du signal tasks_changed"""
+        self.invalidate()
+
+    def sync(self, conn):
+        """Invalide le cache si une autre connexion a modifié la base.
+
+        La première observation d'une connexion invalide aussi le cache :
+        on ne sait pas ce qui a été validé avant son ouverture.
+        """
+        if self.enabled:
+            self.sync_version(
+                (id(conn), conn.execute('PRAGMA data_version').fetchone()[0]))
+
+    def sync_version(self, version):
+        """Invalide le cache si le jeton de version a changé (None : ignoré)"""
+        if version is None:
+            return
+        if getattr(self._local, 'seen', None) != version:
+            self._local.seen = version
+            self.invalidate('external_write')
+
+    def get(self, key):
+        """Retourne (génération, valeur) ; valeur vaut None en cas d'absence"""
+        generation = self.generation
+        if not self.enabled:
+            return generation, None
+        value = self.pages.get(key)
+        CACHE_REQUESTS.labels('miss' if value is None else 'hit').inc()
+        return generation, value
+
+    def put(self, key, value, generation):
+        """Stocke une valeur lue à la génération donnée.
+
+        Si une invalidation a eu lieu entre la lecture et le stockage, la
+        valeur est peut-être périmée : elle n'est pas conservée.
+        """
+        with self._lock:
+            if generation == self.generation:
+                self.pages.set(key, value)
+
+    def stats(self):
+        return {'size': len(self.pages), 'maxsize': self.pages.maxsize,
+                'generation': self.generation}
+
+
+class FragmentCache:
+    """Fragments HTML des lignes de tâche, rendus une fois par version.
+
+    La clé d'une ligne est (id, texte, terminée) : elle change avec son
+    contenu, si bien qu'une modification ne fait rendre que sa propre
+    ligne, sans invalidation (ni entre workers). Les anciennes versions
+    sortent du cache par éviction LRU. `render(task_id, text, completed)`
+    produit le fragment (HTML déjà échappé) d'une ligne absente.
+    """
+
+    def __init__(self, render, maxsize, chunk_size=FRAGMENT_CHUNK_ROWS):
+        self.render = render
+        self.fragments = LRUCache(maxsize)
+        self.chunk_size = chunk_size
+
+    def rows(self, tasks):
+        """Fragments des lignes de `tasks`, concaténés par blocs de chunk_size.
+
+        Un appel depuis le template par bloc plutôt que par ligne : le
+        surcoût d'appel Jinja, le verrou du cache et les compteurs ne sont
+        payés qu'une fois par bloc. `tasks` est parcouru à la demande, ce
+        qui préserve le rendu en streaming.
+        """
+        tasks = iter(tasks)
+        while True:
+            keys = [(task[0], task[1], bool(task[2]))
+                    for task in itertools.islice(tasks, self.chunk_size)]
+            if not keys:
+                return
+            fragments = self.fragments.get_many(keys)
+            misses = 0
+            for i, fragment in enumerate(fragments):
+                if fragment is None:
+                    misses += 1
+                    fragments[i] = self.render(*keys[i])
+                    self.fragments.set(keys[i], fragments[i])
+            if misses:
+                FRAGMENT_CACHE_REQUESTS.labels('miss').inc(misses)
+            if misses < len(keys):
+                FRAGMENT_CACHE_REQUESTS.labels('hit').inc(len(keys) - misses)
+            yield Markup('\n    '.join(fragments))
+
+    def clear(self):
+        self.fragments.clear()
+
+    def stats(self):
+        return {'size': len(self.fragments), 'maxsize': self.fragments.maxsize}
+
+
+def load_task_page(cache, repository, page_args):
+    """Retourne (génération, CachedPage) depuis le cache ou le stockage"""
+    if cache.enabled:
+        cache.sync_version(repository.data_version())
+    generation, page = cache.get(page_args)
+    if page is None:
+        page = CachedPage(repository.page(page_args).load(), None, None)
+        cache.put(page_args, page, generation)
+    return generation, page
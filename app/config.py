@@ -1,7 +1,7 @@
+# Les variables du fichier .env sont chargées par les points d'entrée
+# (wsgi.py, serve.py) avant l'import de ce module : l'importer n'a pas
+# d'effet de bord
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
 
 
 class Config:
@@ -9,6 +9,199 @@ class Config:
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'tasks.db')
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
 
+    # Stockage des tâches : 'sqlite' (DATABASE_PATH) ou 'memory' (propre au
+    # processus, enregistré dans MEMORY_SNAPSHOT_PATH toutes les
+    # MEMORY_SNAPSHOT_INTERVAL secondes si ce chemin est renseigné)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite').lower()
+    MEMORY_LOCK_STRIPES = int(os.getenv('MEMORY_LOCK_STRIPES', 16))
+    MEMORY_SNAPSHOT_PATH = os.getenv('MEMORY_SNAPSHOT_PATH', '')
+    MEMORY_SNAPSHOT_INTERVAL = float(os.getenv('MEMORY_SNAPSHOT_INTERVAL', 60))
+
+    # Listes de tâches par utilisateur (0 : une seule liste, DATABASE_PATH).
+    # L'utilisateur est lu dans l'en-tête USER_ID_HEADER, renseigné par le
+    # proxy d'authentification (DEFAULT_USER_ID en son absence) ; sa liste
+    # est stockée dans l'une des SHARD_COUNT bases (voir shards.py), nommées
+    # d'après SHARD_PATH_TEMPLATE (ex. /data/tasks-{index:03d}.db) ou
+    # DATABASE_PATH. Au plus SHARD_MAX_IDLE_CONNECTIONS connexions inactives
+    # restent ouvertes par processus. Après un changement de SHARD_COUNT :
+    # flask rebalance-shards --previous <ancien nombre>. Le cache des pages,
+    # les mises à jour en direct et le write-behind sont alors indisponibles
+    SHARD_COUNT = int(os.getenv('SHARD_COUNT', 0))
+    SHARD_PATH_TEMPLATE = os.getenv('SHARD_PATH_TEMPLATE', '')
+    SHARD_MAX_IDLE_CONNECTIONS = int(os.getenv('SHARD_MAX_IDLE_CONNECTIONS', 32))
+    USER_ID_HEADER = os.getenv('USER_ID_HEADER', 'X-User-Id')
+    DEFAULT_USER_ID = os.getenv('DEFAULT_USER_ID', '')
+
+    # Configuration SQLite (connexion persistante par thread)
+    DATABASE_POOL_ENABLED = os.getenv('DATABASE_POOL_ENABLED', 'true').lower() == 'true'
+    DATABASE_JOURNAL_MODE = os.getenv('DATABASE_JOURNAL_MODE', 'WAL')
+    DATABASE_SYNCHRONOUS = os.getenv('DATABASE_SYNCHRONOUS', 'NORMAL')
+    DATABASE_MMAP_SIZE = int(os.getenv('DATABASE_MMAP_SIZE', 64 * 1024 * 1024))
+    DATABASE_CACHE_SIZE = int(os.getenv('DATABASE_CACHE_SIZE', -16000))
+    DATABASE_BUSY_TIMEOUT = float(os.getenv('DATABASE_BUSY_TIMEOUT', 5.0))
+    DATABASE_MIGRATE_ON_STARTUP = os.getenv('DATABASE_MIGRATE_ON_STARTUP', 'true').lower() == 'true'
+    # Mode appliqué aux bases créées : INCREMENTAL permet à la maintenance
+    # de rendre les pages libres sans réécrire toute la base
+    DATABASE_AUTO_VACUUM = os.getenv('DATABASE_AUTO_VACUUM', 'INCREMENTAL')
+
+    # Maintenance SQLite en arrière-plan (voir maintenance.py), exécutée par
+    # un seul processus : celui qui verrouille MAINTENANCE_LOCK_PATH
+    # (DATABASE_PATH + '.maintenance.lock' par défaut). Intervalles en
+    # secondes, 0 désactive le travail. Les tâches terminées créées il y a
+    # plus de MAINTENANCE_ARCHIVE_DAYS jours sont déplacées dans
+    # tasks_archive (0 : jamais). Une base créée sans auto_vacuum
+    # INCREMENTAL est réécrite une fois (VACUUM complet, qui bloque les
+    # écritures) quand ses pages libres dépassent MAINTENANCE_VACUUM_FULL_RATIO.
+    # MAINTENANCE_SNAPSHOT_INTERVAL : instantanés périodiques (désactivés par défaut)
+    MAINTENANCE_ENABLED = os.getenv('MAINTENANCE_ENABLED', 'true').lower() == 'true'
+    MAINTENANCE_LOCK_PATH = os.getenv('MAINTENANCE_LOCK_PATH', '')
+    MAINTENANCE_CHECKPOINT_INTERVAL = float(os.getenv('MAINTENANCE_CHECKPOINT_INTERVAL', 300))
+    MAINTENANCE_CHECKPOINT_MODE = os.getenv('MAINTENANCE_CHECKPOINT_MODE', 'TRUNCATE')
+    MAINTENANCE_OPTIMIZE_INTERVAL = float(os.getenv('MAINTENANCE_OPTIMIZE_INTERVAL', 3600))
+    MAINTENANCE_VACUUM_INTERVAL = float(os.getenv('MAINTENANCE_VACUUM_INTERVAL', 3600))
+    MAINTENANCE_VACUUM_PAGES = int(os.getenv('MAINTENANCE_VACUUM_PAGES', 0))
+    MAINTENANCE_VACUUM_FULL_RATIO = float(os.getenv('MAINTENANCE_VACUUM_FULL_RATIO', 0.25))
+    MAINTENANCE_ARCHIVE_INTERVAL = float(os.getenv('MAINTENANCE_ARCHIVE_INTERVAL', 3600))
+    MAINTENANCE_ARCHIVE_DAYS = int(os.getenv('MAINTENANCE_ARCHIVE_DAYS', 0))
+    MAINTENANCE_ARCHIVE_BATCH_SIZE = int(os.getenv('MAINTENANCE_ARCHIVE_BATCH_SIZE', 1000))
+    MAINTENANCE_SNAPSHOT_INTERVAL = float(os.getenv('MAINTENANCE_SNAPSHOT_INTERVAL', 0))
+
+    # Instantanés compressés des bases (voir snapshot.py) : dossier
+    # snapshots à côté de DATABASE_PATH si SNAPSHOT_DIR est vide, les
+    # SNAPSHOT_KEEP derniers conservés par base (0 : tous), niveau gzip 1 à 9
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', '')
+    SNAPSHOT_KEEP = int(os.getenv('SNAPSHOT_KEEP', 3))
+    SNAPSHOT_COMPRESS_LEVEL = int(os.getenv('SNAPSHOT_COMPRESS_LEVEL', 1))
+
+    # Pagination de la liste des tâches
+    TASKS_PAGE_SIZE = int(os.getenv('TASKS_PAGE_SIZE', 50))
+    TASKS_PAGE_SIZE_MAX = int(os.getenv('TASKS_PAGE_SIZE_MAX', 500))
+    INDEX_STREAMING = os.getenv('INDEX_STREAMING', 'false').lower() == 'true'
+
+    # Mises à jour en direct (/events, Server-Sent Events). Chaque flux
+    # occupe un thread avec le worker gthread : pour des milliers de
+    # connexions inactives par worker, utiliser WEB_INTERFACE=asgi, ou
+    # WEB_WORKER_CLASS=gevent (paquet gevent) et WEB_WORKER_CONNECTIONS. Un flux se termine après
+    # EVENTS_STREAM_SECONDS, le navigateur se reconnecte sans perte
+    EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', 'true').lower() == 'true'
+    EVENTS_BUFFER_SIZE = int(os.getenv('EVENTS_BUFFER_SIZE', 256))
+    EVENTS_BATCH_SIZE = int(os.getenv('EVENTS_BATCH_SIZE', 200))
+    EVENTS_POLL_INTERVAL_MS = float(os.getenv('EVENTS_POLL_INTERVAL_MS', 250))
+    EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+    EVENTS_STREAM_SECONDS = float(os.getenv('EVENTS_STREAM_SECONDS', 300))
+    EVENTS_MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', 1000))
+
+    # Code compilé des templates partagé entre processus et redémarrages
+    # (répertoire temporaire de Jinja si TEMPLATE_BYTECODE_CACHE_DIR est vide)
+    TEMPLATE_BYTECODE_CACHE = os.getenv('TEMPLATE_BYTECODE_CACHE', 'true').lower() == 'true'
+    TEMPLATE_BYTECODE_CACHE_DIR = os.getenv('TEMPLATE_BYTECODE_CACHE_DIR', '')
+    # Chargement de tous les templates à la création de l'application
+    TEMPLATE_PRECOMPILE = os.getenv('TEMPLATE_PRECOMPILE', 'true').lower() == 'true'
+    # Lignes de tâche rendues conservées en mémoire (0 pour les rendre à
+    # chaque affichage)
+    TEMPLATE_FRAGMENT_CACHE_SIZE = int(os.getenv('TEMPLATE_FRAGMENT_CACHE_SIZE', 20000))
+
+    # Cache des pages de la liste des tâches (0 pour le désactiver)
+    TASK_CACHE_SIZE = int(os.getenv('TASK_CACHE_SIZE', 128))
+    TASK_CACHE_HTML = os.getenv('TASK_CACHE_HTML', 'true').lower() == 'true'
+
+    # API JSON : compression gzip des réponses au-delà de API_GZIP_MIN_SIZE octets
+    API_GZIP_MIN_SIZE = int(os.getenv('API_GZIP_MIN_SIZE', 1024))
+    API_GZIP_LEVEL = int(os.getenv('API_GZIP_LEVEL', 5))
+
+    # Écritures groupées (write-behind) : 'off', 'durable' ou 'relaxed'.
+    # Un lot est validé après WRITE_BEHIND_MAX_DELAY_MS ms ou
+    # WRITE_BEHIND_MAX_BATCH opérations
+    WRITE_BEHIND_MODE = os.getenv('WRITE_BEHIND_MODE', 'off').lower()
+    WRITE_BEHIND_MAX_BATCH = int(os.getenv('WRITE_BEHIND_MAX_BATCH', 100))
+    WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv('WRITE_BEHIND_MAX_DELAY_MS', 2))
+    WRITE_BEHIND_QUEUE_SIZE = int(os.getenv('WRITE_BEHIND_QUEUE_SIZE', 10000))
+    WRITE_BEHIND_TIMEOUT = float(os.getenv('WRITE_BEHIND_TIMEOUT', 5.0))
+
+    # Export (/export, flask export-tasks) et import (/import, flask
+    # import-tasks) en flux : lignes lues par lots de EXPORT_BATCH_SIZE,
+    # insérées par transactions de IMPORT_BATCH_SIZE
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 10000))
+
+    # Recherche plein texte : seules les SEARCH_RANK_WINDOW correspondances
+    # les plus récentes sont classées par pertinence (0 pour tout classer)
+    SEARCH_RANK_WINDOW = int(os.getenv('SEARCH_RANK_WINDOW', 1000))
+
+    # Ajout de tâches en masse
+    BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 1000))
+    BULK_MAX_TASKS = int(os.getenv('BULK_MAX_TASKS', 10000))
+
+    # Serveur de production (serve.py / gunicorn). WEB_INTERFACE=asgi sert
+    # l'application par une boucle asyncio (worker uvicorn, voir asgi.py) :
+    # WEB_THREADS est alors la taille du pool qui exécute les vues et
+    # WEB_WORKER_CLASS est ignoré
+    WEB_INTERFACE = os.getenv('WEB_INTERFACE', 'wsgi').lower()
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5000')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', os.cpu_count() or 1))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+    WEB_WORKER_CONNECTIONS = int(os.getenv('WEB_WORKER_CONNECTIONS', 1000))
+    WEB_WORKER_CLASS = os.getenv('WEB_WORKER_CLASS', 'gthread')
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 30))
+    WEB_KEEPALIVE = int(os.getenv('WEB_KEEPALIVE', 5))
+    WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', 0))
+
+    # Contrôle d'admission (voir admission.py). Limitation de débit par
+    # adresse IP (désactivée si RATE_LIMIT_PER_SECOND vaut 0 ; derrière un
+    # proxy, tous les clients partagent son adresse) : réponse 429
+    RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', 0))
+    RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 20))
+    RATE_LIMIT_MAX_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', 10000))
+    # Délestage (réponse 503) au-delà de LOAD_SHED_MAX_CONCURRENT requêtes en
+    # cours par worker, ou de LOAD_SHED_MAX_WRITES écritures. Désactivé par
+    # défaut : les limites par défaut, tirées de WEB_THREADS (un thread libre
+    # pour les sondes, la moitié pour les lectures), ne valent que pour les
+    # workers gthread. Avec gevent (WEB_WORKER_CONNECTIONS) ou
+    # WEB_INTERFACE=asgi, fixer les deux limites explicitement
+    LOAD_SHED_ENABLED = os.getenv('LOAD_SHED_ENABLED', 'false').lower() == 'true'
+    LOAD_SHED_MAX_CONCURRENT = int(os.getenv('LOAD_SHED_MAX_CONCURRENT', max(WEB_THREADS - 1, 1)))
+    LOAD_SHED_MAX_WRITES = int(os.getenv('LOAD_SHED_MAX_WRITES', max(WEB_THREADS // 2, 1)))
+    LOAD_SHED_RETRY_AFTER = int(os.getenv('LOAD_SHED_RETRY_AFTER', 1))
+
+    # Instrumentation du chemin critique : histogrammes SQL, rendu, logging
+    # et acquisition de connexion ; jauge du nombre de tâches (toutes bases
+    # confondues) rafraîchie par un thread toutes les
+    # INSTRUMENTATION_ROW_COUNT_INTERVAL secondes (0 : désactivée).
+    # Désactivée par défaut tant que benchmarks/bench_instrumentation.py ne
+    # montre pas un surcoût inférieur à 2 %
+    INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'false').lower() == 'true'
+    INSTRUMENTATION_ROW_COUNT_INTERVAL = float(os.getenv('INSTRUMENTATION_ROW_COUNT_INTERVAL', 15))
+
+    # Sondes /readyz et /health : résultat de la vérification du stockage
+    # rafraîchi en arrière-plan toutes les HEALTH_CHECK_TTL secondes ; le
+    # thread s'arrête après HEALTH_CHECK_IDLE secondes sans sonde
+    HEALTH_CHECK_TTL = float(os.getenv('HEALTH_CHECK_TTL', 5))
+    HEALTH_CHECK_IDLE = float(os.getenv('HEALTH_CHECK_IDLE', 300))
+
+    # Profilage de production (désactivé par défaut) : échantillonnage de
+    # tous les threads par /admin/profile, ou cProfile d'une seule requête
+    # portant l'en-tête X-Profile (fichier écrit dans PROFILING_DIR, nommé
+    # dans l'en-tête X-Profile de la réponse). Les deux exigent l'en-tête
+    # X-Admin-Token égal à PROFILING_TOKEN. La durée d'échantillonnage doit
+    # rester inférieure à WEB_TIMEOUT
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+    PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', 5))
+    PROFILING_MAX_SECONDS = float(os.getenv('PROFILING_MAX_SECONDS', 20))
+    PROFILING_DIR = os.getenv('PROFILING_DIR', 'profiles')
+    PROFILING_MAX_CONCURRENT = int(os.getenv('PROFILING_MAX_CONCURRENT', 2))
+
+    # Logging JSON asynchrone (file bornée + thread d'écriture)
+    LOG_ASYNC = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_QUEUE_POLICY = os.getenv('LOG_QUEUE_POLICY', 'drop')
+    LOG_QUEUE_TIMEOUT = float(os.getenv('LOG_QUEUE_TIMEOUT', 1.0))
+    LOG_SERIALIZER = os.getenv('LOG_SERIALIZER', 'auto')
+
+    # Échantillonnage des logs par action, ex. "health_check_success=1/100"
+    # (1 sur 100) ou "view_tasks=10/s" (au plus 10 par seconde)
+    LOG_SAMPLING = os.getenv('LOG_SAMPLING', '')
+
     # Configuration de sécurité
     SESSION_COOKIE_SECURE = os.getenv('FLASK_ENV') == 'production'
     SESSION_COOKIE_HTTPONLY = True
@@ -21,11 +214,13 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    LOG_SAMPLING = os.getenv('LOG_SAMPLING', 'view_tasks=10/s')
 
 
 class TestingConfig(Config):
     TESTING = True
     DATABASE_PATH = '/tmp/test.db'
+    MAINTENANCE_ENABLED = False
 
 
 config = {
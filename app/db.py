@@ -0,0 +1,405 @@
+"""Gestion des connexions SQLite : une connexion longue durée par thread"""
+import os
+import sqlite3
+import threading
+
+from blinker import Namespace
+
+try:
+    from .instrumentation import TimedConnection
+    from .migrations import BULK_INSERT_TRIGGERS
+except ImportError:
+    from instrumentation import TimedConnection
+    from migrations import BULK_INSERT_TRIGGERS
+
+signals = Namespace()
+
+# Émis après chaque modification validée de la table tasks, avec
+# action ('added', 'updated', 'completed', 'deleted') et les ids concernés
+tasks_changed = signals.signal('tasks-changed')
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+AUTO_VACUUM_MODES = ('NONE', 'FULL', 'INCREMENTAL')
+
+
+class ConnectionPool:
+    """Pool de connexions SQLite, une connexion persistante par thread.
+
+    Les connexions sont ouvertes à la demande puis réutilisées par toutes les
+    requêtes servies par le même thread. Les pragmas ne sont appliqués qu'une
+    seule fois, à l'ouverture. Après un fork (workers gunicorn), les
+    connexions héritées du parent sont abandonnées et rouvertes dans l'enfant.
+
+    Chaque connexion est associée au thread qui l'a ouverte : celles des
+    threads terminés (serveur à un thread par requête) sont fermées à
+    l'ouverture suivante, ce qui borne le pool au nombre de threads vivants.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # connexion -> thread propriétaire
+        self._connections = {}
+        self._pid = os.getpid()
+        self._counters = {
+            'opened': 0,
+            'closed': 0,
+            'acquired': 0,
+            'reused': 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.config.get('DATABASE_POOL_ENABLED', True)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _check_pid(self):
+        """Oublie les connexions héritées d'un processus parent"""
+        if self._pid != os.getpid():
+            with self._lock:
+                self._pid = os.getpid()
+                self._connections = {}
+            self._local = threading.local()
+
+    def connect(self, db_path=None):
+        """Ouvre une nouvelle connexion configurée (hors pool).
+
+        `db_path` désigne une autre base que DATABASE_PATH (partitions).
+        """
+        db_path = db_path or self.config['DATABASE_PATH']
+        factory = (TimedConnection if self.config.get('INSTRUMENTATION_ENABLED', False)
+                   else sqlite3.Connection)
+        conn = sqlite3.connect(db_path,
+                               timeout=self.config.get('DATABASE_BUSY_TIMEOUT', 5.0),
+                               check_same_thread=False, factory=factory)
+        self._apply_pragmas(conn)
+        self._count('opened')
+        return conn
+
+    def _apply_pragmas(self, conn):
+        journal_mode = self.config.get('DATABASE_JOURNAL_MODE', 'WAL').upper()
+        synchronous = self.config.get('DATABASE_SYNCHRONOUS', 'NORMAL').upper()
+        auto_vacuum = self.config.get('DATABASE_AUTO_VACUUM', 'NONE').upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError('Mode de journal invalide: {}'.format(journal_mode))
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError('Mode synchronous invalide: {}'.format(synchronous))
+        if auto_vacuum not in AUTO_VACUUM_MODES:
+            raise ValueError('Mode auto_vacuum invalide: {}'.format(auto_vacuum))
+
+        # Sans effet sur une base existante créée dans un autre mode, avant
+        # son prochain VACUUM complet (voir maintenance.vacuum)
+        conn.execute('PRAGMA auto_vacuum = {}'.format(auto_vacuum))
+
+        conn.execute('PRAGMA journal_mode = {}'.format(journal_mode))
+        conn.execute('PRAGMA synchronous = {}'.format(synchronous))
+        conn.execute('PRAGMA mmap_size = {:d}'.format(
+            int(self.config.get('DATABASE_MMAP_SIZE', 0))))
+        conn.execute('PRAGMA cache_size = {:d}'.format(
+            int(self.config.get('DATABASE_CACHE_SIZE', -2000))))
+
+    def acquire(self):
+        """Retourne la connexion du thread courant, ouverte si nécessaire"""
+        self._check_pid()
+        self._count('acquired')
+
+        if not self.enabled:
+            return self.connect()
+
+        db_path = self.config['DATABASE_PATH']
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.path == db_path:
+            self._count('reused')
+            return conn
+
+        if conn is not None:
+            self._discard(conn)
+
+        self._close_orphans()
+        conn = self.connect()
+        self._local.conn = conn
+        self._local.path = db_path
+        with self._lock:
+            self._connections[conn] = threading.current_thread()
+        return conn
+
+    def _close_orphans(self):
+        """Ferme les connexions des threads terminés"""
+        with self._lock:
+            orphans = [conn for conn, owner in self._connections.items() if not owner.is_alive()]
+            for conn in orphans:
+                del self._connections[conn]
+        for conn in orphans:
+            self._close(conn)
+
+    def release(self, conn):
+        """Rend la connexion au pool à la fin du contexte applicatif"""
+        if not self.enabled or conn is not getattr(self._local, 'conn', None):
+            self._close(conn)
+            return
+
+        # Une transaction laissée ouverte (erreur en cours de requête)
+        # ne doit pas fuir vers la requête suivante
+        if conn.in_transaction:
+            conn.rollback()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._connections.pop(conn, None)
+        self._local.conn = None
+        self._close(conn)
+
+    def _close(self, conn):
+        conn.close()
+        self._count('closed')
+
+    def close_all(self):
+        """Ferme toutes les connexions ouvertes par ce processus"""
+        self._check_pid()
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for conn in connections:
+            self._close(conn)
+        self._local = threading.local()
+
+    def stats(self):
+        """Statistiques du pool pour la supervision"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['open'] = len(self._connections)
+        stats['enabled'] = self.enabled
+        stats['pid'] = self._pid
+        return stats
+
+
+# Opérations unitaires : elles ne valident pas la transaction, ce qui
+# permet de les exécuter directement ou dans un lot write-behind.
+# `owner` limite l'opération à la liste d'un utilisateur (partitions, voir
+# shards.py) ; None : toutes les tâches de la base
+
+def owner_filter(owner):
+    """(condition SQL préfixée par AND, paramètres) limitant à `owner`"""
+    if owner is None:
+        return '', ()
+    return ' AND user_id = ?', (owner,)
+
+
+def fetch_task(conn, task_id, owner=None):
+    condition, parameters = owner_filter(owner)
+    return conn.execute('SELECT id, task, completed FROM tasks WHERE id = ?' + condition,
+                        (task_id, *parameters)).fetchone()
+
+
+def count_tasks(conn, owner=None):
+    condition, parameters = owner_filter(owner)
+    return conn.execute('SELECT COUNT(*) FROM tasks WHERE TRUE' + condition,
+                        parameters).fetchone()[0]
+
+
+def insert_task(conn, task, owner=None):
+    """Insère une tâche et retourne son id"""
+    return conn.execute('INSERT INTO tasks (task, user_id) VALUES (?, ?)',
+                        (task, owner or '')).lastrowid
+
+
+def set_completed(conn, task_id, owner=None):
+    """Marque une tâche terminée ; retourne le nombre de lignes modifiées"""
+    condition, parameters = owner_filter(owner)
+    return conn.execute('UPDATE tasks SET completed = TRUE WHERE id = ?' + condition,
+                        (task_id, *parameters)).rowcount
+
+
+def version_filter(owner, expected):
+    """owner_filter, limité en outre à la version `expected` de la tâche.
+
+    `expected` est la ligne (id, task, completed) lue par le client : la
+    condition, évaluée par l'instruction d'écriture elle-même, ne retient
+    la tâche que si elle n'a pas changé depuis.
+    """
+    condition, parameters = owner_filter(owner)
+    if expected is None:
+        return condition, parameters
+    return condition + ' AND task = ? AND completed = ?', (*parameters, expected[1], expected[2])
+
+
+def update_task(conn, task_id, changes, owner=None, expected=None):
+    """Modifie les colonnes `changes` ({colonne: valeur}) d'une tâche.
+
+    Retourne le nombre de lignes modifiées : 0 si la tâche n'existe pas ou
+    ne correspond plus à `expected`.
+    """
+    condition, parameters = version_filter(owner, expected)
+    assignments = ', '.join('{} = ?'.format(column) for column in changes)
+    return conn.execute('UPDATE tasks SET {} WHERE id = ?{}'.format(assignments, condition),
+                        (*changes.values(), task_id, *parameters)).rowcount
+
+
+def remove_task(conn, task_id, owner=None, expected=None):
+    """Supprime une tâche ; retourne le nombre de lignes supprimées (voir update_task)"""
+    condition, parameters = version_filter(owner, expected)
+    return conn.execute('DELETE FROM tasks WHERE id = ?' + condition,
+                        (task_id, *parameters)).rowcount
+
+
+def insert_tasks(conn, tasks, owner=None):
+    """Insère un lot de tâches en une transaction et retourne leurs ids.
+
+    BEGIN IMMEDIATE prend le verrou d'écriture avant les insertions : avec
+    AUTOINCREMENT, les ids attribués au lot sont donc consécutifs.
+    """
+    return _insert_batch(conn, 'INSERT INTO tasks (task, user_id) VALUES (?, ?)',
+                         ((task, owner or '') for task in tasks), len(tasks))
+
+
+def insert_task_rows(conn, rows, owner=None):
+    """Insère un lot de lignes (task, completed) en une transaction (import).
+
+    Les triggers d'insertion (index plein texte, journal des modifications)
+    sont remplacés par leurs équivalents ensemblistes (BULK_INSERT_TRIGGERS) :
+    supprimés puis recréés dans la transaction du lot, ils restent en place
+    pour les autres connexions. Retourne les ids attribués, consécutifs comme
+    pour insert_tasks.
+    """
+    return _insert_batch(conn, 'INSERT INTO tasks (task, completed, user_id) VALUES (?, ?, ?)',
+                         ((task, completed, owner or '') for task, completed in rows),
+                         len(rows), bulk_triggers=True)
+
+
+def _insert_batch(conn, sql, parameters, count, bulk_triggers=False):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        triggers = []
+        if bulk_triggers:
+            triggers = conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'tasks' "
+                "AND name IN ({})".format(', '.join('?' * len(BULK_INSERT_TRIGGERS))),
+                tuple(BULK_INSERT_TRIGGERS)).fetchall()
+            for name, _ in triggers:
+                conn.execute('DROP TRIGGER {}'.format(name))
+        conn.executemany(sql, parameters)
+        last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        for name, trigger_sql in triggers:
+            conn.execute(BULK_INSERT_TRIGGERS[name], (last_id - count + 1, last_id))
+            conn.execute(trigger_sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return list(range(last_id - count + 1, last_id + 1))
+
+
+def iter_task_batches(conn, batch_size=1000, owner=None):
+    """Toutes les tâches par id croissant, en lots de `batch_size` lignes.
+
+    Le curseur est consommé au fil de l'eau : la mémoire utilisée ne dépend
+    pas du nombre de tâches, et la lecture voit un instantané cohérent de la
+    base tant que l'itération n'est pas terminée.
+    """
+    condition, parameters = owner_filter(owner)
+    cursor = conn.execute('SELECT id, task, completed FROM tasks WHERE TRUE{} '
+                          'ORDER BY id'.format(condition), parameters)
+    try:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield batch
+    finally:
+        cursor.close()
+
+
+# Filtres de statut ; "completed = 0" correspond à l'index partiel
+# idx_tasks_open (voir migrations.py)
+STATUS_FILTERS = {
+    None: '',
+    'open': ' AND completed = 0',
+    'done': ' AND completed = 1',
+}
+
+
+def fetch_task_page(conn, page_args, owner=None):
+    """Page de tâches d'id supérieur à `page_args.after`, lue à la demande"""
+    condition, parameters = owner_filter(owner)
+    cursor = conn.execute(
+        'SELECT id, task, completed FROM tasks WHERE id > ?{}{} '
+        'ORDER BY id LIMIT ?'.format(condition, STATUS_FILTERS[page_args.status]),
+        (page_args.after, *parameters, page_args.limit + 1))
+    return TaskPage(cursor, page_args.limit)
+
+
+def search_tasks(conn, search_args, rank_window=0, owner=None):
+    """Tâches correspondant à la requête FTS5, les plus pertinentes d'abord.
+
+    Retourne (lignes, next_offset) ; next_offset vaut None s'il n'y a pas
+    d'autre page. Le classement utilise bm25 (colonne rank de FTS5). Classer
+    un terme fréquent oblige à évaluer bm25 sur toutes ses occurrences :
+    avec `rank_window`, seules les correspondances les plus récentes (ids
+    les plus grands) sont classées, ce qui borne le coût de la requête.
+    Avec `owner`, la fenêtre ne compte que les tâches de sa liste.
+    """
+    condition, parameters = owner_filter(owner)
+    if condition:
+        condition = ' AND rowid IN (SELECT id FROM tasks WHERE TRUE{})'.format(condition)
+    if rank_window:
+        hits = ('(SELECT rowid, rank FROM tasks_fts WHERE tasks_fts MATCH ?{} '
+                'ORDER BY rowid DESC LIMIT {:d})'.format(condition, rank_window))
+    else:
+        hits = '(SELECT rowid, rank FROM tasks_fts WHERE tasks_fts MATCH ?{})'.format(condition)
+    rows = conn.execute(
+        'SELECT tasks.id, tasks.task, tasks.completed FROM {} AS hits '
+        'JOIN tasks ON tasks.id = hits.rowid{} '
+        'ORDER BY hits.rank LIMIT ? OFFSET ?'.format(
+            hits, STATUS_FILTERS[search_args.status]),
+        (search_args.match, *parameters, search_args.limit + 1, search_args.offset)).fetchall()
+    if len(rows) > search_args.limit:
+        return rows[:search_args.limit], search_args.offset + search_args.limit
+    return rows, None
+
+
+class TaskPage:
+    """Page de tâches lue depuis un curseur paginé par id (keyset).
+
+    Le curseur (ou tout itérable de lignes) doit renvoyer au plus
+    `limit + 1` lignes triées par id : la ligne supplémentaire indique
+    seulement qu'une page suivante existe.
+    L'itération consomme le curseur au fil de l'eau, sans construire de
+    liste, ce qui permet le rendu en streaming ; `load()` matérialise la
+    page lorsque le nombre de lignes est nécessaire avant le rendu.
+    """
+
+    def __init__(self, cursor, limit):
+        self._cursor = cursor
+        self._rows = None
+        self.limit = limit
+        self.next_after = None
+
+    def load(self):
+        if self._rows is None:
+            self._rows = list(self._iter_cursor())
+        return self
+
+    def _iter_cursor(self):
+        count = 0
+        last_id = None
+        for row in self._cursor:
+            if count == self.limit:
+                self.next_after = last_id
+                break
+            count += 1
+            last_id = row[0]
+            yield row
+        if hasattr(self._cursor, 'close'):
+            self._cursor.close()
+
+    def __iter__(self):
+        if self._rows is not None:
+            return iter(self._rows)
+        return self._iter_cursor()
+
+    def __len__(self):
+        return len(self.load()._rows)
@@ -0,0 +1,331 @@
+"""Mises à jour en direct de la liste des tâches (Server-Sent Events).
+
+Le journal des modifications du stockage (table task_events, alimentée par
+triggers dans tous les processus) est relu par un thread par worker, réveillé
+par le signal tasks_changed pour les écritures locales et toutes les
+`poll_interval` secondes pour celles des autres workers. Chaque lecture
+devient un message SSE conservé dans un tampon circulaire borné.
+
+Un flux abonné ne détient qu'un curseur (id du dernier événement envoyé) :
+tous les flux attendent sur la même condition, sans file par connexion. Un
+client qui se reconnecte avec Last-Event-ID reçoit les messages manqués
+depuis le tampon, ou depuis le journal s'ils en sont sortis ; au-delà, un
+événement `reset` lui demande de recharger la page.
+
+Les flux de l'application asyncio (asgi.py) attendent sur un asyncio.Event
+par boucle, réveillé par le thread de lecture : ils n'occupent aucun thread.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+# Message SSE couvrant les événements first_id..last_id
+EventMessage = namedtuple('EventMessage', ['first_id', 'last_id', 'data'])
+
+RESET_MESSAGE = b'event: reset\ndata: {}\n\n'
+KEEPALIVE_MESSAGE = b': keepalive\n\n'
+
+
+class TooManyStreams(Exception):
+    """Nombre maximal de flux atteint dans ce worker"""
+
+
+def encode_events(rows):
+    """Message SSE compact d'une suite d'événements du journal.
+
+    Les modifications sont regroupées par action : ajouts et modifications
+    avec le texte et l'état de la tâche, complétions et suppressions par id.
+    """
+    delta = {}
+    for _, action, task_id, task, completed in rows:
+        if action in ('added', 'updated'):
+            delta.setdefault(action, []).append([task_id, task, bool(completed)])
+        else:
+            delta.setdefault(action, []).append(task_id)
+    payload = json.dumps(delta, ensure_ascii=False, separators=(',', ':'))
+    return EventMessage(rows[0][0], rows[-1][0], 'id: {}\nevent: tasks\ndata: {}\n\n'.format(
+        rows[-1][0], payload).encode())
+
+
+class EventBroker:
+    """Diffuse le journal de `repository` aux flux SSE du processus.
+
+    Le thread de lecture démarre avec le premier flux et s'arrête après
+    `idle` secondes sans flux ni consultation de position().
+    """
+
+    def __init__(self, repository, buffer_size=256, batch_size=200, poll_interval=0.25,
+                 idle=60.0, max_streams=1000, logger=None):
+        self.repository = repository
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.idle = idle
+        self.max_streams = max_streams
+        self.logger = logger
+        self._ring = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._streams = 0
+        self._used = 0.0
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        # Boucle asyncio -> Event des flux asynchrones, remplacé à chaque réveil
+        self._loops = {}
+        # (id, instant) : position lue dans le stockage, sans thread de lecture
+        self._position = None
+
+    @property
+    def streams(self):
+        return self._streams
+
+    def notify(self, sender, **extra):
+        """Récepteur du signal tasks_changed : relecture immédiate du journal"""
+        self._position = None
+        self._wake.set()
+
+    def position(self):
+        """Id du dernier événement diffusé (jamais en avance sur le stockage).
+
+        Sans flux ouvert dans ce worker, le thread de lecture n'est pas
+        démarré : l'id est lu dans le stockage, puis gardé `poll_interval`
+        secondes (ou jusqu'à la prochaine écriture du worker). Une position
+        en retard est sans risque : le flux renvoie les événements que la
+        page contient déjà.
+        """
+        if self._thread is not None and self._pid == os.getpid() and self._ready.is_set():
+            self._used = time.monotonic()
+            return self._last_id
+        now = time.monotonic()
+        cached = self._position
+        if cached is not None and now - cached[1] < self.poll_interval:
+            return cached[0]
+        last_id = self.repository.last_event_id()
+        # Instant pris avant la lecture : une écriture concurrente ne peut
+        # que rendre la position en retard
+        self._position = (last_id, now)
+        return last_id
+
+    # Thread de lecture
+
+    def _start(self):
+        self._used = time.monotonic()
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    # Après un fork, le thread du processus parent n'existe pas
+                    self._pid = os.getpid()
+                    self._stop.clear()
+                    self._ready.clear()
+                    self._thread = threading.Thread(target=self._run, name='task-events',
+                                                    daemon=True)
+                    self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        try:
+            # Un redémarrage repart de la fin du journal : les flux en retard
+            # sont rattrapés par _catch_up
+            last_id = self.repository.last_event_id()
+        except Exception as e:
+            last_id = self._last_id
+            self._log_error(e)
+        with self._cond:
+            self._ring.clear()
+            self._last_id = last_id
+        self._ready.set()
+
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if not self._streams and time.monotonic() - self._used > self.idle:
+                break
+            try:
+                self.poll()
+            except Exception as e:
+                self._log_error(e)
+        with self._lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+        # Position reprise par position() une fois le thread arrêté
+        self._position = (self._last_id, time.monotonic())
+
+    def poll(self):
+        """Ajoute au tampon les événements postérieurs au dernier diffusé"""
+        while True:
+            rows = self.repository.events(self._last_id, self.batch_size)
+            if not rows:
+                return
+            message = encode_events(rows)
+            with self._cond:
+                self._ring.append(message)
+                self._last_id = message.last_id
+                self._cond.notify_all()
+                loops = list(self._loops)
+            for loop in loops:
+                try:
+                    loop.call_soon_threadsafe(self._wake_loop, loop)
+                except RuntimeError:
+                    # Boucle fermée
+                    self._loops.pop(loop, None)
+            if len(rows) < self.batch_size:
+                return
+
+    def _wake_loop(self, loop):
+        # Exécuté dans la boucle : réveille les flux en attente sur l'Event
+        # courant, les suivants attendront le nouveau
+        event = self._loops.get(loop)
+        if event is not None:
+            self._loops[loop] = asyncio.Event()
+            event.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _log_error(self, error):
+        if self.logger is not None:
+            self.logger.error('Erreur de lecture du journal des tâches: {}'.format(str(error)),
+                              extra={'action': 'task_events_error'})
+
+    # Flux
+
+    def _catch_up(self, cursor):
+        """(messages, curseur) postérieurs à `cursor`, None s'ils sont perdus"""
+        return self._from_ring(cursor) or self._from_log(cursor)
+
+    def _from_ring(self, cursor):
+        """(messages, curseur) lus dans le tampon, None s'il faut relire le journal"""
+        with self._cond:
+            pending = []
+            for message in reversed(self._ring):
+                if message.last_id <= cursor:
+                    break
+                pending.append(message)
+        pending.reverse()
+        if pending and pending[0].first_id <= cursor + 1:
+            return [message.data for message in pending], pending[-1].last_id
+        if not pending and cursor >= self._last_id:
+            return [], cursor
+        return None
+
+    def _from_log(self, cursor):
+        # Sorti du tampon : relecture du journal du stockage
+        rows = self.repository.events(cursor, self.batch_size)
+        if not rows or rows[0][0] != cursor + 1:
+            return None
+        message = encode_events(rows)
+        return [message.data], message.last_id
+
+    def _open(self, cursor):
+        """(curseur, premier message) d'un nouveau flux"""
+        if self._streams >= self.max_streams:
+            raise TooManyStreams('Trop de flux ouverts ({})'.format(self._streams))
+        self._start()
+        if cursor is not None and cursor > self.repository.last_event_id():
+            # Jeton d'un autre stockage (base remplacée, redémarrage du
+            # moteur en mémoire)
+            return self._last_id, RESET_MESSAGE
+        return self._last_id if cursor is None else cursor, b''
+
+    def stream(self, cursor=None, heartbeat=15.0, duration=300.0, retry_ms=2000):
+        """Générateur du flux SSE à partir de l'événement `cursor` exclu.
+
+        Sans curseur, seuls les événements à venir sont envoyés. Le flux se
+        termine après `duration` secondes : le navigateur se reconnecte avec
+        Last-Event-ID, ce qui libère régulièrement la connexion.
+        Lève TooManyStreams au-delà de `max_streams` flux.
+        """
+        cursor, first = self._open(cursor)
+        return self._generate(cursor, first, heartbeat, duration, retry_ms)
+
+    def _generate(self, cursor, first, heartbeat, duration, retry_ms):
+        # Compté une fois le flux démarré : le serveur ferme le générateur
+        # (finally) quand le client se déconnecte
+        with self._lock:
+            self._streams += 1
+        try:
+            yield 'retry: {:d}\n\n'.format(retry_ms).encode() + first
+            deadline = time.monotonic() + duration
+            while True:
+                self._used = time.monotonic()
+                result = self._catch_up(cursor)
+                if result is None:
+                    yield RESET_MESSAGE
+                    cursor = self._last_id
+                    continue
+                messages, cursor = result
+                if messages:
+                    yield b''.join(messages)
+                    continue
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                with self._cond:
+                    arrived = self._cond.wait_for(lambda: self._last_id > cursor,
+                                                  min(heartbeat, remaining))
+                if not arrived:
+                    yield KEEPALIVE_MESSAGE
+        finally:
+            with self._lock:
+                self._streams -= 1
+
+    async def astream(self, cursor=None, heartbeat=15.0, duration=300.0, retry_ms=2000,
+                      executor=None):
+        """Variante asynchrone de stream() pour une boucle asyncio.
+
+        Les lectures du stockage (ouverture, relecture du journal)
+        s'exécutent dans `executor` ; l'attente des événements n'occupe aucun
+        thread. Lève TooManyStreams au-delà de `max_streams` flux.
+        """
+        loop = asyncio.get_running_loop()
+        cursor, first = await loop.run_in_executor(executor, self._open, cursor)
+        return self._agenerate(loop, executor, cursor, first, heartbeat, duration, retry_ms)
+
+    async def _agenerate(self, loop, executor, cursor, first, heartbeat, duration, retry_ms):
+        with self._lock:
+            self._streams += 1
+        try:
+            yield 'retry: {:d}\n\n'.format(retry_ms).encode() + first
+            deadline = time.monotonic() + duration
+            while True:
+                self._used = time.monotonic()
+                result = self._from_ring(cursor)
+                if result is None:
+                    result = await loop.run_in_executor(executor, self._from_log, cursor)
+                if result is None:
+                    yield RESET_MESSAGE
+                    cursor = self._last_id
+                    continue
+                messages, cursor = result
+                if messages:
+                    yield b''.join(messages)
+                    continue
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                # Event courant pris après la lecture du tampon, sans attente
+                # entre les deux : un réveil ne peut pas être manqué
+                with self._cond:
+                    event = self._loops.setdefault(loop, asyncio.Event())
+                    arrived = self._last_id > cursor
+                if arrived:
+                    continue
+                try:
+                    await asyncio.wait_for(event.wait(), min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE_MESSAGE
+        finally:
+            with self._lock:
+                self._streams -= 1
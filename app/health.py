@@ -0,0 +1,111 @@
+"""Sondes de disponibilité : résultat de vérification mis en cache.
+
+Les sondes (/readyz, /health) sont appelées très souvent par Docker et le
+répartiteur de charge : elles lisent le dernier résultat de
+HealthChecker au lieu d'interroger le stockage à chaque appel. Le résultat
+est rafraîchi toutes les `ttl` secondes par un thread démarré à la première
+sonde, qui s'arrête de lui-même après `idle` secondes sans sonde.
+"""
+import os
+import threading
+import time
+
+
+class HealthChecker:
+    """Exécute `check()` en arrière-plan et garde son dernier résultat.
+
+    `check` retourne un dictionnaire de détails ou lève une exception si le
+    stockage est indisponible. Un résultat plus vieux que `stale_after`
+    secondes est recalculé par la sonde elle-même.
+    """
+
+    def __init__(self, check, ttl=5.0, idle=300.0, logger=None):
+        self.check = check
+        self.ttl = ttl
+        self.idle = idle
+        self.stale_after = max(3 * ttl, ttl + 1.0)
+        self.logger = logger
+        self._result = None
+        self._checked = 0.0
+        self._probed = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def result(self):
+        """Dernier résultat : dict ready, checked_at, age, check_ms, details, error"""
+        self._probed = time.monotonic()
+        if self._expired():
+            # Aucun résultat récent (première sonde, thread arrêté ou bloqué) :
+            # vérification dans le thread de la sonde
+            with self._refresh_lock:
+                if self._expired():
+                    self.refresh()
+        self._ensure_thread()
+
+        result = dict(self._result)
+        result['age'] = round(time.monotonic() - self._checked, 3)
+        return result
+
+    def _expired(self):
+        return self._result is None or time.monotonic() - self._checked > self.stale_after
+
+    def refresh(self):
+        """Exécute la vérification et enregistre son résultat"""
+        started = time.perf_counter()
+        try:
+            details, error = self.check(), None
+        except Exception as e:
+            details, error = {}, str(e)
+        result = {'ready': error is None, 'checked_at': time.time(),
+                  'check_ms': round((time.perf_counter() - started) * 1000, 3),
+                  'details': details, 'error': error}
+
+        previous = self._result
+        self._result, self._checked = result, time.monotonic()
+        if previous is not None and previous['ready'] != result['ready']:
+            self._log_change(result)
+        elif previous is None and error is not None:
+            self._log_change(result)
+        return result
+
+    def _log_change(self, result):
+        # Seuls les changements d'état sont journalisés, jamais les sondes
+        if self.logger is None:
+            return
+        if result['ready']:
+            self.logger.info('Stockage de nouveau disponible',
+                             extra={'action': 'readiness_recovered'})
+        else:
+            self.logger.error('Stockage indisponible: {}'.format(result['error']),
+                              extra={'action': 'readiness_failed'})
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                # Après un fork, le thread du processus parent n'existe pas
+                self._pid = os.getpid()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='health-check',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.ttl):
+            if time.monotonic() - self._probed > self.idle:
+                break
+            with self._refresh_lock:
+                self.refresh()
+        with self._lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
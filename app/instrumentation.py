@@ -0,0 +1,174 @@
+"""Instrumentation du chemin critique des requêtes (INSTRUMENTATION_ENABLED).
+
+La durée totale d'une requête (prometheus_flask_exporter) ne dit pas où le
+temps est passé : ces histogrammes séparent l'exécution SQL (par type
+d'instruction), le rendu des templates, l'écriture des logs et
+l'acquisition de connexion. Les séries étiquetées sont résolues une fois
+pour toutes afin de limiter le coût de chaque mesure.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from flask import before_render_template, template_rendered
+from prometheus_client import Gauge, Histogram
+
+# Durées courtes : une requête SQLite indexée prend quelques dizaines de µs
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                0.025, 0.05, 0.1, 0.25, 1.0)
+
+DB_QUERY_SECONDS = Histogram(
+    'db_query_seconds', 'Durée d\'exécution des instructions SQL', ['kind'],
+    buckets=FAST_BUCKETS)
+DB_ACQUIRE_SECONDS = Histogram(
+    'db_connection_acquire_seconds', 'Durée d\'acquisition d\'une connexion du pool',
+    buckets=FAST_BUCKETS)
+TEMPLATE_RENDER_SECONDS = Histogram(
+    'template_render_seconds', 'Durée de rendu des templates', ['template'],
+    buckets=FAST_BUCKETS)
+LOG_EMIT_SECONDS = Histogram(
+    'log_emit_seconds', 'Temps passé dans le logging par le thread appelant',
+    buckets=FAST_BUCKETS)
+TASK_ROWS = Gauge(
+    'tasks_rows', 'Nombre de lignes de la table tasks', multiprocess_mode='livemax')
+
+STATEMENT_KINDS = ('select', 'insert', 'update', 'delete', 'pragma')
+TRANSACTION_KEYWORDS = ('begin', 'savepoint', 'release', 'rollback', 'end')
+
+QUERY_TIMERS = {kind: DB_QUERY_SECONDS.labels(kind)
+                for kind in STATEMENT_KINDS + ('transaction', 'commit', 'other')}
+
+
+@lru_cache(maxsize=512)
+def statement_kind(sql):
+    """Type d'une instruction SQL d'après son premier mot-clé"""
+    words = sql.split(None, 1)
+    keyword = words[0].lower() if words else ''
+    if keyword in TRANSACTION_KEYWORDS:
+        return 'transaction'
+    return keyword if keyword in STATEMENT_KINDS else 'other'
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connexion SQLite qui mesure execute, executemany et commit.
+
+    Seul l'appel est mesuré : les lignes d'un curseur lues plus tard (rendu
+    en streaming) ne sont pas comptées.
+    """
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            QUERY_TIMERS[statement_kind(sql)].observe(time.perf_counter() - started)
+
+    def executemany(self, sql, parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            QUERY_TIMERS[statement_kind(sql)].observe(time.perf_counter() - started)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            QUERY_TIMERS['commit'].observe(time.perf_counter() - started)
+
+
+def timed(histogram, func):
+    """Enveloppe `func` pour mesurer chacun de ses appels"""
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def time_templates(app):
+    """Mesure le rendu des templates de `app` (signaux Flask).
+
+    Pour un rendu en streaming, la mesure couvre toute la génération.
+    """
+    local = threading.local()
+
+    def started(sender, template, **extra):
+        local.started = time.perf_counter()
+
+    def rendered(sender, template, **extra):
+        begin = getattr(local, 'started', None)
+        if begin is not None:
+            TEMPLATE_RENDER_SECONDS.labels(template.name).observe(time.perf_counter() - begin)
+            local.started = None
+
+    before_render_template.connect(started, app, weak=False)
+    template_rendered.connect(rendered, app, weak=False)
+
+
+def time_logger(logger, enabled=True):
+    """Mesure logger.handle : filtres et handlers exécutés par l'appelant.
+
+    Avec un handler asynchrone, seule la mise en file est à la charge de la
+    requête. La méthode de classe est enveloppée (et non un éventuel
+    enveloppement précédent) : l'appel peut être répété sans cumul.
+    """
+    logger.__dict__.pop('handle', None)
+    if enabled:
+        logger.handle = timed(LOG_EMIT_SECONDS, logging.Logger.handle.__get__(logger))
+
+
+class RowCountGauge:
+    """Met à jour TASK_ROWS toutes les `interval` secondes dans un thread.
+
+    `count` (COUNT(*) de chaque base, toutes listes confondues) n'est
+    jamais exécuté par une requête. Le thread est démarré par start(),
+    appelé à chaque requête : il l'est donc dans chaque worker, après le
+    fork.
+    """
+
+    def __init__(self, count, interval, logger=None):
+        self.count = count
+        self.interval = interval
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                # Après un fork, le thread du processus parent n'existe pas
+                self._pid = os.getpid()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='row-count',
+                                                daemon=True)
+                self._thread.start()
+
+    def refresh(self):
+        try:
+            TASK_ROWS.set(self.count())
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.warning('Nombre de tâches indisponible: {}'.format(str(e)),
+                                    extra={'action': 'row_count_error'})
+
+    def _run(self):
+        self.refresh()
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
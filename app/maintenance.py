@@ -0,0 +1,327 @@
+"""Maintenance SQLite en arrière-plan : WAL, statistiques, pages libres, archivage,
+instantanés.
+
+Sans maintenance, une base ouverte pendant des mois grossit et ralentit : les
+suppressions laissent des pages libres dans le fichier, le WAL n'est vidé
+que par les points de contrôle automatiques, l'optimiseur n'a aucune
+statistique et les tâches terminées restent dans `tasks`.
+
+MaintenanceScheduler exécute périodiquement ces travaux (maintenance_jobs)
+dans un thread. Avec plusieurs workers, un seul les exécute : celui qui
+détient le verrou (flock) du fichier MAINTENANCE_LOCK_PATH. Le verrou est
+libéré par le système à la mort du processus, un autre worker le reprend.
+Le fichier de verrou conserve la date du dernier passage de chaque travail :
+un redémarrage ne relance pas tout et ne repousse rien.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+
+import click
+from prometheus_client import Counter, Gauge, Histogram
+
+try:
+    from .repository import file_size
+    from .snapshot import snapshot_dir, take_snapshot
+except ImportError:
+    from repository import file_size
+    from snapshot import snapshot_dir, take_snapshot
+
+MAINTENANCE_JOB_SECONDS = Histogram(
+    'maintenance_job_seconds', 'Durée des travaux de maintenance', ['job'],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 5, 15, 60, 300))
+MAINTENANCE_JOB_RUNS = Counter(
+    'maintenance_job_runs_total', 'Exécutions des travaux de maintenance', ['job', 'result'])
+MAINTENANCE_RECLAIMED_BYTES = Counter(
+    'maintenance_reclaimed_bytes_total',
+    'Octets rendus au système de fichiers par les travaux de maintenance', ['job'])
+MAINTENANCE_ARCHIVED_TASKS = Counter(
+    'maintenance_archived_tasks_total', 'Tâches terminées déplacées dans tasks_archive')
+MAINTENANCE_LEADER = Gauge(
+    'maintenance_leader', 'Processus exécutant la maintenance (1 au plus)',
+    multiprocess_mode='livesum')
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+# Lignes lues par index pour ANALYZE : statistiques approchées, coût borné
+# quelle que soit la taille de la table
+ANALYSIS_LIMIT = 1000
+
+# Délai (s) entre deux tentatives de prise du verrou par les autres workers
+LEADER_RETRY_SECONDS = 30
+
+
+def database_pages(conn):
+    """(taille d'une page, nombre de pages, pages libres)"""
+    return tuple(conn.execute('PRAGMA {}'.format(name)).fetchone()[0]
+                 for name in ('page_size', 'page_count', 'freelist_count'))
+
+
+def checkpoint(conn, db_path, mode='TRUNCATE'):
+    """Recopie le WAL dans la base ; TRUNCATE remet le fichier -wal à zéro.
+
+    Un lecteur en cours peut empêcher de recopier les dernières pages
+    (busy) : le point de contrôle suivant s'en chargera.
+    """
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError('Mode de point de contrôle invalide: {}'.format(mode))
+    before = file_size(db_path + '-wal')
+    busy, wal_frames, checkpointed = conn.execute(
+        'PRAGMA wal_checkpoint({})'.format(mode)).fetchone()
+    return max(before - file_size(db_path + '-wal'), 0), {
+        'busy': bool(busy), 'wal_frames': wal_frames, 'checkpointed': checkpointed}
+
+
+def optimize(conn, db_path):
+    """Rafraîchit les statistiques de l'optimiseur (ANALYZE borné)"""
+    conn.execute('PRAGMA analysis_limit = {:d}'.format(ANALYSIS_LIMIT))
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+    return 0, {}
+
+
+def vacuum(conn, db_path, max_pages=0, full_ratio=0.25):
+    """Rend au système de fichiers les pages libres de la base.
+
+    En auto_vacuum=INCREMENTAL (DATABASE_AUTO_VACUUM), libère au plus
+    `max_pages` pages (0 : toutes) sans réécrire la base. Une base créée
+    sans ce mode est réécrite par un VACUUM complet, qui l'y convertit,
+    dès que ses pages libres dépassent `full_ratio` de sa taille : cela
+    n'arrive qu'une fois.
+    """
+    page_size, pages, free = database_pages(conn)
+    mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    if mode == 2:
+        # execute() n'exécute qu'un pas de l'instruction, qui libère une
+        # seule page : executescript() la mène à son terme
+        conn.executescript('PRAGMA incremental_vacuum({:d})'.format(max_pages))
+        method = 'incremental'
+    elif free and free >= full_ratio * pages:
+        conn.execute('VACUUM')
+        method = 'full'
+    else:
+        method = None
+    _, pages_after, free_after = database_pages(conn)
+    return (pages - pages_after) * page_size, {'method': method, 'free_pages': free_after}
+
+
+def archive(conn, db_path, days=0, batch_size=1000):
+    """Déplace dans tasks_archive les tâches terminées créées il y a plus de
+    `days` jours (0 : désactivé).
+
+    Une transaction courte par lot de `batch_size` tâches : les écritures
+    des requêtes ne sont pas bloquées pendant tout l'archivage. Les
+    triggers de suppression retirent les tâches de l'index plein texte et
+    les signalent aux mises à jour en direct ; les pages libérées sont
+    rendues par `vacuum`.
+    """
+    archived = 0
+    while days > 0:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            ids = json.dumps([row[0] for row in conn.execute(
+                "SELECT id FROM tasks WHERE completed = 1 AND created_at < datetime('now', ?) "
+                'ORDER BY id LIMIT ?', ('-{:d} days'.format(days), batch_size))])
+            conn.execute('INSERT INTO tasks_archive (id, task, created_at, user_id) '
+                         'SELECT id, task, created_at, user_id FROM tasks '
+                         'WHERE id IN (SELECT value FROM json_each(?))', (ids,))
+            count = conn.execute('DELETE FROM tasks WHERE id IN (SELECT value FROM json_each(?))',
+                                 (ids,)).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        archived += count
+        if count < batch_size:
+            break
+    MAINTENANCE_ARCHIVED_TASKS.inc(archived)
+    return 0, {'archived': archived}
+
+
+def maintenance_jobs(settings):
+    """[(nom, intervalle en s, travail(conn, db_path))] d'après la configuration.
+
+    Les travaux d'intervalle nul sont omis.
+    """
+    jobs = [
+        ('checkpoint', settings['MAINTENANCE_CHECKPOINT_INTERVAL'],
+         lambda conn, db_path: checkpoint(conn, db_path, settings['MAINTENANCE_CHECKPOINT_MODE'])),
+        ('optimize', settings['MAINTENANCE_OPTIMIZE_INTERVAL'], optimize),
+        ('archive', settings['MAINTENANCE_ARCHIVE_INTERVAL'] if settings['MAINTENANCE_ARCHIVE_DAYS'] else 0,
+         lambda conn, db_path: archive(conn, db_path, settings['MAINTENANCE_ARCHIVE_DAYS'],
+                                       settings['MAINTENANCE_ARCHIVE_BATCH_SIZE'])),
+        # Après l'archivage, qui libère des pages
+        ('vacuum', settings['MAINTENANCE_VACUUM_INTERVAL'],
+         lambda conn, db_path: vacuum(conn, db_path, settings['MAINTENANCE_VACUUM_PAGES'],
+                                      settings['MAINTENANCE_VACUUM_FULL_RATIO'])),
+        # Après le vacuum : rien à compacter de plus
+        ('snapshot', settings['MAINTENANCE_SNAPSHOT_INTERVAL'],
+         lambda conn, db_path: take_snapshot(conn, db_path, snapshot_dir(settings),
+                                             settings['SNAPSHOT_COMPRESS_LEVEL'],
+                                             settings['SNAPSHOT_KEEP'])),
+    ]
+    return [(name, interval, job) for name, interval, job in jobs if interval > 0]
+
+
+class MaintenanceScheduler:
+    """Exécute `jobs` sur chaque base de `paths()` dans un thread du leader.
+
+    `connect(db_path)` ouvre une connexion dédiée (fermée après chaque
+    travail). Le thread est démarré à la première requête de chaque
+    processus (`ensure_started`) : le processus maître de gunicorn, qui
+    crée l'application sans servir de requête, ne prend pas le verrou.
+    """
+
+    def __init__(self, jobs, paths, connect, lock_path, logger=None):
+        self.jobs = jobs
+        self.paths = paths
+        self.connect = connect
+        self.lock_path = lock_path
+        self.logger = logger
+        self.last_runs = {}
+        self.results = {}
+        self._lock_file = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def leader(self):
+        return self._lock_file is not None
+
+    def ensure_started(self):
+        if self._pid == os.getpid() or not self.jobs:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Après un fork, ni le thread ni le verrou du parent
+                self._pid = os.getpid()
+                self._lock_file = None
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='maintenance', daemon=True)
+                self._thread.start()
+
+    def acquire_leadership(self):
+        """Prend le verrou sans attendre ; True si ce processus est le leader"""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        try:
+            self.last_runs = json.loads(lock_file.read() or '{}')
+        except ValueError:
+            self.last_runs = {}
+        self._lock_file = lock_file
+        MAINTENANCE_LEADER.set(1)
+        if self.logger is not None:
+            self.logger.info('Maintenance prise en charge par ce processus',
+                             extra={'action': 'maintenance_leader'})
+        return True
+
+    def release_leadership(self):
+        lock_file, self._lock_file = self._lock_file, None
+        if lock_file is not None:
+            lock_file.close()
+            MAINTENANCE_LEADER.set(0)
+
+    def _save_last_runs(self):
+        self._lock_file.seek(0)
+        self._lock_file.truncate()
+        json.dump(self.last_runs, self._lock_file)
+        self._lock_file.flush()
+
+    def next_due(self, now=None):
+        """(secondes avant le prochain travail, travaux à exécuter maintenant)"""
+        now = time.time() if now is None else now
+        due, wait = [], LEADER_RETRY_SECONDS
+        for name, interval, job in self.jobs:
+            remaining = self.last_runs.get(name, 0) + interval - now
+            if remaining <= 0:
+                due.append(name)
+            else:
+                wait = min(wait, remaining)
+        return wait, due
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                if not self.acquire_leadership():
+                    self._stop.wait(LEADER_RETRY_SECONDS)
+                    continue
+                wait, due = self.next_due()
+                for name in due:
+                    if self._stop.is_set():
+                        break
+                    self.run_job(name)
+                    self.last_runs[name] = time.time()
+                    self._save_last_runs()
+                if not due:
+                    self._stop.wait(wait)
+        finally:
+            self.release_leadership()
+
+    def run_job(self, name):
+        """Exécute le travail `name` sur chaque base ; retourne ses résultats.
+
+        Une erreur est journalisée et n'interrompt ni les autres bases ni
+        l'ordonnanceur.
+        """
+        job = next(job for job_name, _, job in self.jobs if job_name == name)
+        results = []
+        for db_path in self.paths():
+            started = time.perf_counter()
+            result = {'database': db_path}
+            try:
+                conn = self.connect(db_path)
+                try:
+                    reclaimed, details = job(conn, db_path)
+                finally:
+                    conn.close()
+            except Exception as e:
+                MAINTENANCE_JOB_RUNS.labels(name, 'error').inc()
+                result['error'] = str(e)
+                if self.logger is not None:
+                    self.logger.error('Erreur de maintenance ({}): {}'.format(name, str(e)),
+                                      extra={'action': 'maintenance_error', 'job': name})
+            else:
+                MAINTENANCE_JOB_RUNS.labels(name, 'success').inc()
+                MAINTENANCE_RECLAIMED_BYTES.labels(name).inc(reclaimed)
+                result.update(details, reclaimed_bytes=reclaimed)
+            duration = time.perf_counter() - started
+            MAINTENANCE_JOB_SECONDS.labels(name).observe(duration)
+            result['duration_ms'] = round(duration * 1000, 3)
+            results.append(result)
+            if self.logger is not None and 'error' not in result:
+                self.logger.info('Maintenance {} terminée'.format(name), extra=dict(
+                    result, action='maintenance_job', job=name))
+        self.results[name] = results
+        return results
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread() and \
+                self._pid == os.getpid():
+            # Un VACUUM complet ne s'interrompt pas : attente bornée
+            thread.join(5)
+
+
+def create_maintenance_commands(app, scheduler):
+    """Crée la commande `flask run-maintenance`"""
+    names = [name for name, _, _ in scheduler.jobs]
+
+    @app.cli.command('run-maintenance')
+    @click.argument('jobs', nargs=-1, type=click.Choice(names))
+    def run_maintenance_command(jobs):
+        """Exécute immédiatement les travaux de maintenance (tous par défaut)"""
+        for name in jobs or names:
+            click.echo(json.dumps({'job': name, 'results': scheduler.run_job(name)}))
@@ -0,0 +1,369 @@
+"""Moteur de stockage en mémoire (STORAGE_BACKEND=memory).
+
+Destiné aux déploiements éphémères, aux tests et aux benchmarks, comme
+référence sans accès disque face au moteur SQLite. Les tâches ne sont pas
+partagées entre processus : un seul worker doit servir l'application.
+"""
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from heapq import merge
+from itertools import islice
+from operator import itemgetter
+
+try:
+    from .db import TaskPage
+    from .migrations import EVENT_LOG_SIZE
+    from .repository import TaskRepository, change_action
+except ImportError:
+    from db import TaskPage
+    from migrations import EVENT_LOG_SIZE
+    from repository import TaskRepository, change_action
+
+# Terme d'une requête produite par build_match_query : "mot" ou "mot"*
+MATCH_TERM = re.compile(r'"(\w+)"(\*?)')
+
+STATUS_VALUES = {'open': False, 'done': True}
+# Clé de fusion des lignes (id, task, completed) des bandes
+ROW_ID = itemgetter(0)
+
+
+def fold(text):
+    """Minuscules sans accents, comme le tokenizer unicode61 de FTS5"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def build_matcher(match):
+    """Prédicat sur le texte d'une tâche : tous les termes présents"""
+    terms = [(fold(word), bool(star)) for word, star in MATCH_TERM.findall(match)]
+
+    def matches(task):
+        words = re.findall(r'\w+', fold(task))
+        return all(any(word.startswith(term) if prefix else word == term for word in words)
+                   for term, prefix in terms)
+    return matches
+
+
+class TaskStripe:
+    """Bande de tâches : celles dont l'id a le même reste modulo le nombre
+    de bandes, et le verrou qui les protège.
+
+    `ids` et les index par statut (`by_status[False]` : à faire,
+    `by_status[True]` : terminées) sont des arrays triés d'entiers 64 bits.
+    """
+
+    __slots__ = ('lock', 'rows', 'ids', 'by_status')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.ids = array('q')
+        self.by_status = {False: array('q'), True: array('q')}
+
+    def index(self, status):
+        """Ids triés de la bande, limités au statut `status` (None : tous)"""
+        return self.ids if status is None else self.by_status[status]
+
+    def append(self, task_id, row):
+        # Les ids sont attribués en ordre croissant : ajout en fin d'index
+        self.rows[task_id] = row
+        self.ids.append(task_id)
+        self.by_status[row[1]].append(task_id)
+
+    def set_status(self, task_id, previous, completed):
+        if previous != completed:
+            ids = self.by_status[previous]
+            del ids[bisect_left(ids, task_id)]
+            insort(self.by_status[completed], task_id)
+
+    def remove(self, task_id):
+        row = self.rows.pop(task_id)
+        for ids in (self.ids, self.by_status[row[1]]):
+            del ids[bisect_left(ids, task_id)]
+
+
+class MemoryTaskRepository(TaskRepository):
+    """Tâches en mémoire réparties en `stripes` bandes (id % stripes).
+
+    Chaque bande (TaskStripe) a son dictionnaire id -> (task, completed),
+    son index trié des ids et un index par statut, sous son propre verrou :
+    lire, modifier ou supprimer une tâche ne prend que le verrou de sa
+    bande. Seule l'attribution des ids prend un verrou global, le temps
+    d'ajouter les tâches du lot. Pages, recherches et exports parcourent
+    les bandes l'une après l'autre et fusionnent leurs résultats par id ;
+    les filtres de statut n'examinent que les tâches du statut demandé.
+
+    Si `snapshot_path` est renseigné, les tâches y sont rechargées par
+    init() puis enregistrées toutes les `snapshot_interval` secondes
+    lorsqu'elles ont changé, et à la fermeture.
+    """
+
+    backend = 'memory'
+
+    def __init__(self, sender, stripes=16, snapshot_path=None, snapshot_interval=60.0,
+                 logger=None):
+        super().__init__(sender)
+        self.snapshot_path = snapshot_path or None
+        self.snapshot_interval = snapshot_interval
+        self.logger = logger
+        self._stripes = [TaskStripe() for _ in range(max(int(stripes), 1))]
+        self._next_id = 0
+        self._id_lock = threading.Lock()
+        self._dirty = False
+        self._snapshots = 0
+        self._stop = threading.Event()
+        self._thread = None
+        # Journal des modifications, comme la table task_events du moteur
+        # SQLite : ids contigus, non conservé par les instantanés
+        self._events = deque(maxlen=EVENT_LOG_SIZE)
+        self._last_event_id = 0
+        self._events_lock = threading.Lock()
+
+    def _stripe(self, task_id):
+        return self._stripes[task_id % len(self._stripes)]
+
+    def init(self):
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            self.restore(self.snapshot_path)
+        if self.snapshot_path and self.snapshot_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run_snapshots,
+                                            name='memory-snapshot', daemon=True)
+            self._thread.start()
+        return None
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.snapshot_path and self._dirty:
+            self.snapshot()
+
+    def ping(self):
+        pass
+
+    def check(self):
+        return {'tasks': self.count(), 'snapshots': self._snapshots,
+                'last_write_ms': (round(self.last_write_seconds * 1000, 3)
+                                  if self.last_write_seconds is not None else None)}
+
+    # Lectures
+
+    def _row(self, task_id):
+        row = self._stripe(task_id).rows.get(task_id)
+        return None if row is None else (task_id, row[0], row[1])
+
+    def count(self):
+        return sum(len(stripe.rows) for stripe in self._stripes)
+
+    def count_all(self):
+        return self.count()
+
+    def _rows_after(self, after, limit, status=None):
+        """Les `limit` premières lignes d'id supérieur à `after`.
+
+        Chaque bande fournit au plus `limit` lignes, lues sous son verrou ;
+        la fusion garde l'ordre des ids.
+        """
+        candidates = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                ids = stripe.index(status)
+                start = bisect_right(ids, after)
+                candidates.append([(task_id,) + stripe.rows[task_id]
+                                   for task_id in ids[start:start + limit]])
+        return list(islice(merge(*candidates, key=ROW_ID), limit))
+
+    def page(self, page_args):
+        rows = self._rows_after(page_args.after, page_args.limit + 1,
+                                STATUS_VALUES.get(page_args.status))
+        return TaskPage(rows, page_args.limit)
+
+    def search(self, search_args, rank_window=0):
+        """Recherche par mots entiers ou préfixes, sans classement bm25 :
+        les tâches les plus récentes sont retournées en premier"""
+        matches = build_matcher(search_args.match)
+        status = STATUS_VALUES.get(search_args.status)
+        wanted = search_args.offset + search_args.limit + 1
+        candidates = []
+        for stripe in self._stripes:
+            found = []
+            with stripe.lock:
+                for task_id in reversed(stripe.index(status)):
+                    task, completed = stripe.rows[task_id]
+                    if matches(task):
+                        found.append((task_id, task, completed))
+                        if len(found) == wanted:
+                            break
+            candidates.append(found)
+        rows = list(islice(merge(*candidates, key=ROW_ID, reverse=True),
+                           search_args.offset, wanted))
+        if len(rows) > search_args.limit:
+            return rows[:search_args.limit], search_args.offset + search_args.limit
+        return rows, None
+
+    def get(self, task_id):
+        return self._row(task_id)
+
+    def export(self, batch_size=1000):
+        # Lots lus par id, chaque bande sous son verrou, relâché entre deux lots
+        after = 0
+        while True:
+            batch = self._rows_after(after, batch_size)
+            if not batch:
+                return
+            after = batch[-1][0]
+            yield batch
+
+    def events(self, after, limit=500):
+        with self._events_lock:
+            if not self._events or after >= self._last_event_id:
+                return []
+            start = max(after - self._events[0][0] + 1, 0)
+            return list(islice(self._events, start, start + limit))
+
+    def last_event_id(self):
+        return self._last_event_id
+
+    def _log(self, action, task_id, row=(None, None)):
+        with self._events_lock:
+            self._last_event_id += 1
+            self._events.append((self._last_event_id, action, task_id) + tuple(row))
+
+    # Écritures
+
+    def add(self, task, wait=True):
+        return self.add_many([task])[0]
+
+    def add_many(self, tasks):
+        return self.import_many([(task, False) for task in tasks])
+
+    def import_many(self, rows):
+        with self._id_lock:
+            first_id = self._next_id + 1
+            self._next_id += len(rows)
+            # Ajouts et journal dans l'ordre des ids ; chaque tâche est
+            # journalisée sous le verrou de sa bande, avant d'être modifiable
+            for task_id, (task, completed) in enumerate(rows, first_id):
+                row = (task, bool(completed))
+                stripe = self._stripe(task_id)
+                with stripe.lock:
+                    stripe.append(task_id, row)
+                    self._log('added', task_id, row)
+            self._dirty = True
+        ids = list(range(first_id, first_id + len(rows)))
+        self.changed('added', ids)
+        return ids
+
+    @staticmethod
+    def _matches(row, expected):
+        """Vrai si `row` (task, completed) est la version `expected` (id, task, completed)"""
+        return expected is None or (row[0] == expected[1] and row[1] == bool(expected[2]))
+
+    def _modify(self, task_id, changes, expected=None):
+        """Applique `changes` à la tâche ; retourne la ligne à jour, None si
+        elle n'existe pas ou ne correspond plus à `expected`"""
+        stripe = self._stripe(task_id)
+        with stripe.lock:
+            row = stripe.rows.get(task_id)
+            if row is None or not self._matches(row, expected):
+                return None
+            new_row = (changes.get('task', row[0]), bool(changes.get('completed', row[1])))
+            stripe.rows[task_id] = new_row
+            stripe.set_status(task_id, row[1], new_row[1])
+            self._dirty = True
+            if new_row != row:
+                completed = new_row[0] == row[0] and new_row[1] and not row[1]
+                self._log('completed' if completed else 'updated', task_id, new_row)
+        return (task_id,) + new_row
+
+    def complete(self, task_id, wait=True):
+        if self._modify(task_id, {'completed': True}) is not None:
+            self.changed('completed', [task_id])
+
+    def update(self, task_id, changes, expected=None):
+        row = self._modify(task_id, changes, expected)
+        if row is not None:
+            self.changed(change_action(changes), [task_id])
+        return row
+
+    def delete(self, task_id, wait=True, expected=None):
+        stripe = self._stripe(task_id)
+        with stripe.lock:
+            row = stripe.rows.get(task_id)
+            if row is None or not self._matches(row, expected):
+                return False
+            stripe.remove(task_id)
+            self._dirty = True
+            self._log('deleted', task_id)
+        self.changed('deleted', [task_id])
+        return True
+
+    # Instantanés
+
+    def snapshot(self, path=None):
+        """Écrit toutes les tâches dans `path` (remplacement atomique).
+
+        Les bandes sont copiées l'une après l'autre, chacune sous son verrou.
+        """
+        path = path or self.snapshot_path
+        started = time.perf_counter()
+        # Remis à zéro avant la copie : une modification concurrente
+        # laisse l'indicateur levé pour l'instantané suivant
+        self._dirty = False
+        candidates = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                candidates.append([(task_id,) + stripe.rows[task_id] for task_id in stripe.ids])
+        tasks = list(merge(*candidates, key=ROW_ID))
+        with self._id_lock:
+            # Lu après la copie : supérieur ou égal à tous les ids copiés
+            next_id = self._next_id
+        data = {'next_id': next_id, 'tasks': tasks}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(data, snapshot_file, ensure_ascii=False, separators=(',', ':'))
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(tmp_path, path)
+        self._snapshots += 1
+        # Seule écriture durable de ce moteur
+        self.last_write_seconds = time.perf_counter() - started
+
+    def restore(self, path):
+        """Remplace les tâches par celles de l'instantané `path`"""
+        with open(path, encoding='utf-8') as snapshot_file:
+            data = json.load(snapshot_file)
+        stripes = [TaskStripe() for _ in self._stripes]
+        for task_id, task, completed in sorted(data['tasks']):
+            stripes[task_id % len(stripes)].append(task_id, (task, bool(completed)))
+        with self._id_lock:
+            for stripe, restored in zip(self._stripes, stripes):
+                with stripe.lock:
+                    stripe.rows, stripe.ids, stripe.by_status = (
+                        restored.rows, restored.ids, restored.by_status)
+            self._next_id = data['next_id']
+            self._dirty = False
+
+    def _run_snapshots(self):
+        while not self._stop.wait(self.snapshot_interval):
+            if not self._dirty:
+                continue
+            try:
+                self.snapshot()
+            except OSError as e:
+                if self.logger is not None:
+                    self.logger.error('Erreur lors de l\'instantané des tâches: {}'.format(str(e)),
+                                      extra={'action': 'memory_snapshot_error'})
+
+    def stats(self):
+        return {'backend': self.backend, 'tasks': self.count(),
+                'stripes': len(self._stripes), 'snapshots': self._snapshots,
+                'dirty': self._dirty}
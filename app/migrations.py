@@ -0,0 +1,206 @@
+"""Migrations versionnées du schéma SQLite.
+
+La version courante du schéma est stockée dans `PRAGMA user_version`.
+Chaque migration est appliquée dans sa propre transaction BEGIN IMMEDIATE :
+quand plusieurs workers démarrent en même temps, un seul l'applique et les
+autres relisent la version une fois le verrou obtenu.
+"""
+import sqlite3
+
+
+def create_tasks_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS tasks
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     task TEXT NOT NULL,
+                     completed BOOLEAN DEFAULT FALSE)''')
+
+
+def add_created_at_and_indexes(conn):
+    """Reconstruit tasks avec created_at puis crée les index de filtrage.
+
+    SQLite n'accepte pas de valeur par défaut non constante dans ALTER TABLE
+    ADD COLUMN : la table est donc recopiée. Le compteur AUTOINCREMENT est
+    conservé pour ne pas réattribuer les ids de tâches supprimées.
+    """
+    row = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+
+    conn.execute('''CREATE TABLE tasks_new
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     task TEXT NOT NULL,
+                     completed BOOLEAN NOT NULL DEFAULT FALSE,
+                     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute('''INSERT INTO tasks_new (id, task, completed)
+                    SELECT id, task, COALESCE(completed, FALSE) FROM tasks''')
+    conn.execute('DROP TABLE tasks')
+    conn.execute('ALTER TABLE tasks_new RENAME TO tasks')
+    if row is not None:
+        updated = conn.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'tasks'",
+            (row[0],)).rowcount
+        if not updated:
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)",
+                         (row[0],))
+
+    # Index partiel : seules les tâches ouvertes y figurent, la requête
+    # "tâches à faire" le parcourt sans lire les tâches terminées
+    conn.execute('CREATE INDEX idx_tasks_open ON tasks (id) WHERE completed = 0')
+    conn.execute('CREATE INDEX idx_tasks_created_at ON tasks (created_at)')
+
+
+def add_full_text_search(conn):
+    """Index plein texte FTS5 des tâches, synchronisé par triggers.
+
+    La table virtuelle ne stocke que l'index (content='tasks') : le texte
+    est relu dans tasks. L'index de préfixes accélère les recherches
+    "mot*" de deux ou trois caractères.
+    """
+    conn.execute('''CREATE VIRTUAL TABLE tasks_fts USING fts5(
+                        task,
+                        content='tasks',
+                        content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2',
+                        prefix='2 3')''')
+    conn.execute('''CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+                        INSERT INTO tasks_fts (rowid, task) VALUES (new.id, new.task);
+                    END''')
+    conn.execute('''CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+                        INSERT INTO tasks_fts (tasks_fts, rowid, task)
+                        VALUES ('delete', old.id, old.task);
+                    END''')
+    conn.execute('''CREATE TRIGGER tasks_fts_update AFTER UPDATE OF task ON tasks BEGIN
+                        INSERT INTO tasks_fts (tasks_fts, rowid, task)
+                        VALUES ('delete', old.id, old.task);
+                        INSERT INTO tasks_fts (rowid, task) VALUES (new.id, new.task);
+                    END''')
+    conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+# Taille du journal task_events : les plus anciennes modifications sont
+# purgées par lots de EVENT_LOG_PURGE_EVERY
+EVENT_LOG_SIZE = 10000
+EVENT_LOG_PURGE_EVERY = 1000
+
+
+def add_task_events(conn):
+    """Journal borné des modifications de tâches, alimenté par triggers.
+
+    Chaque écriture sur tasks, quel que soit le processus ou le chemin
+    (requête, write-behind, ajout en masse), ajoute une ligne dans la même
+    transaction. Les ids (AUTOINCREMENT) sont contigus et ne sont jamais
+    réattribués : ils servent de jetons de reprise aux mises à jour en
+    direct (events.py). Tous les EVENT_LOG_PURGE_EVERY événements, ceux qui
+    dépassent EVENT_LOG_SIZE sont supprimés.
+    """
+    conn.execute('''CREATE TABLE task_events
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     action TEXT NOT NULL,
+                     task_id INTEGER NOT NULL,
+                     task TEXT,
+                     completed BOOLEAN)''')
+    conn.execute('''CREATE TRIGGER task_events_insert AFTER INSERT ON tasks BEGIN
+                        INSERT INTO task_events (action, task_id, task, completed)
+                        VALUES ('added', new.id, new.task, new.completed);
+                    END''')
+    conn.execute('''CREATE TRIGGER task_events_update AFTER UPDATE OF task, completed ON tasks
+                    WHEN new.task IS NOT old.task OR new.completed IS NOT old.completed BEGIN
+                        INSERT INTO task_events (action, task_id, task, completed)
+                        VALUES (CASE WHEN new.task IS old.task AND new.completed AND NOT old.completed
+                                     THEN 'completed' ELSE 'updated' END,
+                                new.id, new.task, new.completed);
+                    END''')
+    conn.execute('''CREATE TRIGGER task_events_delete AFTER DELETE ON tasks BEGIN
+                        INSERT INTO task_events (action, task_id) VALUES ('deleted', old.id);
+                    END''')
+    conn.execute('''CREATE TRIGGER task_events_purge AFTER INSERT ON task_events
+                    WHEN new.id % {every:d} = 0 BEGIN
+                        DELETE FROM task_events WHERE id <= new.id - {size:d};
+                    END'''.format(every=EVENT_LOG_PURGE_EVERY, size=EVENT_LOG_SIZE))
+
+
+def add_task_owner(conn):
+    """Propriétaire des tâches (listes par utilisateur, voir shards.py).
+
+    La valeur par défaut est constante : ALTER TABLE suffit, sans recopie.
+    Hors partitionnement, toutes les tâches appartiennent à la liste ''.
+    L'index (user_id, id) n'est créé que dans les partitions
+    (SHARD_INDEXES) : une base unique ne paie pas son entretien.
+    """
+    conn.execute("ALTER TABLE tasks ADD COLUMN user_id TEXT NOT NULL DEFAULT ''")
+
+
+def add_tasks_archive(conn):
+    """Table des tâches terminées archivées par la maintenance (maintenance.py).
+
+    Les ids sont ceux des tâches d'origine : AUTOINCREMENT ne les réattribue
+    jamais dans tasks.
+    """
+    conn.execute('''CREATE TABLE tasks_archive
+                    (id INTEGER PRIMARY KEY,
+                     task TEXT NOT NULL,
+                     created_at TEXT NOT NULL,
+                     user_id TEXT NOT NULL DEFAULT '',
+                     archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)''')
+
+
+# Index propres aux partitions : pages d'une liste par id croissant
+SHARD_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_tasks_user ON tasks (user_id, id)',
+]
+
+
+# Équivalents ensemblistes des triggers AFTER INSERT de tasks, pour des ids
+# consécutifs (premier, dernier). Un trigger par ligne coûte davantage que
+# l'insertion elle-même : l'import (db.insert_task_rows) retire ces triggers
+# le temps de son lot, dans la même transaction, et exécute ces requêtes
+BULK_INSERT_TRIGGERS = {
+    'tasks_fts_insert':
+        'INSERT INTO tasks_fts (rowid, task) '
+        'SELECT id, task FROM tasks WHERE id BETWEEN ? AND ?',
+    'task_events_insert':
+        "INSERT INTO task_events (action, task_id, task, completed) "
+        "SELECT 'added', id, task, completed FROM tasks WHERE id BETWEEN ? AND ? ORDER BY id",
+}
+
+
+MIGRATIONS = [
+    (1, 'Création de la table tasks', create_tasks_table),
+    (2, 'Colonne created_at et index de filtrage', add_created_at_and_indexes),
+    (3, 'Recherche plein texte FTS5', add_full_text_search),
+    (4, 'Journal des modifications pour les mises à jour en direct', add_task_events),
+    (5, 'Propriétaire des tâches (listes par utilisateur)', add_task_owner),
+    (6, 'Archive des tâches terminées', add_tasks_archive),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, logger=None, target=SCHEMA_VERSION):
+    """Applique les migrations manquantes ; retourne la version finale"""
+    for version, description, apply in MIGRATIONS:
+        if version > target or get_schema_version(conn) >= version:
+            continue
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Un autre processus a pu appliquer la migration pendant
+            # l'attente du verrou d'écriture
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            apply(conn)
+            conn.execute('PRAGMA user_version = {:d}'.format(version))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+        if logger is not None:
+            logger.info('Migration {} appliquée: {}'.format(version, description),
+                        extra={'action': 'db_migration', 'schema_version': version})
+
+    return get_schema_version(conn)
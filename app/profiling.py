@@ -0,0 +1,154 @@
+"""Profilage de production à la demande (PROFILING_ENABLED).
+
+Deux modes, réservés aux détenteurs de PROFILING_TOKEN :
+
+- échantillonnage : le thread de la requête d'administration relève la
+  pile de tous les autres threads du processus (sys._current_frames) toutes les `interval` secondes pendant la
+  durée demandée. Les threads observés ne sont pas ralentis en dehors du
+  relevé lui-même ; le résultat est exporté en piles repliées (flamegraph)
+  ou au format JSON de speedscope ;
+- requête unique : cProfile est activé pour la seule requête qui porte
+  l'en-tête de profilage, et son résultat (pstats) est écrit dans
+  PROFILING_DIR. Au plus `max_concurrent` requêtes sont profilées à la fois.
+"""
+import cProfile
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+PROFILE_FORMATS = ('collapsed', 'speedscope')
+
+
+class ProfilerBusy(Exception):
+    """Un échantillonnage est déjà en cours dans ce processus"""
+
+
+def frame_label(code):
+    return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename),
+                               code.co_firstlineno)
+
+
+def frame_stack(frame):
+    """Codes de la pile de `frame`, de la racine à la frame courante"""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return tuple(codes)
+
+
+class StackSampler:
+    """Échantillonneur de piles de tous les threads du processus.
+
+    Un seul échantillonnage à la fois : sample() lève ProfilerBusy sinon.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def sample(self, duration):
+        """Relève les piles pendant `duration` secondes.
+
+        Retourne un Profile : compte de chaque pile (nom du thread, codes)
+        et durée réelle de l'échantillonnage.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy('Un profilage est déjà en cours')
+        try:
+            return self._sample(duration)
+        finally:
+            self._lock.release()
+
+    def _sample(self, duration):
+        stacks = Counter()
+        own = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + duration
+        samples = 0
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stacks[names.get(ident, str(ident)), frame_stack(frame)] += 1
+            samples += 1
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            time.sleep(min(self.interval, remaining))
+        return Profile(stacks, samples, time.perf_counter() - started, self.interval)
+
+
+class Profile:
+    """Résultat d'un échantillonnage"""
+
+    def __init__(self, stacks, samples, duration, interval):
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+        self.interval = interval
+
+    def collapsed(self):
+        """Piles repliées : "thread;racine;...;feuille compte" par ligne"""
+        lines = ['{};{} {}'.format(thread, ';'.join(frame_label(code) for code in codes), count)
+                 for (thread, codes), count in self.stacks.most_common()]
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def speedscope(self, name='profile'):
+        """Document speedscope : un profil échantillonné par thread"""
+        frames, index = [], {}
+        profiles = {}
+        for (thread, codes), count in self.stacks.items():
+            stack = []
+            for code in codes:
+                if code not in index:
+                    index[code] = len(frames)
+                    frames.append({'name': code.co_name, 'file': code.co_filename,
+                                   'line': code.co_firstlineno})
+                stack.append(index[code])
+            profile = profiles.setdefault(thread, {
+                'type': 'sampled', 'name': thread, 'unit': 'seconds',
+                'startValue': 0, 'endValue': round(self.duration, 6),
+                'samples': [], 'weights': []})
+            profile['samples'].append(stack)
+            profile['weights'].append(round(count * self.interval, 6))
+        return {'$schema': SPEEDSCOPE_SCHEMA, 'name': name, 'exporter': 'app.profiling',
+                'activeProfileIndex': 0, 'shared': {'frames': frames},
+                'profiles': [profiles[thread] for thread in sorted(profiles)]}
+
+
+class RequestProfiler:
+    """cProfile limité à une requête, au plus `max_concurrent` à la fois"""
+
+    def __init__(self, directory, max_concurrent=2):
+        self.directory = directory
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._sequence = itertools.count(1)
+
+    def start(self):
+        """Profil actif pour le thread courant, None si la limite est atteinte"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, method, path):
+        """Arrête `profile` et écrit son résultat ; retourne le nom du fichier"""
+        try:
+            profile.disable()
+            filename = '{}-{}-{}-{}-{}.prof'.format(
+                time.strftime('%Y%m%dT%H%M%S'), os.getpid(), next(self._sequence),
+                method.lower(),
+                re.sub(r'[^A-Za-z0-9]+', '_', path).strip('_') or 'index')
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, filename))
+            return filename
+        finally:
+            self._slots.release()
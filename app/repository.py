@@ -0,0 +1,384 @@
+"""Stockage des tâches : interface TaskRepository et moteur SQLite.
+
+Les routes n'accèdent aux tâches que par un TaskRepository, choisi par
+STORAGE_BACKEND ('sqlite', ou 'memory' : voir memory.py). Les lignes sont
+des tuples (id, task, completed) et chaque écriture validée émet le signal
+tasks_changed.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    from .db import (count_tasks, fetch_task, fetch_task_page, insert_task, insert_task_rows,
+                     insert_tasks, iter_task_batches, remove_task, search_tasks, set_completed,
+                     tasks_changed, update_task)
+    from .migrations import migrate
+except ImportError:
+    from db import (count_tasks, fetch_task, fetch_task_page, insert_task, insert_task_rows,
+                    insert_tasks, iter_task_batches, remove_task, search_tasks, set_completed,
+                    tasks_changed, update_task)
+    from migrations import migrate
+
+STORAGE_BACKENDS = ('sqlite', 'memory')
+
+
+def file_size(path):
+    """Taille du fichier en octets, 0 s'il n'existe pas"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def change_action(changes):
+    """Action tasks_changed d'une modification partielle"""
+    return 'completed' if list(changes) == ['completed'] and changes['completed'] else 'updated'
+
+
+class TaskRepository:
+    """Interface commune des moteurs de stockage des tâches.
+
+    `sender` est l'émetteur du signal tasks_changed (l'application). Avec
+    wait=False, une écriture peut retourner avant d'être durable ; son
+    résultat vaut alors None.
+    """
+
+    backend = None
+
+    def __init__(self, sender):
+        self.sender = sender
+        # Durée (s) de la dernière écriture validée, None si inconnue
+        self.last_write_seconds = None
+
+    def changed(self, action, ids):
+        tasks_changed.send(self.sender, action=action, ids=ids)
+
+    def init(self):
+        """Prépare le stockage ; retourne la version du schéma"""
+        raise NotImplementedError
+
+    def close(self):
+        """Libère les ressources (connexions, threads)"""
+
+    def ping(self):
+        """Lève une exception si le stockage est indisponible"""
+        raise NotImplementedError
+
+    def check(self):
+        """Vérification de disponibilité hors requête (sondes).
+
+        Retourne un dictionnaire de détails ou lève une exception. N'utilise
+        pas les ressources liées à une requête : appelée depuis un thread
+        d'arrière-plan.
+        """
+        self.ping()
+        return {}
+
+    def data_version(self):
+        """Jeton modifié par les écritures des autres processus.
+
+        None pour un stockage propre au processus : le signal tasks_changed
+        suffit alors à invalider les caches.
+        """
+        return None
+
+    def count(self):
+        """Nombre de tâches stockées"""
+        raise NotImplementedError
+
+    def count_all(self):
+        """Nombre de tâches de tout le stockage, toutes listes confondues.
+
+        Appelable hors requête (jauge tasks_rows, thread d'arrière-plan).
+        """
+        raise NotImplementedError
+
+    def page(self, page_args):
+        """TaskPage des tâches d'id supérieur à `page_args.after`"""
+        raise NotImplementedError
+
+    def search(self, search_args, rank_window=0):
+        """(lignes, next_offset) des tâches correspondant à la recherche"""
+        raise NotImplementedError
+
+    def get(self, task_id):
+        """Ligne de la tâche, None si elle n'existe pas"""
+        raise NotImplementedError
+
+    def export(self, batch_size=1000):
+        """Toutes les tâches par id croissant, en lots de lignes lus à la demande.
+
+        La mémoire utilisée ne dépend que de `batch_size`. Appelable hors
+        requête (commande d'export) ; le générateur doit être fermé s'il
+        n'est pas consommé jusqu'au bout.
+        """
+        raise NotImplementedError
+
+    def events(self, after, limit=500):
+        """Modifications d'id supérieur à `after`, les plus anciennes d'abord.
+
+        Tuples (id, action, task_id, task, completed) ; task et completed
+        valent None pour une suppression. Les ids sont contigus : un premier
+        id différent de after + 1 signale des événements purgés. Appelable
+        hors requête (thread des mises à jour en direct).
+        """
+        raise NotImplementedError
+
+    def last_event_id(self):
+        """Id de la dernière modification, 0 si aucune"""
+        raise NotImplementedError
+
+    def add(self, task, wait=True):
+        """Ajoute une tâche et retourne son id"""
+        raise NotImplementedError
+
+    def add_many(self, tasks):
+        """Ajoute un lot de tâches en une transaction ; retourne leurs ids"""
+        raise NotImplementedError
+
+    def import_many(self, rows):
+        """Ajoute un lot de lignes (task, completed) en une transaction.
+
+        Les tâches importées reçoivent de nouveaux ids, dans l'ordre du lot ;
+        retourne ces ids.
+        """
+        raise NotImplementedError
+
+    def complete(self, task_id, wait=True):
+        raise NotImplementedError
+
+    def update(self, task_id, changes, expected=None):
+        """Modifie les colonnes `changes` et retourne la ligne à jour.
+
+        Avec `expected` (ligne lue auparavant), la modification n'a lieu que
+        si la tâche n'a pas changé entre-temps, vérifié dans l'écriture
+        même. Retourne None si aucune ligne n'a été modifiée.
+        """
+        raise NotImplementedError
+
+    def delete(self, task_id, wait=True, expected=None):
+        """Supprime la tâche ; vrai si elle a été supprimée (voir update).
+
+        Avec wait=False en write-behind, retourne None sans attendre.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        return {'backend': self.backend}
+
+
+class SQLiteTaskRepository(TaskRepository):
+    """Tâches stockées dans la base SQLite DATABASE_PATH.
+
+    Les lectures utilisent la connexion du pool liée à la requête
+    (`get_conn`). Les écritures sont validées dans le thread de la requête,
+    ou confiées au thread d'écriture `writer` (write-behind) : la requête
+    attend alors la validation de son lot, sauf en mode `relaxed` pour les
+    écritures appelées avec wait=False.
+
+    `get_owner` retourne l'utilisateur dont la liste est lue ou modifiée
+    (partitions, voir shards.py) ; sans lui, toutes les tâches de la base.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, sender, pool, get_conn, writer=None, relaxed=False, timeout=5.0,
+                 logger=None, get_owner=None):
+        super().__init__(sender)
+        self.pool = pool
+        self.get_conn = get_conn
+        self.get_owner = get_owner
+        self.writer = writer
+        self.relaxed = relaxed
+        self.timeout = timeout
+        self.logger = logger
+        self._events_conn = None
+        self._events_lock = threading.Lock()
+
+    def init(self):
+        """Crée ou met à jour le schéma (migrations versionnées)"""
+        db_path = self.pool.config['DATABASE_PATH']
+        if '/' in db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        conn = self.pool.connect()
+        try:
+            return migrate(conn, self.logger)
+        finally:
+            conn.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.stop()
+        with self._events_lock:
+            if self._events_conn is not None:
+                self._events_conn[1].close()
+                self._events_conn = None
+        self.pool.close_all()
+
+    def owner(self):
+        return self.get_owner() if self.get_owner is not None else None
+
+    def ping(self):
+        self.get_conn().execute('SELECT 1').fetchone()
+
+    def database_paths(self):
+        """Fichiers de base du stockage (maintenance)"""
+        return [self.pool.config['DATABASE_PATH']]
+
+    def check(self):
+        return self._check_files([self.pool.config['DATABASE_PATH']])
+
+    def _check_files(self, paths):
+        """Ouvre une connexion dédiée à chaque base, sans la créer si elle a
+        disparu ; tailles cumulées, plus petite version du schéma"""
+        versions = []
+        for db_path in paths:
+            conn = sqlite3.connect('file:{}?mode=rw'.format(db_path), uri=True,
+                                   timeout=self.pool.config.get('DATABASE_BUSY_TIMEOUT', 5.0))
+            try:
+                conn.execute('SELECT 1').fetchone()
+                versions.append(conn.execute('PRAGMA user_version').fetchone()[0])
+            finally:
+                conn.close()
+        return {'schema_version': min(versions),
+                'database_bytes': sum(file_size(db_path) for db_path in paths),
+                'wal_bytes': sum(file_size(db_path + '-wal') for db_path in paths),
+                'last_write_ms': (round(self.last_write_seconds * 1000, 3)
+                                  if self.last_write_seconds is not None else None)}
+
+    def data_version(self):
+        conn = self.get_conn()
+        return id(conn), conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def count(self):
+        return count_tasks(self.get_conn(), self.owner())
+
+    def count_all(self):
+        # Connexions dédiées, sans filtre d'utilisateur : chaque partition
+        # est comptée entière
+        total = 0
+        for db_path in self.database_paths():
+            conn = self.pool.connect(db_path)
+            try:
+                total += count_tasks(conn)
+            finally:
+                conn.close()
+        return total
+
+    def page(self, page_args):
+        return fetch_task_page(self.get_conn(), page_args, self.owner())
+
+    def search(self, search_args, rank_window=0):
+        return search_tasks(self.get_conn(), search_args, rank_window, self.owner())
+
+    def get(self, task_id):
+        return fetch_task(self.get_conn(), task_id, self.owner())
+
+    def export(self, batch_size=1000):
+        # Base et liste résolues à l'appel : le générateur est parcouru
+        # après la fin de la requête (réponse en streaming)
+        return self._export(None, self.owner(), batch_size)
+
+    def _export(self, db_path, owner, batch_size):
+        # Connexion dédiée : le curseur survit à la requête et n'occupe pas
+        # la connexion du pool
+        conn = self.pool.connect(db_path)
+        try:
+            yield from iter_task_batches(conn, batch_size, owner)
+        finally:
+            conn.close()
+
+    def _read_events(self, sql, parameters=()):
+        """Lecture du journal sur une connexion dédiée, utilisable hors requête"""
+        with self._events_lock:
+            if self._events_conn is None or self._events_conn[0] != os.getpid():
+                self._events_conn = (os.getpid(), self.pool.connect())
+            return self._events_conn[1].execute(sql, parameters).fetchall()
+
+    def events(self, after, limit=500):
+        return self._read_events(
+            'SELECT id, action, task_id, task, completed FROM task_events '
+            'WHERE id > ? ORDER BY id LIMIT ?', (after, limit))
+
+    def last_event_id(self):
+        rows = self._read_events("SELECT seq FROM sqlite_sequence WHERE name = 'task_events'")
+        return rows[0][0] if rows else 0
+
+    def _write(self, operation, action, task_id=None, wait=True):
+        """Exécute et valide `operation(conn)`, puis émet tasks_changed.
+
+        Sans `task_id`, le résultat de l'opération est l'id modifié. Un
+        résultat faux (None, 0, False) signale qu'aucune ligne n'a été
+        modifiée : tasks_changed n'est alors pas émis.
+        """
+        started = time.perf_counter()
+
+        def on_commit(result):
+            # Attente du lot comprise en write-behind
+            self.last_write_seconds = time.perf_counter() - started
+            if result:
+                self.changed(action, [result if task_id is None else task_id])
+
+        if self.writer is None:
+            conn = self.get_conn()
+            result = operation(conn)
+            conn.commit()
+            on_commit(result)
+            return result
+
+        future = self.writer.submit(operation, on_commit)
+        if wait or not self.relaxed:
+            return future.result(self.timeout)
+        future.add_done_callback(self._log_failure)
+        return None
+
+    def _log_failure(self, future):
+        error = future.exception()
+        if error is not None and self.logger is not None:
+            self.logger.error('Erreur lors d\'une écriture différée: {}'.format(str(error)),
+                              extra={'action': 'write_behind_error'})
+
+    def add(self, task, wait=True):
+        owner = self.owner()
+        return self._write(lambda conn: insert_task(conn, task, owner), 'added', wait=wait)
+
+    def add_many(self, tasks):
+        # Un lot est déjà validé en une transaction : pas de write-behind
+        started = time.perf_counter()
+        ids = insert_tasks(self.get_conn(), tasks, self.owner())
+        self.last_write_seconds = time.perf_counter() - started
+        self.changed('added', ids)
+        return ids
+
+    def import_many(self, rows):
+        started = time.perf_counter()
+        ids = insert_task_rows(self.get_conn(), rows, self.owner())
+        self.last_write_seconds = time.perf_counter() - started
+        self.changed('added', ids)
+        return ids
+
+    def complete(self, task_id, wait=True):
+        owner = self.owner()
+        self._write(lambda conn: set_completed(conn, task_id, owner), 'completed', task_id, wait)
+
+    def update(self, task_id, changes, expected=None):
+        owner = self.owner()
+
+        def apply(conn):
+            if not update_task(conn, task_id, changes, owner, expected):
+                return None
+            return fetch_task(conn, task_id, owner)
+
+        return self._write(apply, change_action(changes), task_id)
+
+    def delete(self, task_id, wait=True, expected=None):
+        owner = self.owner()
+        return self._write(lambda conn: remove_task(conn, task_id, owner, expected) > 0,
+                           'deleted', task_id, wait)
+
+    def stats(self):
+        return {'backend': self.backend, 'pool': self.pool.stats(),
+                'writer': self.writer.stats() if self.writer is not None else None}
@@ -0,0 +1,169 @@
+"""Point d'entrée de production : gunicorn multi-processus / multi-threads.
+
+Avec WEB_INTERFACE=asgi, chaque worker est une boucle asyncio (uvicorn)
+servant create_asgi_app().
+
+Usage : python serve.py (paramètres WEB_* lus depuis config.py)
+"""
+import glob
+import os
+import sqlite3
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+# Worker gunicorn de l'interface asyncio (WEB_INTERFACE=asgi)
+ASGI_WORKER_CLASS = 'uvicorn.workers.UvicornWorker'
+WEB_INTERFACES = ('wsgi', 'asgi')
+
+
+def worker_count(settings):
+    """Nombre de workers ; le stockage en mémoire est propre à un processus"""
+    if settings.STORAGE_BACKEND == 'memory':
+        return 1
+    return settings.WEB_WORKERS
+
+
+def prepare_metrics_dir(settings):
+    """Prépare le répertoire des métriques Prometheus multi-processus.
+
+    prometheus_client lit PROMETHEUS_MULTIPROC_DIR à l'import : la variable
+    doit être positionnée avant de charger l'application. Les fichiers de
+    métriques (*.db) d'une exécution précédente sont supprimés pour ne pas
+    fausser les compteurs ; le reste du répertoire, qui peut être fourni par
+    l'utilisateur, n'est pas touché.
+    """
+    metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if not metrics_dir:
+        if worker_count(settings) <= 1:
+            return None
+        metrics_dir = tempfile.mkdtemp(prefix='prometheus-')
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    return metrics_dir
+
+
+def migrate_databases(settings):
+    """Applique les migrations du schéma avant le fork des workers.
+
+    Sans créer l'application : le stockage SQLite (chaque partition avec
+    SHARD_COUNT) est mis à niveau sur des connexions dédiées, fermées avant
+    le fork. Les workers trouvent un schéma à jour et ne se disputent pas
+    les migrations. Retourne la version du schéma, None sans base SQLite.
+    """
+    if settings.STORAGE_BACKEND != 'sqlite' or not settings.DATABASE_MIGRATE_ON_STARTUP:
+        return None
+    try:
+        from .db import ConnectionPool
+        from .repository import SQLiteTaskRepository
+    except ImportError:
+        from db import ConnectionPool
+        from repository import SQLiteTaskRepository
+
+    pool = ConnectionPool({key: getattr(settings, key) for key in dir(settings) if key.isupper()})
+    if settings.SHARD_COUNT:
+        try:
+            from .shards import HashRing, ShardedTaskRepository, ShardPool
+        except ImportError:
+            from shards import HashRing, ShardedTaskRepository, ShardPool
+        repository = ShardedTaskRepository(
+            None, pool, ShardPool(pool, settings.SHARD_MAX_IDLE_CONNECTIONS),
+            HashRing(settings.SHARD_COUNT), None, None)
+    else:
+        repository = SQLiteTaskRepository(None, pool, None)
+    try:
+        return repository.init()
+    except (OSError, sqlite3.Error) as e:
+        # Les workers réessaient au démarrage et /health signale l'erreur
+        sys.stderr.write('Erreur lors de la migration de la base: {}\n'.format(str(e)))
+        return None
+    finally:
+        pool.close_all()
+
+
+def gunicorn_options(settings):
+    """Options gunicorn dérivées de la configuration de l'application"""
+    if settings.WEB_INTERFACE not in WEB_INTERFACES:
+        raise ValueError('Interface web invalide: {}'.format(settings.WEB_INTERFACE))
+    asgi = settings.WEB_INTERFACE == 'asgi'
+    return {
+        'bind': settings.WEB_BIND,
+        'workers': worker_count(settings),
+        'threads': settings.WEB_THREADS,
+        'worker_class': ASGI_WORKER_CLASS if asgi else settings.WEB_WORKER_CLASS,
+        'worker_connections': settings.WEB_WORKER_CONNECTIONS,
+        'timeout': settings.WEB_TIMEOUT,
+        'keepalive': settings.WEB_KEEPALIVE,
+        'max_requests': settings.WEB_MAX_REQUESTS,
+        'max_requests_jitter': settings.WEB_MAX_REQUESTS // 10,
+        'accesslog': None,
+        'child_exit': child_exit,
+    }
+
+
+def child_exit(server, worker):
+    """Nettoie les métriques d'un worker terminé"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_flask_exporter.multiprocess import GunicornInternalPrometheusMetrics
+        GunicornInternalPrometheusMetrics.mark_process_dead_on_child_exit(worker.pid)
+
+
+class TodoApplication(BaseApplication):
+    """Application gunicorn servant create_app() ou create_asgi_app()"""
+
+    def __init__(self, config_name, options, interface='wsgi'):
+        self.config_name = config_name
+        self.options = options
+        self.interface = interface
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return load_factory(self.interface)(self.config_name)
+
+
+def load_factory(interface='wsgi'):
+    """Importe la factory une fois l'environnement Prometheus préparé"""
+    if interface == 'asgi':
+        try:
+            from .asgi import create_asgi_app
+        except ImportError:
+            from asgi import create_asgi_app
+        return create_asgi_app
+    try:
+        from .app import create_app
+    except ImportError:
+        from app import create_app
+    return create_app
+
+
+def main():
+    # Avant l'import de config, qui lit l'environnement
+    load_dotenv()
+    try:
+        from .config import config
+    except ImportError:
+        from config import config
+
+    config_name = os.getenv('FLASK_ENV', 'production')
+    settings = config[config_name]
+    prepare_metrics_dir(settings)
+
+    migrate_databases(settings)
+
+    TodoApplication(config_name, gunicorn_options(settings), settings.WEB_INTERFACE).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""Listes de tâches par utilisateur, réparties entre plusieurs bases SQLite.
+
+Avec SHARD_COUNT > 0, chaque utilisateur (en-tête USER_ID_HEADER) a sa
+propre liste, stockée dans l'une des SHARD_COUNT bases (partitions) choisie
+par hachage cohérent de son identifiant. Une partition contient les listes
+de nombreux utilisateurs, distinguées par la colonne user_id ; les écritures
+de deux partitions ne se disputent pas le même verrou SQLite.
+
+Quand SHARD_COUNT change, le hachage cohérent ne réaffecte qu'environ
+1/SHARD_COUNT des utilisateurs : `flask rebalance-shards --previous N`
+déplace leurs listes vers leur nouvelle partition.
+"""
+import bisect
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+import click
+from prometheus_client import Counter
+
+try:
+    from .migrations import SHARD_INDEXES, migrate
+    from .repository import SQLiteTaskRepository
+except ImportError:
+    from migrations import SHARD_INDEXES, migrate
+    from repository import SQLiteTaskRepository
+
+SHARD_CONNECTIONS_EVICTED = Counter(
+    'shard_connections_evicted_total',
+    'Connexions inactives vers une partition fermées par éviction LRU')
+
+# Points de chaque partition sur l'anneau : plus il y en a, plus la
+# répartition des utilisateurs est régulière
+SHARD_REPLICAS = 100
+
+
+def hash_key(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Hachage cohérent des identifiants d'utilisateur vers `shard_count` partitions.
+
+    Chaque partition occupe SHARD_REPLICAS points de l'anneau ; un
+    utilisateur appartient à la partition du premier point qui suit le
+    hachage de son identifiant. Passer de N à N + 1 partitions ne déplace
+    que les utilisateurs attribués aux points de la nouvelle partition.
+    """
+
+    def __init__(self, shard_count, replicas=SHARD_REPLICAS):
+        if shard_count < 1:
+            raise ValueError('Nombre de partitions invalide: {}'.format(shard_count))
+        self.shard_count = shard_count
+        points = sorted((hash_key('{}:{}'.format(shard, replica)), shard)
+                        for shard in range(shard_count) for replica in range(replicas))
+        self._keys = [key for key, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, user_id):
+        index = bisect.bisect(self._keys, hash_key(user_id))
+        return self._shards[index % len(self._keys)]
+
+
+def shard_path(config, index):
+    """Chemin de la partition `index` : SHARD_PATH_TEMPLATE, ou DATABASE_PATH suffixé"""
+    template = config.get('SHARD_PATH_TEMPLATE')
+    if template:
+        return template.format(index=index)
+    root, ext = os.path.splitext(config['DATABASE_PATH'])
+    return '{}-shard{:03d}{}'.format(root, index, ext)
+
+
+class ShardPool:
+    """Connexions inactives vers les partitions, en nombre borné (LRU).
+
+    Une requête emprunte une connexion vers la partition de son utilisateur
+    (acquire) et la rend à la fin du contexte applicatif (release). Au-delà
+    de `max_idle` connexions inactives, celles de la partition la moins
+    récemment utilisée sont fermées : le nombre de fichiers ouverts ne
+    dépend pas du nombre de partitions. Une connexion empruntée n'est jamais
+    fermée par l'éviction. Les connexions sont ouvertes par `pool`
+    (ConnectionPool.connect : mêmes pragmas que la base unique).
+    """
+
+    def __init__(self, pool, max_idle):
+        self.pool = pool
+        self.max_idle = max_idle
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._counters = {'acquired': 0, 'reused': 0, 'evicted': 0}
+
+    def path(self, index):
+        return shard_path(self.pool.config, index)
+
+    def _check_pid(self):
+        """Oublie les connexions héritées d'un processus parent"""
+        if self._pid != os.getpid():
+            with self._lock:
+                self._pid = os.getpid()
+                self._idle = OrderedDict()
+                self._idle_count = 0
+
+    def acquire(self, index):
+        """Connexion inactive vers la partition `index`, ouverte si nécessaire"""
+        self._check_pid()
+        with self._lock:
+            self._counters['acquired'] += 1
+            idle = self._idle.get(index)
+            if idle:
+                self._counters['reused'] += 1
+                self._idle_count -= 1
+                conn = idle.pop()
+                if not idle:
+                    del self._idle[index]
+                return conn
+        return self.pool.connect(self.path(index))
+
+    def release(self, index, conn):
+        """Rend la connexion ; ferme les plus anciennes au-delà de max_idle"""
+        if conn.in_transaction:
+            conn.rollback()
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(index, []).append(conn)
+            self._idle.move_to_end(index)
+            self._idle_count += 1
+            while self._idle_count > self.max_idle:
+                oldest, idle = next(iter(self._idle.items()))
+                evicted.append(idle.pop(0))
+                if not idle:
+                    del self._idle[oldest]
+                self._idle_count -= 1
+            self._counters['evicted'] += len(evicted)
+        for conn in evicted:
+            conn.close()
+        if evicted:
+            SHARD_CONNECTIONS_EVICTED.inc(len(evicted))
+
+    def close_all(self):
+        """Ferme les connexions inactives de ce processus"""
+        self._check_pid()
+        with self._lock:
+            idle, self._idle = self._idle, OrderedDict()
+            self._idle_count = 0
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['idle'] = self._idle_count
+            stats['idle_shards'] = len(self._idle)
+        stats['max_idle'] = self.max_idle
+        return stats
+
+
+def list_moves(conn, source, ring):
+    """{partition cible: [utilisateurs]} des listes de `conn` à déplacer"""
+    moves = {}
+    for (user_id,) in conn.execute('SELECT DISTINCT user_id FROM tasks'):
+        target = ring.shard_for(user_id)
+        if target != source:
+            moves.setdefault(target, []).append(user_id)
+    return moves
+
+
+def move_lists(conn, target_path, user_ids):
+    """Déplace les tâches de `user_ids` vers la base `target_path`.
+
+    Copie et suppression forment une transaction sur les deux bases
+    (ATTACH) : une erreur n'en laisse aucune trace. En mode WAL, seule une
+    coupure de courant pendant le COMMIT peut n'en appliquer qu'une moitié.
+    Les tâches déplacées reçoivent de nouveaux ids, dans leur ordre
+    d'origine, comme à l'import ; retourne leur nombre.
+    """
+    selected = 'user_id IN (SELECT value FROM json_each(?))'
+    conn.execute('ATTACH DATABASE ? AS target', (target_path,))
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            moved = conn.execute(
+                'INSERT INTO target.tasks (task, completed, created_at, user_id) '
+                'SELECT task, completed, created_at, user_id FROM main.tasks '
+                'WHERE {} ORDER BY id'.format(selected), (json.dumps(user_ids),)).rowcount
+            conn.execute('DELETE FROM main.tasks WHERE ' + selected, (json.dumps(user_ids),))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute('DETACH DATABASE target')
+    return moved
+
+
+class ShardedTaskRepository(SQLiteTaskRepository):
+    """Listes de tâches par utilisateur dans SHARD_COUNT bases SQLite.
+
+    `get_conn` retourne la connexion vers la partition de l'utilisateur
+    courant (`get_owner`), empruntée à `shards` ; les opérations héritées
+    de SQLiteTaskRepository sont limitées à sa liste. Les ids de tâches sont
+    propres à une partition.
+
+    Le journal task_events d'une partition mêle les listes de ses
+    utilisateurs : les mises à jour en direct ne sont pas disponibles, ni le
+    write-behind (un thread d'écriture par base).
+    """
+
+    def __init__(self, sender, pool, shards, ring, get_conn, get_owner, logger=None):
+        super().__init__(sender, pool, get_conn, logger=logger, get_owner=get_owner)
+        self.shards = shards
+        self.ring = ring
+
+    def shard_for(self, user_id):
+        return self.ring.shard_for(user_id)
+
+    def init(self):
+        """Crée ou met à jour le schéma de chaque partition"""
+        return min(self._init_shard(index) for index in range(self.ring.shard_count))
+
+    def _init_shard(self, index):
+        db_path = self.shards.path(index)
+        if '/' in db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self.pool.connect(db_path)
+        try:
+            version = migrate(conn, self.logger)
+            for sql in SHARD_INDEXES:
+                conn.execute(sql)
+            return version
+        finally:
+            conn.close()
+
+    def close(self):
+        super().close()
+        self.shards.close_all()
+
+    def database_paths(self):
+        return [self.shards.path(index) for index in range(self.ring.shard_count)]
+
+    def check(self):
+        details = self._check_files(self.database_paths())
+        details['shard_count'] = self.ring.shard_count
+        return details
+
+    def export(self, batch_size=1000):
+        owner = self.owner()
+        return self._export(self.shards.path(self.shard_for(owner)), owner, batch_size)
+
+    def events(self, after, limit=500):
+        raise NotImplementedError('Mises à jour en direct indisponibles avec SHARD_COUNT')
+
+    def last_event_id(self):
+        raise NotImplementedError('Mises à jour en direct indisponibles avec SHARD_COUNT')
+
+    def rebalance(self, previous_count, dry_run=False):
+        """Déplace chaque liste vers la partition que lui attribue l'anneau.
+
+        Parcourt les partitions existantes parmi les max(previous_count,
+        SHARD_COUNT) premières : une partition retirée est vidée, et relancer
+        la commande ne déplace plus rien. Retourne le nombre d'utilisateurs
+        et de tâches déplacés.
+        """
+        if not dry_run:
+            self.init()
+        result = {'users': 0, 'tasks': 0, 'dry_run': dry_run}
+        for source in range(max(previous_count, self.ring.shard_count)):
+            db_path = self.shards.path(source)
+            if not os.path.exists(db_path):
+                continue
+            conn = self.pool.connect(db_path)
+            try:
+                for target, user_ids in sorted(list_moves(conn, source, self.ring).items()):
+                    if dry_run:
+                        moved = conn.execute(
+                            'SELECT COUNT(*) FROM tasks WHERE user_id IN '
+                            '(SELECT value FROM json_each(?))',
+                            (json.dumps(user_ids),)).fetchone()[0]
+                    else:
+                        moved = move_lists(conn, self.shards.path(target), user_ids)
+                    result['users'] += len(user_ids)
+                    result['tasks'] += moved
+                    if self.logger is not None and not dry_run:
+                        self.logger.info('Listes déplacées vers la partition {}'.format(target), extra={
+                            'action': 'shard_rebalance',
+                            'source': source,
+                            'target': target,
+                            'users': len(user_ids),
+                            'tasks': moved
+                        })
+            finally:
+                conn.close()
+        return result
+
+    def stats(self):
+        return {'backend': self.backend, 'shard_count': self.ring.shard_count,
+                'shards': self.shards.stats()}
+
+
+def create_shard_commands(app, repository):
+    """Crée la commande `flask rebalance-shards`"""
+    @app.cli.command('rebalance-shards')
+    @click.option('--previous', type=int, default=None,
+                  help='SHARD_COUNT avant le changement (par défaut SHARD_COUNT)')
+    @click.option('--dry-run', is_flag=True, help='Compte les déplacements sans les effectuer')
+    def rebalance_shards_command(previous, dry_run):
+        """Déplace les listes vers leur partition après un changement de SHARD_COUNT.
+
+        À lancer avant de démarrer les serveurs avec le nouveau SHARD_COUNT :
+        jusqu'au déplacement, un utilisateur réaffecté voit une liste vide.
+        """
+        try:
+            result = repository.rebalance(previous or repository.ring.shard_count, dry_run)
+        except sqlite3.Error as e:
+            raise click.ClickException(str(e))
+        json.dump(result, sys.stdout)
+        sys.stdout.write('\n')
@@ -0,0 +1,212 @@
+"""Instantanés compressés de la base et restauration rapide.
+
+Copier le fichier d'une base en cours d'écriture n'est pas sûr : la copie
+peut mêler des pages de deux transactions, et ignore celles du WAL. Un
+instantané est une copie compacte et cohérente de la base produite par
+`VACUUM INTO` dans une seule transaction de lecture : en mode WAL, les
+écritures des workers continuent pendant la copie. Le fichier obtenu, sans
+pages libres, est compressé en gzip dans SNAPSHOT_DIR sous le nom
+`<base>-<date UTC>.snapshot.gz` ; seuls les SNAPSHOT_KEEP derniers de chaque
+base sont conservés.
+
+`flask snapshot-tasks` prend un instantané de chaque base (chaque partition
+avec SHARD_COUNT) ; le travail de maintenance `snapshot` fait de même toutes
+les MAINTENANCE_SNAPSHOT_INTERVAL secondes. `flask restore-snapshot`, à
+lancer serveurs arrêtés, décompresse un instantané et remplace la base par
+un renommage atomique : index et index plein texte sont déjà dans le
+fichier, il n'y a rien à reconstruire.
+"""
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+import click
+
+try:
+    from .migrations import SCHEMA_VERSION, get_schema_version, migrate
+    from .repository import file_size
+except ImportError:
+    from migrations import SCHEMA_VERSION, get_schema_version, migrate
+    from repository import file_size
+
+SNAPSHOT_SUFFIX = '.snapshot.gz'
+# <base>-<date UTC>.snapshot.gz ; le groupe capture le nom de la base
+SNAPSHOT_NAME = re.compile(r'(.+)-\d{8}T\d{12}Z' + re.escape(SNAPSHOT_SUFFIX) + '$')
+# Taille des blocs recopiés entre la base et le fichier compressé
+COPY_CHUNK_SIZE = 1 << 20
+
+
+def snapshot_dir(config):
+    """SNAPSHOT_DIR, ou le dossier snapshots à côté de DATABASE_PATH"""
+    return config.get('SNAPSHOT_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(config['DATABASE_PATH'])), 'snapshots')
+
+
+def snapshot_stem(db_path):
+    """Nom de la base sans extension : préfixe de ses instantanés"""
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def list_snapshots(directory, stem):
+    """Instantanés de la base `stem` dans `directory`, du plus ancien au plus récent"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names)
+            if snapshot_source(name) == stem]
+
+
+def snapshot_source(path):
+    """Nom de la base d'un instantané, None si `path` n'en est pas un"""
+    match = SNAPSHOT_NAME.match(os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def remove_file(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def take_snapshot(conn, db_path, directory, level=1, keep=3):
+    """Écrit un instantané compressé de la base de `conn` dans `directory`.
+
+    Le fichier n'apparaît sous son nom définitif qu'une fois complet et
+    synchronisé sur disque. Retourne (0, détails) comme les travaux de
+    maintenance.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = snapshot_stem(db_path)
+    path = os.path.join(directory, '{}-{}{}'.format(
+        stem, datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ'), SNAPSHOT_SUFFIX))
+    raw_path, partial_path = path + '.db.tmp', path + '.tmp'
+    try:
+        conn.execute('VACUUM INTO ?', (raw_path,))
+        copy = sqlite3.connect(raw_path)
+        try:
+            tasks = copy.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+        finally:
+            copy.close()
+        with open(raw_path, 'rb') as source, open(partial_path, 'wb') as output:
+            with gzip.GzipFile(filename=stem + '.db', mode='wb', fileobj=output,
+                               compresslevel=level, mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed, COPY_CHUNK_SIZE)
+            output.flush()
+            os.fsync(output.fileno())
+        size = file_size(raw_path)
+        os.replace(partial_path, path)
+    finally:
+        remove_file(raw_path)
+        remove_file(partial_path)
+
+    pruned = list_snapshots(directory, stem)[:-keep] if keep > 0 else []
+    for old in pruned:
+        remove_file(old)
+    return 0, {'snapshot': path, 'tasks': tasks, 'bytes': size,
+               'compressed_bytes': file_size(path), 'pruned': len(pruned)}
+
+
+def restore_snapshot(source, db_path):
+    """Remplace la base `db_path` par l'instantané `source`.
+
+    Aucun processus ne doit avoir la base ouverte : ses connexions
+    continueraient d'écrire dans l'ancien fichier. L'instantané est
+    décompressé à côté de la base puis mis à niveau (migrations) ; la base
+    n'est remplacée que s'il est valide. Le WAL de l'ancienne base est
+    supprimé avant le renommage : appliqué au nouveau fichier, il le
+    corromprait.
+    """
+    partial_path = db_path + '.restore'
+    try:
+        with gzip.open(source, 'rb') as compressed, open(partial_path, 'wb') as output:
+            shutil.copyfileobj(compressed, output, COPY_CHUNK_SIZE)
+            output.flush()
+            os.fsync(output.fileno())
+        conn = sqlite3.connect(partial_path)
+        try:
+            version = get_schema_version(conn)
+            if version > SCHEMA_VERSION:
+                raise ValueError('Instantané au schéma {} plus récent que cette version ({})'.format(
+                    version, SCHEMA_VERSION))
+            version = migrate(conn)
+            tasks = conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+        finally:
+            conn.close()
+    except Exception:
+        remove_file(partial_path)
+        raise
+
+    for suffix in ('-wal', '-shm'):
+        remove_file(db_path + suffix)
+    os.replace(partial_path, db_path)
+    return {'database': db_path, 'snapshot': source, 'tasks': tasks,
+            'bytes': file_size(db_path), 'schema_version': version}
+
+
+def create_snapshot_commands(app, repository):
+    """Crée les commandes `flask snapshot-tasks` et `flask restore-snapshot`"""
+    def database_paths():
+        if repository.backend != 'sqlite':
+            raise click.ClickException('Instantanés disponibles avec STORAGE_BACKEND=sqlite')
+        return repository.database_paths()
+
+    @app.cli.command('snapshot-tasks')
+    @click.option('--output-dir', default=None, help='Dossier des instantanés (SNAPSHOT_DIR par défaut)')
+    def snapshot_tasks_command(output_dir):
+        """Prend un instantané compressé de chaque base, sans bloquer les écritures"""
+        directory = output_dir or snapshot_dir(app.config)
+        for db_path in database_paths():
+            conn = app.extensions['db_pool'].connect(db_path)
+            try:
+                _, details = take_snapshot(conn, db_path, directory,
+                                           app.config['SNAPSHOT_COMPRESS_LEVEL'],
+                                           app.config['SNAPSHOT_KEEP'])
+            except (OSError, sqlite3.Error) as e:
+                raise click.ClickException(str(e))
+            finally:
+                conn.close()
+            json.dump(dict(details, database=db_path), sys.stdout)
+            sys.stdout.write('\n')
+
+    @app.cli.command('restore-snapshot')
+    @click.argument('snapshots', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+    @click.option('--yes', is_flag=True, help='Ne pas demander de confirmation')
+    def restore_snapshot_command(snapshots, yes):
+        """Remplace les bases par leurs instantanés (les plus récents par défaut).
+
+        Chaque instantané remplace la base de même nom. À lancer serveurs
+        arrêtés.
+        """
+        paths = {snapshot_stem(db_path): db_path for db_path in database_paths()}
+        if snapshots:
+            targets = []
+            for source in snapshots:
+                stem = snapshot_source(source)
+                if stem not in paths:
+                    raise click.ClickException('Aucune base ne correspond à {}'.format(source))
+                targets.append((source, paths[stem]))
+        else:
+            directory = snapshot_dir(app.config)
+            targets = [(list_snapshots(directory, stem)[-1], db_path)
+                       for stem, db_path in sorted(paths.items()) if list_snapshots(directory, stem)]
+            if not targets:
+                raise click.ClickException('Aucun instantané dans {}'.format(directory))
+
+        if not yes:
+            click.confirm('Les bases seront remplacées ; les serveurs sont-ils arrêtés ?', abort=True)
+        repository.close()
+        for source, db_path in targets:
+            try:
+                result = restore_snapshot(source, db_path)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                raise click.ClickException('{}: {}'.format(source, str(e)))
+            json.dump(result, sys.stdout)
+            sys.stdout.write('\n')
+        app.extensions['db_init']()
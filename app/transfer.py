@@ -0,0 +1,268 @@
+"""Export et import des tâches en flux (NDJSON ou CSV), en mémoire constante.
+
+GET /export lit les tâches par lots depuis un curseur (TaskRepository.export)
+et les encode au fil de l'eau : la réponse, sans Content-Length, est envoyée
+en chunked transfer encoding. POST /import analyse le corps ligne à ligne et
+insère les tâches par transactions de IMPORT_BATCH_SIZE lignes. Les commandes
+`flask export-tasks` et `flask import-tasks` font de même avec des fichiers.
+
+Formats (une tâche par ligne) :
+- ndjson : {"id": 1, "task": "...", "completed": false} ; à l'import, une
+  chaîne seule est aussi acceptée ;
+- csv : en-tête id,task,completed ; completed vaut 1 ou 0 (true/false
+  acceptés à l'import).
+Les tâches importées reçoivent de nouveaux ids, dans l'ordre du fichier.
+"""
+import codecs
+import csv
+import io
+import json
+import sys
+import time
+from json.encoder import encode_basestring
+
+import click
+from flask import Response, g, request
+
+try:
+    from .validation import clean_task
+except ImportError:
+    from validation import clean_task
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+IMPORT_MIMETYPES = {'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson',
+                    'text/csv': 'csv'}
+CSV_FIELDS = ('id', 'task', 'completed')
+BOOLEANS = {'1': True, 'true': True, '0': False, 'false': False, '': False}
+
+# Nombre maximal de numéros de lignes refusées renvoyés par un import
+MAX_REPORTED_INVALID = 100
+
+
+def encode_ndjson(batch):
+    return ''.join(['{{"id":{},"task":{},"completed":{}}}\n'.format(
+        task_id, encode_basestring(task), 'true' if completed else 'false')
+        for task_id, task, completed in batch]).encode()
+
+
+def encode_csv(batch):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(
+        (task_id, task, 1 if completed else 0) for task_id, task, completed in batch)
+    return buffer.getvalue().encode()
+
+
+def export_chunks(batches, fmt):
+    """Fragments d'octets de l'export : un par lot de lignes"""
+    encode = encode_csv if fmt == 'csv' else encode_ndjson
+    if fmt == 'csv':
+        yield (','.join(CSV_FIELDS) + '\n').encode()
+    for batch in batches:
+        yield encode(batch)
+
+
+def parse_completed(value):
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    if isinstance(value, str) and value.strip().lower() in BOOLEANS:
+        return BOOLEANS[value.strip().lower()]
+    raise ValueError('completed invalide: {!r}'.format(value))
+
+
+def iter_lines(stream, chunk_size=64 * 1024):
+    """Lignes (terminées par \\n) d'un flux binaire lu par blocs.
+
+    Seule la méthode read() du flux est utilisée : les flux WSGI n'ont pas
+    tous de readline() efficace.
+    """
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if pending:
+        yield pending
+
+
+def parse_ndjson(stream):
+    """(numéro de ligne, task, completed) de chaque ligne d'un flux binaire.
+
+    task vaut None pour une ligne invalide. Les lignes vides sont ignorées.
+    """
+    for number, line in enumerate(iter_lines(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            if isinstance(item, dict):
+                task, completed = clean_task(item.get('task')), parse_completed(item.get('completed'))
+            else:
+                task, completed = clean_task(item), False
+        except ValueError:
+            task, completed = None, False
+        yield number, task, completed
+
+
+def parse_csv(stream):
+    """Comme parse_ndjson pour un CSV avec en-tête (colonnes task, completed).
+
+    Lève ValueError si l'en-tête n'a pas de colonne task.
+    """
+    reader = csv.reader(codecs.iterdecode(iter_lines(stream), 'utf-8-sig'))
+    header = [name.strip().lower() for name in next(reader, [])]
+    if 'task' not in header:
+        raise ValueError('En-tête CSV sans colonne task')
+    task_column = header.index('task')
+    completed_column = header.index('completed') if 'completed' in header else None
+    for record in reader:
+        if not record:
+            continue
+        try:
+            task = clean_task(record[task_column])
+            completed = (parse_completed(record[completed_column])
+                         if completed_column is not None else False)
+        except (IndexError, ValueError):
+            task, completed = None, False
+        # Ligne physique de fin de l'enregistrement, en-tête compris
+        yield reader.line_num, task, completed
+
+
+def import_records(repository, records, batch_size):
+    """Insère les tâches valides de `records` par transactions de `batch_size`.
+
+    Les lignes invalides sont ignorées ; le résultat en donne le nombre et
+    les MAX_REPORTED_INVALID premiers numéros. Une erreur de stockage
+    interrompt l'import : les lots déjà validés restent en base.
+    """
+    result = {'count': 0, 'batches': 0, 'invalid_count': 0, 'invalid': []}
+    batch = []
+
+    def flush():
+        repository.import_many(batch)
+        result['count'] += len(batch)
+        result['batches'] += 1
+        batch.clear()
+
+    for number, task, completed in records:
+        if task is None:
+            result['invalid_count'] += 1
+            if len(result['invalid']) < MAX_REPORTED_INVALID:
+                result['invalid'].append(number)
+            continue
+        batch.append((task, completed))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return result
+
+
+def parse_records(stream, fmt):
+    return parse_csv(stream) if fmt == 'csv' else parse_ndjson(stream)
+
+
+def create_transfer_routes(app, repository):
+    """Crée les routes /export et /import"""
+    @app.route('/export')
+    def export_tasks():
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return {'error': 'Format inconnu: {}'.format(fmt)}, 400
+
+        # Liste résolue pendant la requête : le générateur est parcouru après
+        batches = repository.export(app.config['EXPORT_BATCH_SIZE'])
+
+        def generate():
+            started = time.perf_counter()
+            exported = 0
+            try:
+                for chunk in export_chunks(batches, fmt):
+                    exported += len(chunk)
+                    yield chunk
+            finally:
+                batches.close()
+                app.logger.info('Tâches exportées', extra={
+                    'action': 'export_tasks',
+                    'format': fmt,
+                    'bytes': exported,
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 3)
+                })
+
+        return Response(generate(), mimetype=EXPORT_FORMATS[fmt], headers={
+            'Content-Disposition': 'attachment; filename=tasks.{}'.format(fmt),
+            'Cache-Control': 'no-store'
+        })
+
+    @app.route('/import', methods=['POST'])
+    def import_tasks():
+        fmt = request.args.get('format') or IMPORT_MIMETYPES.get(request.mimetype, 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            return {'error': 'Format inconnu: {}'.format(fmt)}, 400
+
+        try:
+            result = import_records(repository, parse_records(request.stream, fmt),
+                                    app.config['IMPORT_BATCH_SIZE'])
+        except ValueError as e:
+            app.logger.warning('Import illisible: {}'.format(str(e)), extra={
+                'action': 'import_tasks_invalid',
+                'ip_address': request.remote_addr
+            })
+            return {'error': str(e)}, 400
+        except Exception as e:
+            app.logger.error(
+                'Erreur lors de l\'import des tâches: {}'.format(str(e)),
+                extra={'action': 'import_tasks_error'})
+            return {'error': "Erreur lors de l'import des tâches"}, 500
+
+        app.logger.info('Tâches importées', extra={
+            'action': 'import_tasks',
+            'format': fmt,
+            'task_count': result['count'],
+            'invalid_count': result['invalid_count'],
+            'ip_address': request.remote_addr
+        })
+        return result, 201
+
+
+def create_transfer_commands(app, repository):
+    """Crée les commandes `flask export-tasks` et `flask import-tasks`"""
+    @app.cli.command('export-tasks')
+    @click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson')
+    @click.option('--output', '-o', type=click.File('wb'), default='-',
+                  help='Fichier de sortie (sortie standard par défaut)')
+    @click.option('--user', default=None, help='Liste exportée (avec SHARD_COUNT)')
+    def export_tasks_command(fmt, output, user):
+        """Exporte toutes les tâches en NDJSON ou CSV"""
+        if user is not None:
+            g.user_id = user
+        batches = repository.export(app.config['EXPORT_BATCH_SIZE'])
+        try:
+            for chunk in export_chunks(batches, fmt):
+                output.write(chunk)
+        finally:
+            batches.close()
+        output.flush()
+
+    @app.cli.command('import-tasks')
+    @click.argument('source', type=click.File('rb'), default='-')
+    @click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default=None,
+                  help='Format du fichier (déduit de son extension par défaut)')
+    @click.option('--user', default=None, help='Liste complétée (avec SHARD_COUNT)')
+    def import_tasks_command(source, fmt, user):
+        """Importe des tâches depuis un fichier NDJSON ou CSV"""
+        if user is not None:
+            g.user_id = user
+        fmt = fmt or ('csv' if source.name.endswith('.csv') else 'ndjson')
+        try:
+            result = import_records(repository, parse_records(source, fmt),
+                                    app.config['IMPORT_BATCH_SIZE'])
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        json.dump(result, sys.stdout)
+        sys.stdout.write('\n')
@@ -0,0 +1,71 @@
+"""Validation des paramètres et contenus reçus par les routes"""
+import re
+from collections import namedtuple
+
+from flask import request
+
+# Paramètres d'une page de tâches : curseur (id), taille et filtre
+# ('open', 'done' ou None). Hachable, sert aussi de clé de cache.
+PageArgs = namedtuple('PageArgs', ['after', 'limit', 'status'])
+
+STATUSES = ('open', 'done')
+
+# Paramètres d'une recherche : requête FTS5 construite par build_match_query,
+# décalage dans les résultats classés, taille de page et filtre de statut
+SearchArgs = namedtuple('SearchArgs', ['match', 'offset', 'limit', 'status'])
+
+# Un mot suivi éventuellement de * (recherche par préfixe)
+SEARCH_TERM = re.compile(r'(\w+)(\*?)')
+SEARCH_MIN_PREFIX = 2
+SEARCH_MAX_TERMS = 10
+
+# Identifiant d'utilisateur (listes par utilisateur, voir shards.py)
+USER_ID = re.compile(r'[\w.@+-]{1,128}')
+
+
+def clean_task(value):
+    """Normalise le contenu d'une tâche, None si elle est vide ou invalide"""
+    if not isinstance(value, str):
+        return None
+    return value.strip() or None
+
+
+def clean_user_id(value):
+    """Identifiant d'utilisateur reçu, None s'il est invalide"""
+    if not isinstance(value, str) or USER_ID.fullmatch(value) is None:
+        return None
+    return value
+
+
+def get_page_args(app):
+    """Lit les paramètres de pagination (after, limit, status) de la requête"""
+    after = max(request.args.get('after', 0, type=int), 0)
+    limit = request.args.get('limit', app.config['TASKS_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), app.config['TASKS_PAGE_SIZE_MAX'])
+    status = request.args.get('status')
+    return PageArgs(after, limit, status if status in STATUSES else None)
+
+
+def build_match_query(text):
+    """Traduit la saisie utilisateur en requête FTS5, None si elle est vide.
+
+    Chaque mot est placé entre guillemets, ce qui neutralise la syntaxe FTS5
+    (opérateurs, colonnes) ; les mots sont combinés par AND. Un mot terminé
+    par * est recherché par préfixe s'il compte au moins SEARCH_MIN_PREFIX
+    caractères.
+    """
+    terms = []
+    for word, star in SEARCH_TERM.findall(text or '')[:SEARCH_MAX_TERMS]:
+        prefix = '*' if star and len(word) >= SEARCH_MIN_PREFIX else ''
+        terms.append('"{}"{}'.format(word, prefix))
+    return ' '.join(terms) or None
+
+
+def get_search_args(app):
+    """Lit les paramètres de recherche (q, offset, limit, status)"""
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', app.config['TASKS_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), app.config['TASKS_PAGE_SIZE_MAX'])
+    status = request.args.get('status')
+    return SearchArgs(build_match_query(request.args.get('q')), offset, limit,
+                      status if status in STATUSES else None)
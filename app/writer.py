@@ -0,0 +1,181 @@
+"""Écritures groupées (write-behind) : un thread unique valide les
+modifications de tous les threads de requête par lots.
+
+Chaque requête dépose une opération `operation(conn)` dans une file et
+reçoit un Future. Le thread d'écriture regroupe les opérations arrivées
+pendant `max_delay` secondes (au plus `max_batch`) dans une transaction :
+un seul COMMIT, donc une seule synchronisation disque, pour tout le lot, et
+plus de contention "database is locked" entre threads d'un même processus.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from prometheus_client import Gauge, Histogram
+
+WRITE_QUEUE_DEPTH = Gauge(
+    'write_behind_queue_depth',
+    'Opérations en attente dans la file d\'écriture',
+    multiprocess_mode='livesum')
+WRITE_BATCH_SIZE = Histogram(
+    'write_behind_batch_size',
+    'Nombre d\'opérations validées par COMMIT',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+WRITE_COMMIT_SECONDS = Histogram(
+    'write_behind_commit_seconds',
+    'Durée d\'exécution et de validation d\'un lot')
+
+# Modes : 'off' (écriture directe dans le thread de la requête), 'durable'
+# (la requête attend la validation de son lot), 'relaxed' (les routes
+# qui le permettent n'attendent pas)
+WRITE_BEHIND_MODES = ('off', 'durable', 'relaxed')
+
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """Thread d'écriture unique avec validation groupée (group commit).
+
+    Chaque opération s'exécute dans un SAVEPOINT : une opération en erreur
+    est annulée seule et son Future reçoit l'exception, sans faire échouer
+    le reste du lot. Après un fork, la file et le thread sont recréés dans
+    le processus enfant à la première soumission.
+    """
+
+    def __init__(self, connect, max_batch=100, max_delay=0.002, maxsize=10000,
+                 put_timeout=1.0):
+        self.connect = connect
+        self.max_batch = max(int(max_batch), 1)
+        self.max_delay = max_delay
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._counters = {'batches': 0, 'operations': 0, 'failed': 0, 'largest_batch': 0}
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Le thread du processus parent n'existe pas dans l'enfant
+                self._queue = queue.Queue(self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='write-behind',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Valide les opérations en attente puis arrête le thread"""
+        with self._lock:
+            thread, running = self._thread, self._pid == os.getpid()
+            self._thread = None
+            self._pid = None
+        if thread is not None and running:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, operation, on_commit=None):
+        """Met `operation(conn)` en file ; retourne un Future de son résultat.
+
+        `on_commit(résultat)` est appelé par le thread d'écriture après la
+        validation du lot et avant la résolution du Future : un client qui
+        attend le Future observe donc ses effets (invalidation de cache...).
+        Lève queue.Full si la file reste pleine plus de `put_timeout` s.
+        """
+        if self._pid != os.getpid():
+            self.start()
+        future = Future()
+        self._queue.put((operation, on_commit, future), timeout=self.put_timeout)
+        WRITE_QUEUE_DEPTH.inc()
+        return future
+
+    def _next_batch(self):
+        """Attend une opération puis regroupe celles qui suivent"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        conn = None
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+            WRITE_QUEUE_DEPTH.dec(len(batch))
+            try:
+                if conn is None:
+                    conn = self.connect()
+                self._commit(conn, batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+        if conn is not None:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        started = time.perf_counter()
+        outcomes = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for operation, _, _ in batch:
+                conn.execute('SAVEPOINT write_behind')
+                try:
+                    outcomes.append((operation(conn), None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO write_behind')
+                    outcomes.append((None, e))
+                conn.execute('RELEASE write_behind')
+            conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+        WRITE_BATCH_SIZE.observe(len(batch))
+        WRITE_COMMIT_SECONDS.observe(time.perf_counter() - started)
+        failed = sum(1 for _, error in outcomes if error is not None)
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['operations'] += len(batch)
+            self._counters['failed'] += failed
+            self._counters['largest_batch'] = max(self._counters['largest_batch'], len(batch))
+
+        for (_, on_commit, future), (result, error) in zip(batch, outcomes):
+            if error is not None:
+                future.set_exception(error)
+                continue
+            if on_commit is not None:
+                try:
+                    on_commit(result)
+                except Exception as e:
+                    future.set_exception(e)
+                    continue
+            future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
@@ -0,0 +1,20 @@
+"""Point d'entrée WSGI : gunicorn wsgi:app (ou app.wsgi:app).
+
+Charge le fichier .env puis crée l'application. C'est le seul module dont
+l'import a des effets de bord ; python wsgi.py lance le serveur de
+développement.
+"""
+from dotenv import load_dotenv
+
+# Avant l'import de config, qui lit l'environnement
+load_dotenv()
+
+try:
+    from .app import create_app
+except ImportError:
+    from app import create_app
+
+app = create_app()
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,113 @@
+"""Latence des sondes pendant une rafale d'écritures, avec ou sans délestage.
+
+Lance app/serve.py (--workers processus de --threads threads) puis
+--writers clients concurrents envoient POST /add sans pause pendant
+--duration secondes (DATABASE_SYNCHRONOUS=FULL : chaque écriture attend un
+fsync sous le verrou d'écriture SQLite). Pendant ce temps, une sonde
+interroge /health toutes les 100 ms, comme le healthcheck Docker, avec un
+délai de --probe-timeout secondes. Sans délestage, la sonde attend derrière
+les écritures en file ; avec LOAD_SHED_ENABLED, les écritures au-delà de
+LOAD_SHED_MAX_WRITES reçoivent aussitôt 503 et un thread reste libre.
+
+Usage : python benchmarks/bench_admission.py [--writers 32] [--duration 5]
+"""
+import argparse
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from common import percentile, report, serve
+
+
+def writer(port, stop_at, statuses):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    try:
+        while time.perf_counter() < stop_at:
+            conn.request('POST', '/add', body='task=rafale', headers=headers)
+            response = conn.getresponse()
+            response.read()
+            statuses[response.status] += 1
+            if response.status == 503:
+                # Le client respecte Retry-After, en plus court
+                time.sleep(0.05)
+    except OSError as e:
+        statuses[type(e).__name__] += 1
+    finally:
+        conn.close()
+
+
+def prober(port, stop_at, timeout, samples, failures):
+    while time.perf_counter() < stop_at:
+        t0 = time.perf_counter()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        try:
+            conn.request('GET', '/health')
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                samples.append((time.perf_counter() - t0) * 1000)
+            else:
+                failures.append(response.status)
+        except OSError as e:
+            failures.append(type(e).__name__)
+        finally:
+            conn.close()
+        time.sleep(0.1)
+
+
+def run(shedding, writers, workers, threads, duration, probe_timeout, port):
+    directory = tempfile.mkdtemp()
+    db_path = os.path.join(directory, 'tasks.db')
+    statuses, samples, failures = Counter(), [], []
+    try:
+        with serve(db_path, port, workers, threads, DATABASE_SYNCHRONOUS='FULL',
+                   LOAD_SHED_ENABLED='true' if shedding else 'false'):
+            stop_at = time.perf_counter() + duration
+            clients = [threading.Thread(target=writer, args=(port, stop_at, statuses))
+                       for _ in range(writers)]
+            clients.append(threading.Thread(target=prober,
+                                            args=(port, stop_at, probe_timeout, samples, failures)))
+            started = time.perf_counter()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'writes_per_second': round(statuses[302] / elapsed, 1),
+        'write_statuses': {str(status): count for status, count in statuses.items()},
+        'health_probes': len(samples) + len(failures),
+        'health_failures': len(failures),
+        'health_p50_ms': round(percentile(samples, 50), 3),
+        'health_p99_ms': round(percentile(samples, 99), 3),
+        'health_max_ms': round(max(samples, default=0), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--probe-timeout', type=float, default=3)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    results = {}
+    for shedding in (False, True):
+        results['shedding_on' if shedding else 'shedding_off'] = run(
+            shedding, args.writers, args.workers, args.threads, args.duration,
+            args.probe_timeout, args.port)
+    report('admission', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Serveur WSGI (gthread) et serveur asyncio (WEB_INTERFACE=asgi) côte à côte.
+
+Lance app/serve.py dans chaque mode (même nombre de workers, WEB_THREADS
+threads ou taille du pool des vues) et le soumet à --clients clients
+concurrents en boucle fermée (connexions keep-alive), générés par une boucle
+asyncio pour atteindre des concurrences élevées. Chaque mesure est répétée
+avec --streams abonnés /events ouverts pendant la charge : avec gthread,
+chaque flux occupe un thread du worker.
+
+Usage : python benchmarks/bench_asgi.py [--clients 16,256,1024] [--streams 0,32]
+"""
+import argparse
+import asyncio
+import time
+
+from common import percentile, remove_database, report, seed_database, serve, temp_database
+
+PATHS = ['/', '/health', '/?after=500']
+
+
+async def request(reader, writer, path):
+    """GET keep-alive ; retourne le statut (corps lu via Content-Length)"""
+    writer.write('GET {} HTTP/1.1\r\nHost: bench\r\n\r\n'.format(path).encode())
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(lines[0].split()[1])
+
+
+async def client(port, index, stop_at, samples, errors, timeout):
+    i = index
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port),
+                                                timeout)
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            status = await asyncio.wait_for(request(reader, writer, PATHS[i % len(PATHS)]),
+                                            timeout)
+            if status == 200:
+                samples.append((time.perf_counter() - t0) * 1000)
+            else:
+                errors.append(status)
+            i += 1
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+        # Une requête sans réponse après `timeout` secondes compte comme
+        # une erreur et met fin au client
+        errors.append(type(e).__name__)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def subscribe(port, opened):
+    """Abonné /events : lit le flux jusqu'à l'annulation"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /events HTTP/1.1\r\nHost: bench\r\n\r\n')
+    try:
+        await reader.readuntil(b'\r\n\r\n')
+        opened.append(True)
+        while await reader.read(4096):
+            pass
+    finally:
+        writer.close()
+
+
+async def load(port, clients, streams, duration, timeout):
+    opened = []
+    subscribers = [asyncio.ensure_future(subscribe(port, opened)) for _ in range(streams)]
+    deadline = time.perf_counter() + 10
+    while len(opened) < streams and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+    samples, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, i, started + duration, samples, errors, timeout)
+                           for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    for subscriber in subscribers:
+        subscriber.cancel()
+    await asyncio.gather(*subscribers, return_exceptions=True)
+    return {
+        'streams_opened': len(opened),
+        'requests': len(samples),
+        'errors': len(errors),
+        'per_second': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', default='16,256,1024')
+    parser.add_argument('--streams', default='0,32')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--timeout', type=float, default=5,
+                        help='délai maximal d\'une requête (secondes)')
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--port', type=int, default=5098)
+    args = parser.parse_args()
+
+    db_path = temp_database()
+    seed_database(db_path, args.tasks)
+    results = {}
+    for interface in ('wsgi', 'asgi'):
+        with serve(db_path, args.port, args.workers, args.threads, WEB_INTERFACE=interface,
+                   WEB_WORKER_CONNECTIONS='4096', EVENTS_STREAM_SECONDS='3600'):
+            for streams in (int(value) for value in args.streams.split(',')):
+                for clients in (int(value) for value in args.clients.split(',')):
+                    key = '{}_{}_clients_{}_streams'.format(interface, clients, streams)
+                    results[key] = asyncio.run(load(args.port, clients, streams, args.duration,
+                                                         args.timeout))
+    remove_database(db_path)
+    report('asgi', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Débit d'insertion (tâches/s) : ajout unitaire contre ajout en masse.
+
+Usage : python benchmarks/bench_bulk_insert.py [--tasks N] [--target 50000]
+Le script échoue (code 1) si l'ajout en masse reste sous l'objectif.
+"""
+import argparse
+import sys
+import time
+
+from common import make_app, remove_database, report, seed_database, temp_database
+
+
+def tasks_per_second(func, count):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    return {'tasks': count, 'seconds': round(elapsed, 4),
+            'tasks_per_second': round(count / elapsed, 1)}
+
+
+def run(tasks, batch_size):
+    db_path = temp_database()
+    seed_database(db_path, 0)
+    app = make_app(db_path, BULK_MAX_TASKS=max(batch_size, 1))
+    client = app.test_client()
+
+    def single():
+        for i in range(tasks):
+            client.post('/add', data={'task': 'single {}'.format(i)})
+
+    def bulk():
+        for start in range(0, tasks, batch_size):
+            batch = ['bulk {}'.format(i) for i in range(start, min(start + batch_size, tasks))]
+            assert client.post('/tasks/bulk', json=batch).status_code == 201
+
+    results = {
+        'single_add': tasks_per_second(single, tasks),
+        'bulk_add': tasks_per_second(bulk, tasks),
+    }
+    app.extensions['db_pool'].close_all()
+    remove_database(db_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--target', type=float, default=50000,
+                        help='objectif minimal en tâches/s pour l\'ajout en masse')
+    args = parser.parse_args()
+
+    results = run(args.tasks, args.batch_size)
+    results['target_tasks_per_second'] = args.target
+    report('bulk_insert', results)
+    if results['bulk_add']['tasks_per_second'] < args.target:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
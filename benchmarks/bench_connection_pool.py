@@ -0,0 +1,53 @@
+"""Compare le débit des routes avec et sans pool de connexions SQLite.
+
+Usage : python benchmarks/bench_connection_pool.py [--requests N] [--tasks N]
+"""
+import argparse
+
+from common import make_app, measure, remove_database, report, seed_database, temp_database
+
+ROUTES = ['/', '/health']
+
+
+def run(pool_enabled, requests, tasks):
+    db_path = temp_database()
+    seed_database(db_path, tasks)
+    app = make_app(db_path, DATABASE_POOL_ENABLED=pool_enabled)
+    client = app.test_client()
+
+    results = {}
+    for route in ROUTES:
+        results['GET ' + route] = measure(lambda: client.get(route), requests)
+
+    counter = iter(range(10 ** 9))
+    results['POST /add'] = measure(
+        lambda: client.post('/add', data={'task': 'bench {}'.format(next(counter))}),
+        requests)
+
+    ids = iter(range(1, requests + 1))
+    results['GET /complete/<id>'] = measure(
+        lambda: client.get('/complete/{}'.format(next(ids))), requests)
+
+    app.extensions['db_pool'].close_all()
+    remove_database(db_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=20)
+    args = parser.parse_args()
+
+    results = {
+        'connect_per_request': run(False, args.requests, args.tasks),
+        'pooled': run(True, args.requests, args.tasks),
+    }
+    for route, pooled in results['pooled'].items():
+        baseline = results['connect_per_request'][route]['per_second']
+        pooled['speedup'] = round(pooled['per_second'] / baseline, 2) if baseline else None
+    report('connection_pool', results)
+
+
+if __name__ == '__main__':
+    main()
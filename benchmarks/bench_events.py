@@ -0,0 +1,116 @@
+"""Diffusion des mises à jour en direct à de nombreux flux SSE inactifs.
+
+Ouvre --streams flux sur le broker d'une application (base SQLite, triggers
+task_events), chacun consommé par un thread comme le ferait un worker
+gthread. Mesure ensuite :
+- la mémoire et le temps CPU consommés par les flux inactifs ;
+- la latence entre une écriture et sa réception par tous les flux
+  (p50/p95/p99 sur l'ensemble des réceptions ; les écritures rapprochées
+  sont regroupées dans un même message).
+
+Usage : python benchmarks/bench_events.py [--streams 1000] [--writes 50]
+"""
+import argparse
+import threading
+import time
+
+from common import make_app, percentile, remove_database, report, seed_database, temp_database
+
+
+def rss_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def consume(stream, received, ready):
+    """Consomme un flux : heure de réception de chaque id d'événement"""
+    first = True
+    for chunk in stream:
+        if first:
+            ready.release()
+            first = False
+        now = time.perf_counter()
+        for line in chunk.split(b'\n'):
+            if line.startswith(b'id: '):
+                received.append((int(line[4:]), now))
+
+
+def run(streams, writes, interval, idle_seconds):
+    db_path = temp_database()
+    seed_database(db_path, 1000)
+    app = make_app(db_path, EVENTS_POLL_INTERVAL_MS=250)
+    repository = app.extensions['task_repository']
+    broker = app.extensions['event_broker']
+    threading.stack_size(256 * 1024)
+
+    rss_before = rss_kb()
+    ready = threading.Semaphore(0)
+    inboxes, threads = [], []
+    for _ in range(streams):
+        inbox = []
+        stream = broker.stream(heartbeat=3600, duration=3600)
+        thread = threading.Thread(target=consume, args=(stream, inbox, ready), daemon=True)
+        thread.start()
+        inboxes.append(inbox)
+        threads.append(thread)
+    for _ in range(streams):
+        ready.acquire()
+    rss_streams = rss_kb()
+
+    cpu_before = time.process_time()
+    time.sleep(idle_seconds)
+    idle_cpu = time.process_time() - cpu_before
+
+    sent = {}
+    with app.app_context():
+        for i in range(writes):
+            repository.add('Diffusée {}'.format(i))
+            sent[repository.last_event_id()] = time.perf_counter()
+            time.sleep(interval)
+    deadline = time.time() + 10
+    last = max(sent)
+    while time.time() < deadline and any(not inbox or inbox[-1][0] < last for inbox in inboxes):
+        time.sleep(0.01)
+
+    # Un message peut regrouper plusieurs événements : un événement est reçu
+    # avec le premier message d'id supérieur ou égal
+    latencies = []
+    for inbox in inboxes:
+        position = 0
+        for event_id, sent_at in sorted(sent.items()):
+            while position < len(inbox) and inbox[position][0] < event_id:
+                position += 1
+            if position < len(inbox):
+                latencies.append((inbox[position][1] - sent_at) * 1000)
+    broker.stop()
+    repository.close()
+    remove_database(db_path)
+    return {
+        'streams': streams,
+        'rss_per_stream_kb': round((rss_streams - rss_before) / streams, 1),
+        'idle_cpu_percent': round(idle_cpu / idle_seconds * 100, 2),
+        'deliveries': len(latencies),
+        'expected_deliveries': streams * writes,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--streams', type=int, default=1000)
+    parser.add_argument('--writes', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=0.02,
+                        help='secondes entre deux écritures')
+    parser.add_argument('--idle', type=float, default=2.0,
+                        help='durée de la mesure CPU des flux inactifs')
+    args = parser.parse_args()
+    report('events', run(args.streams, args.writes, args.interval, args.idle))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Latence et mémoire de la page d'accueil paginée selon la taille de la table.
+
+Usage : python benchmarks/bench_index_pagination.py [--sizes 1000,100000,1000000]
+"""
+import argparse
+import tracemalloc
+
+from common import make_app, measure, remove_database, report, seed_database, temp_database
+
+
+def peak_memory_kb(func):
+    """Pic d'allocation Python (Ko) pendant un appel"""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def run(size, requests):
+    db_path = temp_database()
+    seed_database(db_path, size)
+    app = make_app(db_path)
+    client = app.test_client()
+
+    middle = size // 2
+    scenarios = {
+        'first_page': '/',
+        'middle_page': '/?after={}'.format(middle),
+        'first_page_streamed': '/?stream=1',
+        'middle_page_streamed': '/?stream=1&after={}'.format(middle),
+    }
+
+    results = {}
+    for name, url in scenarios.items():
+        client.get(url)  # préchauffage (cache de templates, pages SQLite)
+        results[name] = measure(lambda: client.get(url).data, requests)
+        results[name]['peak_kb'] = peak_memory_kb(lambda: client.get(url).data)
+
+    app.extensions['db_pool'].close_all()
+    remove_database(db_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    results = {}
+    for size in (int(value) for value in args.sizes.split(',')):
+        results['{}_tasks'.format(size)] = run(size, args.requests)
+    report('index_pagination', results)
+
+
+if __name__ == '__main__':
+    main()
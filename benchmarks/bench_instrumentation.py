@@ -0,0 +1,75 @@
+"""Coût de l'instrumentation du chemin critique (INSTRUMENTATION_ENABLED).
+
+Mesure le débit des routes avec et sans instrumentation, par tours
+alternés pour répartir le bruit de la machine entre les deux variantes, et
+retient le meilleur tour de chaque variante.
+
+Usage : python benchmarks/bench_instrumentation.py [--requests N] [--rounds 5]
+        [--max-overhead 2]
+Le script échoue (code 1) si le surcoût moyen dépasse --max-overhead (%).
+"""
+import argparse
+import itertools
+import sys
+
+from common import make_app, measure, remove_database, report, seed_database, temp_database
+
+ROUTES = ['/', '/?status=open', '/api/tasks', '/health']
+
+
+def make_client(db_path, enabled):
+    app = make_app(db_path, startup={'INSTRUMENTATION_ENABLED': enabled})
+    return app, app.test_client()
+
+
+def run(requests, rounds, tasks):
+    db_path = temp_database()
+    seed_database(db_path, tasks)
+    # Le logger est partagé entre applications : la variante instrumentée
+    # est créée en dernier pour que son enveloppe reste en place
+    variants = dict([('off', make_client(db_path, False)), ('on', make_client(db_path, True))])
+    counter = itertools.count()
+
+    best = {name: {} for name in variants}
+    for _ in range(rounds):
+        for name, (_, client) in variants.items():
+            scenarios = {'GET ' + route: (lambda route=route: client.get(route))
+                         for route in ROUTES}
+            scenarios['POST /add'] = lambda: client.post(
+                '/add', data={'task': 'bench {}'.format(next(counter))})
+            for scenario, func in scenarios.items():
+                result = measure(func, requests)
+                previous = best[name].get(scenario)
+                if previous is None or result['per_second'] > previous['per_second']:
+                    best[name][scenario] = result
+
+    for app, _ in variants.values():
+        app.extensions['task_repository'].close()
+    remove_database(db_path)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--max-overhead', type=float, default=2.0,
+                        help='surcoût moyen toléré en %% du débit')
+    args = parser.parse_args()
+
+    results = run(args.requests, args.rounds, args.tasks)
+    overheads = {}
+    for scenario, on in results['on'].items():
+        off = results['off'][scenario]['per_second']
+        overheads[scenario] = round((off / on['per_second'] - 1) * 100, 2)
+    mean_overhead = round(sum(overheads.values()) / len(overheads), 2)
+    report('instrumentation', {'variants': results, 'overhead_percent': overheads,
+                               'mean_overhead_percent': mean_overhead,
+                               'max_overhead_percent': args.max_overhead})
+    if mean_overhead > args.max_overhead:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Requêtes filtrées par statut avant et après les migrations de schéma.
+
+La base est d'abord remplie au schéma 1 (clé primaire seule), mesurée, puis
+migrée vers la dernière version et mesurée de nouveau.
+
+Usage : python benchmarks/bench_migrations.py [--size 1000000]
+"""
+import argparse
+import sqlite3
+import time
+
+from common import measure, remove_database, report, seed_database, temp_database
+
+from app.db import fetch_task_page
+from app.migrations import migrate
+from app.validation import PageArgs
+
+
+def query_plan(conn, page_args):
+    """Plan d'exécution SQLite de la requête de page filtrée"""
+    cursor = conn.execute('EXPLAIN QUERY PLAN SELECT id, task, completed FROM tasks '
+                          'WHERE id > ? AND completed = 0 ORDER BY id LIMIT ?',
+                          (page_args.after, page_args.limit + 1))
+    return ' | '.join(row[3] for row in cursor)
+
+
+def run_queries(conn, size, requests):
+    pages = {
+        'first_open_page': PageArgs(0, 50, 'open'),
+        'middle_open_page': PageArgs(size // 2, 50, 'open'),
+        'first_done_page': PageArgs(0, 50, 'done'),
+    }
+    results = {
+        'count_open': measure(
+            lambda: conn.execute('SELECT COUNT(*) FROM tasks WHERE completed = 0').fetchone(),
+            requests),
+        'plan': query_plan(conn, pages['first_open_page']),
+    }
+    for name, page_args in pages.items():
+        results[name] = measure(lambda: fetch_task_page(conn, page_args).load(), requests)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    db_path = temp_database()
+    try:
+        seed_database(db_path, args.size, schema_version=1)
+        conn = sqlite3.connect(db_path)
+        before = run_queries(conn, args.size, args.requests)
+
+        started = time.perf_counter()
+        version = migrate(conn)
+        migration_seconds = round(time.perf_counter() - started, 3)
+
+        after = run_queries(conn, args.size, args.requests)
+        conn.close()
+    finally:
+        remove_database(db_path)
+
+    report('migrations', {
+        'size': args.size,
+        'schema_version': version,
+        'migration_seconds': migration_seconds,
+        'before': before,
+        'after': after,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""Charge de toutes les routes : débit et latences selon la taille de la table.
+
+Pour chaque taille de table, les routes /, /add, /complete/<id>,
+/delete/<id> et /health sont chargées par des clients concurrents, en
+processus (client de test Flask sur create_app) et/ou en HTTP (app/serve.py
+sous gunicorn, connexions keep-alive). Les résultats (débit, p50/p95/p99)
+sont affichés en JSON.
+
+Avec --baseline, chaque scénario est comparé à une exécution de référence
+enregistrée par --save-baseline sur la même machine : le script échoue
+(code 1) si une route renvoie des erreurs, perd plus de --tolerance de
+débit ou voit sa latence p99 augmenter de plus de --tolerance.
+
+Usage : python benchmarks/bench_routes.py [--sizes 1000,100000] [--clients 8]
+        [--requests 2000] [--transports inprocess,http]
+        [--save-baseline baseline.json] [--baseline baseline.json]
+"""
+import argparse
+import http.client
+import itertools
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+from common import (make_app, remove_database, report, seed_database, serve, summarize,
+                    temp_database)
+
+TRANSPORTS = ('inprocess', 'http')
+
+# Écart absolu toléré sur p99 (ms) : sous ce seuil, la variation relève du bruit
+P99_SLACK_MS = 0.5
+
+
+def route_requests(size):
+    """Générateurs de requêtes (méthode, chemin, formulaire) par route.
+
+    /complete parcourt les ids existants ; /delete part des plus grands
+    ids pour ne pas supprimer les tâches que /complete vise en premier, puis
+    vise l'id 0 (aucune tâche) une fois la table vidée.
+    """
+    added = itertools.count()
+    completed = itertools.count()
+    deleted = itertools.count()
+    return {
+        'GET /': lambda: ('GET', '/', None),
+        'GET /health': lambda: ('GET', '/health', None),
+        'POST /add': lambda: ('POST', '/add', {'task': 'load {}'.format(next(added))}),
+        'GET /complete/<id>': lambda: (
+            'GET', '/complete/{}'.format(next(completed) % max(size, 1) + 1), None),
+        'GET /delete/<id>': lambda: (
+            'GET', '/delete/{}'.format(max(size - next(deleted), 0)), None),
+    }
+
+
+def inprocess_sender(app):
+    """Fabrique un envoi de requête par client (client de test Flask)"""
+    def make_sender():
+        client = app.test_client()
+
+        def send(method, path, form):
+            return client.open(path, method=method, data=form).status_code
+        return send
+    return make_sender
+
+
+def http_sender(port):
+    """Fabrique un envoi de requête par client (connexion keep-alive)"""
+    def make_sender():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+        def send(method, path, form):
+            if form is None:
+                conn.request(method, path)
+            else:
+                conn.request(method, path, body=urlencode(form),
+                             headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        return send
+    return make_sender
+
+
+def load(make_sender, next_request, requests, clients):
+    """Répartit `requests` requêtes entre `clients` threads concurrents"""
+    samples, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients + 1)
+
+    def client(count):
+        send = make_sender()
+        local, failed = [], 0
+        barrier.wait()
+        for _ in range(count):
+            method, path, form = next_request()
+            t0 = time.perf_counter()
+            status = send(method, path, form)
+            local.append((time.perf_counter() - t0) * 1000)
+            failed += status >= 400
+        with lock:
+            samples.extend(local)
+            errors.append(failed)
+
+    shares = [requests // clients + (i < requests % clients) for i in range(clients)]
+    threads = [threading.Thread(target=client, args=(share,)) for share in shares]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    result = summarize(samples, time.perf_counter() - started)
+    result['errors'] = sum(errors)
+    return result
+
+
+def run_routes(make_sender, size, requests, clients):
+    next_requests = route_requests(size)
+    results = {}
+    for route, next_request in next_requests.items():
+        load(make_sender, next_request, min(clients * 5, requests), clients)  # préchauffage
+        results[route] = load(make_sender, next_request, requests, clients)
+    return results
+
+
+def run(transport, size, requests, clients, port, workers):
+    db_path = temp_database()
+    seed_database(db_path, size)
+    try:
+        if transport == 'http':
+            with serve(db_path, port, workers):
+                return run_routes(http_sender(port), size, requests, clients)
+
+        app = make_app(db_path)
+        try:
+            return run_routes(inprocess_sender(app), size, requests, clients)
+        finally:
+            app.extensions['task_repository'].close()
+    finally:
+        remove_database(db_path)
+
+
+def compare(results, baseline, tolerance):
+    """Liste des régressions par rapport à `baseline` (mêmes clés)"""
+    regressions = []
+    for transport, sizes in results.items():
+        for size, routes in sizes.items():
+            for route, result in routes.items():
+                scenario = '{} {} {}'.format(transport, size, route)
+                if result['errors']:
+                    regressions.append({'scenario': scenario, 'metric': 'errors',
+                                        'value': result['errors']})
+                reference = baseline.get(transport, {}).get(size, {}).get(route)
+                if reference is None:
+                    continue
+                if result['per_second'] < reference['per_second'] * (1 - tolerance):
+                    regressions.append({'scenario': scenario, 'metric': 'per_second',
+                                        'value': result['per_second'],
+                                        'baseline': reference['per_second']})
+                p99_limit = max(reference['p99_ms'] * (1 + tolerance),
+                                reference['p99_ms'] + P99_SLACK_MS)
+                if result['p99_ms'] > p99_limit:
+                    regressions.append({'scenario': scenario, 'metric': 'p99_ms',
+                                        'value': result['p99_ms'],
+                                        'baseline': reference['p99_ms']})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1000,100000')
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='requêtes par route et par taille')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--transports', default=','.join(TRANSPORTS))
+    parser.add_argument('--workers', type=int, default=2,
+                        help='workers gunicorn du transport http')
+    parser.add_argument('--port', type=int, default=5098)
+    parser.add_argument('--baseline', help='résultats de référence à comparer')
+    parser.add_argument('--save-baseline', help='enregistre les résultats comme référence')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='dégradation relative tolérée (débit et p99)')
+    args = parser.parse_args()
+
+    transports = [name for name in args.transports.split(',') if name]
+    unknown = set(transports) - set(TRANSPORTS)
+    if unknown:
+        parser.error('Transports inconnus: {}'.format(', '.join(sorted(unknown))))
+
+    results = {transport: {size: run(transport, int(size), args.requests, args.clients,
+                                     args.port, args.workers)
+                           for size in args.sizes.split(',')}
+               for transport in transports}
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.tolerance)
+
+    report('routes', {'clients': args.clients, 'tolerance': args.tolerance,
+                      'scenarios': results, 'regressions': regressions})
+    if regressions:
+        for regression in regressions:
+            print('RÉGRESSION {}: {} = {} (référence {})'.format(
+                regression['scenario'], regression['metric'], regression['value'],
+                regression.get('baseline', '-')), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Montée en charge du serveur de production selon le nombre de workers.
+
+Lance `app/serve.py` avec 1..N workers sur une base pré-remplie puis mesure
+le débit de clients HTTP concurrents (connexions keep-alive).
+
+Usage : python benchmarks/bench_serve_scaling.py [--workers 1,2,4] [--duration 5]
+"""
+import argparse
+import http.client
+import os
+import threading
+import time
+
+from common import percentile, remove_database, report, seed_database, serve, temp_database
+
+PATHS = ['/', '/health', '/?after=500']
+
+
+def load(port, clients, duration):
+    """Clients concurrents en boucle fermée pendant `duration` secondes"""
+    samples = []
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        local = []
+        i = index
+        while time.time() < stop_at:
+            t0 = time.perf_counter()
+            conn.request('GET', PATHS[i % len(PATHS)])
+            conn.getresponse().read()
+            local.append((time.perf_counter() - t0) * 1000)
+            i += 1
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(samples),
+        'per_second': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+def run(workers, threads, clients, duration, db_path, port):
+    with serve(db_path, port, workers, threads):
+        return load(port, clients, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    cpus = os.cpu_count() or 1
+    parser.add_argument('--workers', default=','.join(str(n) for n in sorted({1, 2, cpus})))
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    db_path = temp_database()
+    seed_database(db_path, args.tasks)
+    results = {'cpu_count': cpus}
+    baseline = None
+    for workers in (int(value) for value in args.workers.split(',')):
+        result = run(workers, args.threads, args.clients, args.duration, db_path, args.port)
+        baseline = baseline or result['per_second']
+        result['scaling'] = round(result['per_second'] / baseline, 2)
+        results['{}_workers'.format(workers)] = result
+    remove_database(db_path)
+    report('serve_scaling', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Débit d'écriture des listes par utilisateur selon le nombre de partitions.
+
+Lance app/serve.py (--workers processus) avec SHARD_COUNT valant chacune des
+valeurs de --shards, puis --users utilisateurs concurrents (un thread et une
+connexion keep-alive chacun, en-tête X-User-Id) ajoutent des tâches à leur
+liste par POST /api/tasks pendant --duration secondes. Avec une seule
+partition, tous les processus se disputent le verrou d'écriture d'une même
+base ; avec N partitions, les écritures de deux utilisateurs de partitions
+différentes se font en parallèle. DATABASE_SYNCHRONOUS=FULL (par défaut ici)
+rend chaque COMMIT durable (fsync) : c'est le cas où le verrou pèse le plus.
+
+Usage : python benchmarks/bench_shards.py [--shards 1,2,4,8] [--users 32]
+        [--workers 4] [--synchronous FULL]
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from common import percentile, report, serve
+
+
+def writer(port, user_id, stop_at, samples, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Content-Type': 'application/json', 'X-User-Id': user_id}
+    i = 0
+    try:
+        while time.perf_counter() < stop_at:
+            body = json.dumps({'task': '{} {}'.format(user_id, i)})
+            t0 = time.perf_counter()
+            conn.request('POST', '/api/tasks', body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status == 201:
+                samples.append((time.perf_counter() - t0) * 1000)
+            else:
+                errors.append(response.status)
+            i += 1
+    except OSError as e:
+        errors.append(type(e).__name__)
+    finally:
+        conn.close()
+
+
+def run(shards, users, workers, threads, duration, synchronous, port):
+    directory = tempfile.mkdtemp()
+    db_path = os.path.join(directory, 'tasks.db')
+    samples, errors = [], []
+    try:
+        with serve(db_path, port, workers, threads, SHARD_COUNT=str(shards),
+                   DATABASE_SYNCHRONOUS=synchronous):
+            stop_at = time.perf_counter() + duration
+            clients = [threading.Thread(target=writer,
+                                        args=(port, 'user{}'.format(i), stop_at, samples, errors))
+                       for i in range(users)]
+            started = time.perf_counter()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.perf_counter() - started
+    finally:
+        # Partitions, fichiers -wal/-shm et verrou de maintenance
+        shutil.rmtree(directory)
+    return {
+        'writes': len(samples),
+        'errors': len(errors),
+        'per_second': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shards', default='1,2,4,8')
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--synchronous', default='FULL')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    results = {}
+    for shards in (int(value) for value in args.shards.split(',')):
+        results['{}_shards'.format(shards)] = run(shards, args.users, args.workers, args.threads,
+                                                  args.duration, args.synchronous, args.port)
+    report('shards', results)
+
+
+if __name__ == '__main__':
+    main()
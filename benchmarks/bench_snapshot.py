@@ -0,0 +1,101 @@
+"""Débit des instantanés et de la restauration, écritures pendant l'instantané.
+
+Pour chaque taille de --sizes, crée une base (DATABASE_AUTO_VACUUM par
+défaut) puis mesure :
+- snapshot : VACUUM INTO et compression gzip (niveau --level) ; pendant ce
+  temps, un thread insère une tâche par transaction sur une autre connexion,
+  comme un worker : le nombre d'écritures validées et leur latence maximale
+  montrent que l'instantané ne les bloque pas ;
+- restore : décompression, migrations et remplacement de la base.
+Débits en Mo/s (taille de la base non compressée) et en tâches/s.
+
+Usage : python benchmarks/bench_snapshot.py [--sizes 100000,1000000] [--level 1]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from common import percentile, report, seed_database
+
+from app.db import ConnectionPool
+from app.snapshot import restore_snapshot, take_snapshot
+
+
+def writer(db_path, stop, samples):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        conn.execute("INSERT INTO tasks (task) VALUES ('pendant l''instantané')")
+        conn.commit()
+        samples.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.001)
+    conn.close()
+
+
+def rates(size_bytes, tasks, seconds):
+    return {
+        'seconds': round(seconds, 3),
+        'mb_per_second': round(size_bytes / seconds / 1e6, 1),
+        'tasks_per_second': round(tasks / seconds),
+    }
+
+
+def run(size, level):
+    directory = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(directory, 'tasks.db')
+        seed_database(db_path, size)
+        pool = ConnectionPool({'DATABASE_PATH': db_path})
+
+        stop, samples = threading.Event(), []
+        thread = threading.Thread(target=writer, args=(db_path, stop, samples))
+        thread.start()
+        time.sleep(0.2)
+        before = len(samples)
+        conn = pool.connect()
+        started = time.perf_counter()
+        _, details = take_snapshot(conn, db_path, os.path.join(directory, 'snapshots'), level)
+        snapshot_seconds = time.perf_counter() - started
+        conn.close()
+        during = samples[before:]
+        stop.set()
+        thread.join()
+
+        restore_path = os.path.join(directory, 'restored.db')
+        started = time.perf_counter()
+        restored = restore_snapshot(details['snapshot'], restore_path)
+        restore_seconds = time.perf_counter() - started
+        assert restored['tasks'] == details['tasks']
+
+        return {
+            'database_mb': round(details['bytes'] / 1e6, 1),
+            'snapshot_mb': round(details['compressed_bytes'] / 1e6, 1),
+            'snapshot': dict(rates(details['bytes'], details['tasks'], snapshot_seconds),
+                             writes_during=len(during),
+                             write_p99_ms=round(percentile(during, 99), 3),
+                             write_max_ms=round(max(during, default=0), 3)),
+            'restore': rates(details['bytes'], details['tasks'], restore_seconds),
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--level', type=int, default=1)
+    args = parser.parse_args()
+
+    results = {}
+    for size in (int(value) for value in args.sizes.split(',')):
+        results['{}_tasks'.format(size)] = run(size, args.level)
+    report('snapshot', results)
+
+
+if __name__ == '__main__':
+    main()
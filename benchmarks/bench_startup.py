@@ -0,0 +1,75 @@
+"""Temps de démarrage à froid : import, création de l'application, 1re requête.
+
+Chaque mesure lance un nouvel interpréteur (configuration de production,
+base SQLite déjà migrée) qui importe l'application, appelle create_app()
+puis sert deux fois GET / et GET /readyz avec le client de test. La durée
+totale du processus (démarrage de l'interpréteur compris) est mesurée par
+le parent. Médiane et maximum de chaque phase sont affichés en JSON.
+
+Usage : python benchmarks/bench_startup.py [--runs 15] [--tasks 1000]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import ROOT, remove_database, report, seed_database, temp_database
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from app.app import create_app
+imported = time.perf_counter()
+app = create_app('production')
+created = time.perf_counter()
+client = app.test_client()
+phases = {{'import_ms': imported - started, 'create_app_ms': created - imported}}
+for route in ('/', '/readyz'):
+    for attempt in ('first', 'second'):
+        t0 = time.perf_counter()
+        status = client.get(route).status_code
+        phases['{{}} {{}}_ms'.format(route, attempt)] = time.perf_counter() - t0
+        assert status == 200, (route, status)
+phases['in_process_ms'] = time.perf_counter() - started
+print(json.dumps({{name: value * 1000 for name, value in phases.items()}}))
+'''
+
+
+def run_once(db_path):
+    env = dict(os.environ, FLASK_ENV='production', DATABASE_PATH=db_path)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT)], env=env,
+                            check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            text=True).stdout
+    phases = json.loads(output.strip().splitlines()[-1])
+    phases['process_ms'] = (time.perf_counter() - started) * 1000
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--tasks', type=int, default=1000)
+    args = parser.parse_args()
+
+    db_path = temp_database()
+    seed_database(db_path, args.tasks)
+    try:
+        run_once(db_path)  # préchauffage du cache disque et des .pyc
+        runs = [run_once(db_path) for _ in range(args.runs)]
+    finally:
+        remove_database(db_path)
+
+    results = {phase: {'median_ms': round(statistics.median(run[phase] for run in runs), 2),
+                       'max_ms': round(max(run[phase] for run in runs), 2)}
+               for phase in runs[0]}
+    report('startup', {'runs': args.runs, 'phases': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Débit des routes selon le moteur de stockage : SQLite contre mémoire.
+
+Le moteur en mémoire sert de référence sans accès disque : l'écart mesure
+le coût du chemin SQLite (requêtes, transactions, FTS5). Le cache des pages
+est désactivé pour que chaque lecture atteigne le stockage.
+
+Usage : python benchmarks/bench_storage_backends.py [--requests N] [--tasks N]
+"""
+import argparse
+
+from common import make_app, measure, remove_database, report, seed_database, temp_database
+
+BACKENDS = ('sqlite', 'memory')
+
+ROUTES = ['/', '/?after={middle}&status=open', '/api/tasks', '/api/tasks/search?q=tache',
+          '/health']
+
+
+def run(backend, requests, tasks):
+    db_path = temp_database()
+    seed_database(db_path, tasks if backend == 'sqlite' else 0)
+    app = make_app(db_path, startup={'STORAGE_BACKEND': backend, 'TASK_CACHE_SIZE': 0})
+    repository = app.extensions['task_repository']
+    if backend == 'memory':
+        ids = repository.add_many(['Tâche {}'.format(i) for i in range(tasks)])
+        for task_id in ids[::3]:
+            repository.complete(task_id)
+    client = app.test_client()
+
+    results = {}
+    for route in ROUTES:
+        url = route.format(middle=tasks // 2)
+        results['GET ' + route] = measure(lambda: client.get(url), requests)
+
+    counter = iter(range(10 ** 9))
+    results['POST /add'] = measure(
+        lambda: client.post('/add', data={'task': 'bench {}'.format(next(counter))}),
+        requests)
+
+    ids = iter(range(1, requests + 1))
+    results['GET /complete/<id>'] = measure(
+        lambda: client.get('/complete/{}'.format(next(ids))), requests)
+
+    repository.close()
+    remove_database(db_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=10000)
+    args = parser.parse_args()
+
+    results = {backend: run(backend, args.requests, args.tasks) for backend in BACKENDS}
+    for route, memory in results['memory'].items():
+        sqlite = results['sqlite'][route]['per_second']
+        memory['ratio_to_sqlite'] = round(memory['per_second'] / sqlite, 2) if sqlite else None
+    report('storage_backends', results)
+
+
+if __name__ == '__main__':
+    main()
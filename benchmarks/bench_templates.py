@@ -0,0 +1,65 @@
+"""Rendu de la page d'accueil à 10 000 tâches : cache de fragments froid ou chaud.
+
+La page (GET /?limit=--tasks) est rendue sans le cache HTML des pages
+(TASK_CACHE_HTML=false) afin de ne mesurer que l'assemblage des lignes :
+- cold : cache de fragments vidé avant chaque requête, chaque ligne est rendue ;
+- warm : toutes les lignes sont en cache, la page concatène les fragments ;
+- warm_one_changed : une tâche change d'état entre deux requêtes, une seule
+  ligne est rendue à nouveau ;
+- no_fragment_cache : TEMPLATE_FRAGMENT_CACHE_SIZE=0.
+
+Usage : python benchmarks/bench_templates.py [--tasks 10000] [--requests 30]
+"""
+import argparse
+import itertools
+
+from common import make_app, measure, remove_database, report, seed_database, temp_database
+
+
+def run(tasks, requests, fragment_cache_size):
+    db_path = temp_database()
+    seed_database(db_path, tasks)
+    app = make_app(db_path, startup={'TEMPLATE_FRAGMENT_CACHE_SIZE': fragment_cache_size},
+                   TASK_CACHE_HTML=False, TASKS_PAGE_SIZE_MAX=tasks)
+    client = app.test_client()
+    fragments = app.extensions['fragment_cache']
+    url = '/?limit={}'.format(tasks)
+    client.get(url)  # préchauffage (templates, pages SQLite)
+
+    def cold():
+        fragments.clear()
+        client.get(url)
+
+    ids = itertools.cycle(range(1, tasks + 1))
+
+    def one_changed():
+        client.get('/complete/{}'.format(next(ids)))
+        client.get(url)
+
+    results = {}
+    if fragment_cache_size:
+        results['cold'] = measure(cold, requests)
+        results['warm'] = measure(lambda: client.get(url), requests)
+        # Comprend la requête /complete/<id> (une écriture SQLite)
+        results['warm_one_changed'] = measure(one_changed, requests)
+    else:
+        results['no_fragment_cache'] = measure(lambda: client.get(url), requests)
+
+    app.extensions['db_pool'].close_all()
+    remove_database(db_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=30)
+    args = parser.parse_args()
+
+    results = run(args.tasks, args.requests, fragment_cache_size=2 * args.tasks)
+    results.update(run(args.tasks, args.requests, fragment_cache_size=0))
+    report('templates', results)
+
+
+if __name__ == '__main__':
+    main()
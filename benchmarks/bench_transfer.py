@@ -0,0 +1,123 @@
+"""Export et import des tâches en flux : débit (Mo/s) et mémoire.
+
+Pour chaque taille de table, exporte toutes les tâches (GET /export, réponse
+lue fragment par fragment) dans un fichier, puis importe ce fichier dans une
+base vide (POST /import, corps lu depuis le fichier). Un thread relève la
+mémoire anonyme résidente (RssAnon : tas Python et cache de pages SQLite)
+pendant chaque opération : sa croissance maximale doit rester la même quelle
+que soit la taille de la table. Les pages de la base projetées en mémoire
+(mmap, bornées par DATABASE_MMAP_SIZE) sont adossées au fichier et exclues.
+
+Usage : python benchmarks/bench_transfer.py [--tasks 100000,1000000] [--formats ndjson,csv]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from common import make_app, remove_database, report, seed_database, temp_database
+
+
+def rss_kb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1])
+    return 0
+
+
+class PeakMemory:
+    """Croissance maximale de la mémoire anonyme résidente pendant le bloc (Mo)"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.growth_mb = 0.0
+        self._stop = threading.Event()
+
+    def _run(self, baseline):
+        peak = baseline
+        while not self._stop.wait(self.interval):
+            peak = max(peak, rss_kb())
+        self.growth_mb = round((max(peak, rss_kb()) - baseline) / 1024, 1)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, args=(rss_kb(),), daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def export(app, fmt, path):
+    client = app.test_client()
+    with PeakMemory() as memory, open(path, 'wb') as output:
+        started = time.perf_counter()
+        response = client.get('/export?format={}'.format(fmt), buffered=False)
+        for chunk in response.response:
+            output.write(chunk)
+        response.close()
+        elapsed = time.perf_counter() - started
+    return elapsed, memory.growth_mb
+
+
+def import_file(app, fmt, path):
+    client = app.test_client()
+    size = os.path.getsize(path)
+    with PeakMemory() as memory, open(path, 'rb') as source:
+        started = time.perf_counter()
+        response = client.post('/import?format={}'.format(fmt), input_stream=source,
+                               content_length=size)
+        elapsed = time.perf_counter() - started
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return elapsed, memory.growth_mb, response.get_json()['count']
+
+
+def run(tasks, fmt):
+    source_db, target_db = temp_database(), temp_database()
+    seed_database(source_db, tasks)
+    seed_database(target_db, 0)
+    fd, path = tempfile.mkstemp(suffix='.' + fmt)
+    os.close(fd)
+    try:
+        source = make_app(source_db)
+        export_seconds, export_mb = export(source, fmt, path)
+        size_mb = os.path.getsize(path) / 1e6
+        source.extensions['task_repository'].close()
+
+        target = make_app(target_db)
+        import_seconds, import_mb, imported = import_file(target, fmt, path)
+        target.extensions['task_repository'].close()
+    finally:
+        os.unlink(path)
+        remove_database(source_db)
+        remove_database(target_db)
+    assert imported == tasks
+    return {
+        'file_mb': round(size_mb, 1),
+        'export_mb_per_s': round(size_mb / export_seconds, 1),
+        'export_rows_per_s': round(tasks / export_seconds),
+        'export_memory_growth_mb': export_mb,
+        'import_mb_per_s': round(size_mb / import_seconds, 1),
+        'import_rows_per_s': round(tasks / import_seconds),
+        'import_memory_growth_mb': import_mb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', default='100000,1000000')
+    parser.add_argument('--formats', default='ndjson,csv')
+    args = parser.parse_args()
+
+    results = {}
+    for tasks in (int(value) for value in args.tasks.split(',')):
+        for fmt in args.formats.split(','):
+            results['{}_{}'.format(fmt, tasks)] = run(tasks, fmt)
+    report('transfer', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Écrivains concurrents : écriture directe contre write-behind (group commit).
+
+Chaque thread ajoute des tâches via POST /add. Le mode 'off' valide chaque
+requête dans son thread (un COMMIT par requête, contention sur le verrou
+d'écriture) ; 'durable' et 'relaxed' confient les écritures au thread
+d'écriture unique, qui valide un lot par COMMIT.
+
+Usage : python benchmarks/bench_write_behind.py [--threads 8] [--requests 500]
+        [--synchronous FULL] [--max-delay-ms 2]
+"""
+import argparse
+import threading
+import time
+
+from common import make_app, percentile, remove_database, report, seed_database, temp_database
+
+MODES = ('off', 'durable', 'relaxed')
+
+
+def run(mode, threads, requests, synchronous, max_delay_ms):
+    db_path = temp_database()
+    seed_database(db_path, 0)
+    app = make_app(db_path, startup={'WRITE_BEHIND_MODE': mode,
+                                     'WRITE_BEHIND_MAX_DELAY_MS': max_delay_ms},
+                   DATABASE_SYNCHRONOUS=synchronous)
+
+    samples, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def writer_thread(index):
+        client = app.test_client()
+        local_samples, local_errors = [], 0
+        barrier.wait()
+        for i in range(requests):
+            t0 = time.perf_counter()
+            rv = client.post('/add', data={'task': 'w{} {}'.format(index, i)})
+            local_samples.append((time.perf_counter() - t0) * 1000)
+            if rv.status_code != 302:
+                local_errors += 1
+        with lock:
+            samples.extend(local_samples)
+            errors.append(local_errors)
+
+    workers = [threading.Thread(target=writer_thread, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    writer = app.extensions['db_writer']
+    if writer is not None:
+        # En mode relaxed, les dernières écritures peuvent être encore en file
+        writer.stop()
+    elapsed = time.perf_counter() - started
+
+    total = threads * requests
+    result = {
+        'requests': total,
+        'errors': sum(errors),
+        'seconds': round(elapsed, 4),
+        'per_second': round(total / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+    if writer is not None:
+        stats = writer.stats()
+        result['commits'] = stats['batches']
+        result['mean_batch_size'] = round(stats['operations'] / max(stats['batches'], 1), 1)
+    app.extensions['db_pool'].close_all()
+    remove_database(db_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500,
+                        help='requêtes POST /add par thread')
+    parser.add_argument('--synchronous', default='FULL',
+                        help='PRAGMA synchronous (FULL : une synchronisation disque par COMMIT)')
+    parser.add_argument('--max-delay-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    results = {mode: run(mode, args.threads, args.requests, args.synchronous,
+                         args.max_delay_ms)
+               for mode in MODES}
+    baseline = results['off']['per_second']
+    for mode in MODES[1:]:
+        results[mode]['speedup'] = round(results[mode]['per_second'] / baseline, 2)
+    report('write_behind', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Outils communs aux benchmarks (base de données de test, mesures, rapport)"""
+import http.client
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Ajouter le chemin vers l'application
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.app import create_app  # noqa: E402
+from app.config import config  # noqa: E402
+from app.migrations import SCHEMA_VERSION, migrate  # noqa: E402
+
+SERVE = os.path.join(ROOT, 'app', 'serve.py')
+
+
+def temp_database():
+    """Crée un fichier de base temporaire et retourne son chemin"""
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    return db_path
+
+
+def remove_database(db_path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+
+
+def seed_database(db_path, count, chunk_size=50000, schema_version=SCHEMA_VERSION,
+                  task_text='Tâche {}'.format):
+    """Crée la table tasks et y insère `count` tâches (un tiers terminées).
+
+    `schema_version` permet de s'arrêter à une version antérieure du schéma,
+    par exemple 1 pour mesurer la base d'origine, sans index. `task_text`
+    produit le contenu de la tâche numéro i.
+    """
+    conn = sqlite3.connect(db_path)
+    migrate(conn, target=schema_version)
+    for start in range(0, count, chunk_size):
+        stop = min(start + chunk_size, count)
+        conn.executemany(
+            'INSERT INTO tasks (task, completed) VALUES (?, ?)',
+            ((task_text(i), i % 3 == 0) for i in range(start, stop)))
+        conn.commit()
+    conn.close()
+
+
+def make_app(db_path, startup=None, **overrides):
+    """Application de test pointant vers `db_path`.
+
+    `startup` ({option: valeur}) s'applique aux options lues par
+    create_app (STORAGE_BACKEND, WRITE_BEHIND_MODE...), `overrides` à la
+    configuration de l'application une fois créée.
+    """
+    settings = config['testing']
+    previous = {name: getattr(settings, name) for name in startup or {}}
+    for name, value in (startup or {}).items():
+        setattr(settings, name, value)
+    try:
+        app = create_app('testing')
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+    app.config['DATABASE_PATH'] = db_path
+    app.config.update(overrides)
+    # Le logger de développement écrit sur stderr : on le coupe pour ne
+    # mesurer que le traitement des requêtes
+    app.logger.setLevel(logging.WARNING)
+    return app
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples, elapsed):
+    """Débit et latences (ms) d'une série de mesures"""
+    return {
+        'iterations': len(samples),
+        'seconds': round(elapsed, 4),
+        'per_second': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+def measure(func, iterations):
+    """Exécute `func` `iterations` fois et retourne débit et latences (ms)"""
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def wait_until_ready(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Le serveur ne répond pas sur le port {}'.format(port))
+
+
+@contextmanager
+def serve(db_path, port, workers=1, threads=4, **env):
+    """Lance app/serve.py (gunicorn, configuration de production) sur `port`.
+
+    Le délestage est désactivé sauf si `env` fixe LOAD_SHED_ENABLED : les
+    mesures de débit ne doivent pas compter de réponses 503.
+    """
+    env = dict(os.environ, FLASK_ENV='production', DATABASE_PATH=db_path,
+               WEB_WORKERS=str(workers), WEB_THREADS=str(threads),
+               WEB_BIND='127.0.0.1:{}'.format(port), **dict({'LOAD_SHED_ENABLED': 'false'}, **env))
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    server = subprocess.Popen([sys.executable, SERVE], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port)
+        yield server
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def report(name, results):
+    """Affiche les résultats au format JSON"""
+    print(json.dumps({'benchmark': name, 'results': results}, indent=2))
@@ -1,6 +1,41 @@
 # tests/conftest.py
 import sys
 import os
+import tempfile
+
+import pytest
 
 # Ajouter le chemin vers l'application
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.app import create_app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    """Fixture pour créer un client de test avec base de données temporaire"""
+    db_fd, test_db = tempfile.mkstemp()
+    
+    # Configuration d'environnement pour les tests
+    os.environ['DATABASE_PATH'] = test_db
+    os.environ['FLASK_ENV'] = 'testing'
+    os.environ['SECRET_KEY'] = 'test-secret-key'
+    
+    app = create_app('testing')
+    app.config['TESTING'] = True
+    app.config['DATABASE_PATH'] = test_db
+    
+    with app.test_client() as client:
+        # Initialiser la base de données de test (migrations du schéma)
+        app.extensions['db_init']()
+        yield client
+    
+    # Nettoyage
+    app.extensions['db_pool'].close_all()
+    os.close(db_fd)
+    os.unlink(test_db)
+    
+    # Nettoyer les variables d'environnement
+    for key in ['DATABASE_PATH', 'FLASK_ENV', 'SECRET_KEY']:
+        if key in os.environ:
+            del os.environ[key]
@@ -0,0 +1,123 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from app.admission import LoadShedder, RateLimiter, retry_after
+from app.app import create_app
+from app.config import config
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter:
+    """Tests pour le seau à jetons par client"""
+
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2, burst=3, clock=clock)
+        assert [limiter.acquire('a') for _ in range(3)] == [0, 0, 0]
+        assert limiter.acquire('a') == pytest.approx(0.5)
+        # Les autres clients ont leur propre seau
+        assert limiter.acquire('b') == 0
+
+        clock.now += 0.5
+        assert limiter.acquire('a') == 0
+        assert limiter.acquire('a') > 0
+
+    def test_clients_bounded(self):
+        limiter = RateLimiter(rate=1, burst=1, max_clients=2, clock=FakeClock())
+        for key in ('a', 'b', 'c'):
+            limiter.acquire(key)
+        assert len(limiter) == 2
+        # 'a', oublié, retrouve un seau plein
+        assert limiter.acquire('a') == 0
+        assert limiter.acquire('c') > 0
+
+    def test_retry_after_rounds_up(self):
+        assert retry_after(0.2) == '1'
+        assert retry_after(2.5) == '3'
+
+
+class TestLoadShedder:
+    """Tests pour le délestage par priorité"""
+
+    def test_writes_shed_before_reads(self):
+        shedder = LoadShedder(max_concurrent=3, max_writes=1)
+        assert shedder.try_acquire('write')
+        assert not shedder.try_acquire('write')
+        assert shedder.try_acquire('read')
+        assert shedder.try_acquire('read')
+        assert not shedder.try_acquire('read')
+        assert shedder.try_acquire('critical')
+
+        shedder.release('write')
+        assert shedder.stats() == {'read': 2, 'write': 0, 'max_concurrent': 3, 'max_writes': 1}
+        # La place libérée revient d'abord aux lectures : une écriture
+        # l'obtient aussi tant que max_concurrent n'est pas atteint
+        assert shedder.try_acquire('write')
+        assert not shedder.try_acquire('read')
+
+
+@pytest.fixture
+def admission_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+    monkeypatch.setattr(config['testing'], 'RATE_LIMIT_PER_SECOND', 0.001)
+    monkeypatch.setattr(config['testing'], 'RATE_LIMIT_BURST', 3)
+    monkeypatch.setattr(config['testing'], 'LOAD_SHED_ENABLED', True)
+    app = create_app('testing')
+    yield app
+    app.extensions['task_repository'].close()
+
+
+def shed_count(reason, priority):
+    return REGISTRY.get_sample_value('requests_shed_total',
+                                     {'reason': reason, 'priority': priority}) or 0
+
+
+class TestAdmissionApplication:
+    """Tests des réponses 429 et 503 de l'application"""
+
+    def test_rate_limited_client_gets_429(self, admission_app):
+        client = admission_app.test_client()
+        before = shed_count('rate_limited', 'read')
+        assert [client.get('/').status_code for _ in range(3)] == [200, 200, 200]
+        rv = client.get('/')
+        assert rv.status_code == 429
+        assert int(rv.headers['Retry-After']) > 0
+        assert shed_count('rate_limited', 'read') == before + 1
+
+        # Les sondes et un autre client sont toujours servis
+        assert client.get('/health').status_code == 200
+        assert client.get('/', environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+
+    def test_overloaded_worker_sheds_writes(self, admission_app):
+        client = admission_app.test_client()
+        shedder = admission_app.extensions['load_shedder']
+        before = shed_count('overloaded', 'write')
+        for _ in range(shedder.max_writes):
+            assert shedder.try_acquire('write')
+
+        rv = client.post('/add', data={'task': 'Refusée'},
+                         environ_base={'REMOTE_ADDR': '10.0.0.3'})
+        assert rv.status_code == 503
+        assert rv.headers['Retry-After'] == '1'
+        assert shed_count('overloaded', 'write') == before + 1
+        rv = client.get('/complete/1', environ_base={'REMOTE_ADDR': '10.0.0.3'})
+        assert rv.status_code == 503
+
+        assert client.get('/', environ_base={'REMOTE_ADDR': '10.0.0.3'}).status_code == 200
+        assert client.get('/readyz').status_code == 200
+        # Les requêtes admises ont rendu leur place
+        assert shedder.stats()['read'] == 0
+
+    def test_load_shedding_disabled_by_default(self, monkeypatch, tmp_path):
+        """Sans LOAD_SHED_ENABLED, aucune requête n'est délestée"""
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+        app = create_app('testing')
+        assert app.extensions.get('load_shedder') is None
+        app.extensions['task_repository'].close()
@@ -0,0 +1,242 @@
+import gzip
+import json
+
+
+def add_tasks(client, *tasks):
+    return [client.post('/api/tasks', json={'task': task}).get_json()['id'] for task in tasks]
+
+
+class TestApiCollection:
+    """Tests pour /api/tasks"""
+
+    def test_create_task(self, client):
+        """POST retourne la tâche créée et son emplacement"""
+        rv = client.post('/api/tasks', json={'task': '  API task  '})
+        assert rv.status_code == 201
+        assert rv.get_json() == {'id': 1, 'task': 'API task', 'completed': False}
+        assert rv.headers['Location'].endswith('/api/tasks/1')
+
+    def test_create_empty_task(self, client):
+        """Une tâche vide est refusée comme dans le formulaire"""
+        rv = client.post('/api/tasks', json={'task': '   '})
+        assert rv.status_code == 400
+        assert 'error' in rv.get_json()
+
+    def test_list_paginated(self, client):
+        """La liste est paginée par id avec limit/after"""
+        add_tasks(client, 'A', 'B', 'C')
+        data = client.get('/api/tasks?limit=2').get_json()
+        assert [task['task'] for task in data['tasks']] == ['A', 'B']
+        assert data['next_after'] == 2
+
+        data = client.get('/api/tasks?limit=2&after=2').get_json()
+        assert [task['task'] for task in data['tasks']] == ['C']
+        assert data['next_after'] is None
+
+    def test_field_selection(self, client):
+        """?fields limite les champs retournés"""
+        add_tasks(client, 'A')
+        data = client.get('/api/tasks?fields=id,completed').get_json()
+        assert data['tasks'] == [{'id': 1, 'completed': False}]
+
+        rv = client.get('/api/tasks?fields=id,password')
+        assert rv.status_code == 400
+
+    def test_conditional_get(self, client):
+        """Un ETag inchangé renvoie 304, une écriture le change"""
+        add_tasks(client, 'A')
+        etag = client.get('/api/tasks').headers['ETag']
+        assert client.get('/api/tasks', headers={'If-None-Match': etag}).status_code == 304
+
+        add_tasks(client, 'B')
+        rv = client.get('/api/tasks', headers={'If-None-Match': etag})
+        assert rv.status_code == 200
+        assert len(rv.get_json()['tasks']) == 2
+
+    def test_gzip_compression(self, client):
+        """Les réponses volumineuses sont compressées si le client accepte gzip"""
+        client.application.config['API_GZIP_MIN_SIZE'] = 10
+        add_tasks(client, 'A' * 100, 'B' * 100)
+        rv = client.get('/api/tasks', headers={'Accept-Encoding': 'gzip'})
+        assert rv.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in rv.headers['Vary']
+        data = json.loads(gzip.decompress(rv.data))
+        assert len(data['tasks']) == 2
+
+        plain = client.get('/api/tasks')
+        assert 'Content-Encoding' not in plain.headers
+        assert plain.headers['ETag'] != rv.headers['ETag']
+
+
+class TestApiItem:
+    """Tests pour /api/tasks/<id>"""
+
+    def test_get_task(self, client):
+        """GET retourne une seule tâche"""
+        add_tasks(client, 'A')
+        assert client.get('/api/tasks/1').get_json()['task'] == 'A'
+        assert client.get('/api/tasks/99').status_code == 404
+
+    def test_patch_task(self, client):
+        """PATCH modifie seulement les champs fournis"""
+        add_tasks(client, 'A')
+        rv = client.patch('/api/tasks/1', json={'completed': True})
+        assert rv.status_code == 200
+        assert rv.get_json() == {'id': 1, 'task': 'A', 'completed': True}
+
+        rv = client.patch('/api/tasks/1', json={'task': 'Renamed'})
+        assert rv.get_json() == {'id': 1, 'task': 'Renamed', 'completed': True}
+
+    def test_patch_invalid(self, client):
+        """PATCH refuse les champs inconnus ou invalides"""
+        add_tasks(client, 'A')
+        assert client.patch('/api/tasks/1', json={'completed': 'yes'}).status_code == 400
+        assert client.patch('/api/tasks/1', json={'id': 3}).status_code == 400
+        assert client.patch('/api/tasks/99', json={'completed': True}).status_code == 404
+
+    def test_patch_if_match(self, client):
+        """If-Match protège contre les modifications concurrentes"""
+        add_tasks(client, 'A')
+        etag = client.get('/api/tasks/1').headers['ETag']
+        client.patch('/api/tasks/1', json={'task': 'Changed'})
+
+        rv = client.patch('/api/tasks/1', json={'completed': True},
+                          headers={'If-Match': etag})
+        assert rv.status_code == 412
+
+        etag = client.get('/api/tasks/1').headers['ETag']
+        rv = client.patch('/api/tasks/1', json={'completed': True},
+                          headers={'If-Match': etag})
+        assert rv.status_code == 200
+
+    def test_if_match_checked_by_write(self, client, monkeypatch):
+        """Une modification concurrente entre la lecture et l'écriture donne 412"""
+        add_tasks(client, 'A', 'B')
+        repository = client.application.extensions['task_repository']
+        get, update = repository.get, repository.update
+
+        def concurrent_get(task_id):
+            row = get(task_id)
+            update(task_id, {'task': 'Concurrente'})
+            return row
+
+        etag = client.get('/api/tasks/1').headers['ETag']
+        monkeypatch.setattr(repository, 'get', concurrent_get)
+        rv = client.patch('/api/tasks/1', json={'completed': True}, headers={'If-Match': etag})
+        assert rv.status_code == 412
+        etag = client.get('/api/tasks/2').headers['ETag']
+        assert client.delete('/api/tasks/2', headers={'If-Match': etag}).status_code == 412
+        monkeypatch.undo()
+        assert client.get('/api/tasks/1').get_json() == {'id': 1, 'task': 'Concurrente', 'completed': False}
+        assert client.get('/api/tasks/2').status_code == 200
+
+    def test_deleted_during_patch(self, client, monkeypatch):
+        """Une tâche supprimée entre la lecture et l'écriture donne 404"""
+        add_tasks(client, 'A')
+        repository = client.application.extensions['task_repository']
+        get, delete = repository.get, repository.delete
+
+        def concurrent_get(task_id):
+            row = get(task_id)
+            delete(task_id)
+            return row
+
+        monkeypatch.setattr(repository, 'get', concurrent_get)
+        assert client.patch('/api/tasks/1', json={'completed': True}).status_code == 404
+        assert client.delete('/api/tasks/1').status_code == 404
+
+    def test_no_signal_without_change(self, client):
+        """Une écriture qui ne modifie aucune ligne n'émet pas tasks_changed"""
+        from app.db import tasks_changed
+        add_tasks(client, 'A')
+        app = client.application
+        etag = client.get('/api/tasks/1').headers['ETag']
+        client.patch('/api/tasks/1', json={'task': 'B'})
+        events = []
+
+        def receiver(sender, **extra):
+            events.append(extra['action'])
+
+        tasks_changed.connect(receiver, sender=app)
+        try:
+            assert client.patch('/api/tasks/1', json={'completed': True},
+                                headers={'If-Match': etag}).status_code == 412
+            assert client.delete('/api/tasks/1', headers={'If-Match': etag}).status_code == 412
+            client.get('/complete/99')
+            client.get('/delete/99')
+            assert events == []
+            client.get('/complete/1')
+            assert events == ['completed']
+        finally:
+            tasks_changed.disconnect(receiver, sender=app)
+
+    def test_delete_task(self, client):
+        """DELETE supprime la tâche et invalide la liste"""
+        add_tasks(client, 'A', 'B')
+        client.get('/api/tasks')
+        assert client.delete('/api/tasks/1').status_code == 204
+        assert client.delete('/api/tasks/1').status_code == 404
+        data = client.get('/api/tasks').get_json()
+        assert [task['id'] for task in data['tasks']] == [2]
+
+    def test_api_and_html_share_storage(self, client):
+        """Les tâches créées par l'API apparaissent sur la page d'accueil"""
+        add_tasks(client, 'Shared task')
+        assert b'Shared task' in client.get('/').data
+
+
+class TestApiSearch:
+    """Tests pour /api/tasks/search"""
+
+    def test_search_ranked(self, client):
+        """Les résultats sont classés par pertinence"""
+        add_tasks(client, 'Acheter du pain', 'Pain pain pain', 'Réparer le vélo')
+        data = client.get('/api/tasks/search?q=pain').get_json()
+        assert [task['id'] for task in data['tasks']] == [2, 1]
+        assert data['next_offset'] is None
+
+    def test_search_prefix_and_accents(self, client):
+        """mot* cherche par préfixe, les accents sont ignorés"""
+        add_tasks(client, 'Réparer le vélo', 'Repeindre le salon')
+        data = client.get('/api/tasks/search?q=rep*').get_json()
+        assert sorted(task['id'] for task in data['tasks']) == [1, 2]
+        data = client.get('/api/tasks/search?q=velo').get_json()
+        assert [task['id'] for task in data['tasks']] == [1]
+
+    def test_search_paginated(self, client):
+        """offset et limit paginent les résultats"""
+        add_tasks(client, 'Note 1', 'Note 2', 'Note 3')
+        data = client.get('/api/tasks/search?q=note&limit=2').get_json()
+        assert len(data['tasks']) == 2
+        assert data['next_offset'] == 2
+        data = client.get('/api/tasks/search?q=note&limit=2&offset=2').get_json()
+        assert len(data['tasks']) == 1
+        assert data['next_offset'] is None
+
+    def test_search_follows_updates(self, client):
+        """Les modifications et suppressions sont reflétées par l'index"""
+        add_tasks(client, 'Ancien titre', 'Autre')
+        client.patch('/api/tasks/1', json={'task': 'Nouveau titre'})
+        client.delete('/api/tasks/2')
+        assert client.get('/api/tasks/search?q=ancien').get_json()['tasks'] == []
+        assert len(client.get('/api/tasks/search?q=nouveau').get_json()['tasks']) == 1
+        assert client.get('/api/tasks/search?q=autre').get_json()['tasks'] == []
+
+    def test_search_requires_query(self, client):
+        """Une requête vide ou sans mot est refusée"""
+        assert client.get('/api/tasks/search').status_code == 400
+        assert client.get('/api/tasks/search?q=%22%2A').status_code == 400
+
+    def test_search_syntax_is_escaped(self, client):
+        """Les opérateurs FTS5 saisis ne provoquent pas d'erreur"""
+        add_tasks(client, 'NOT a task')
+        rv = client.get('/api/tasks/search?q=NOT%20task:%20(a')
+        assert rv.status_code == 200
+        assert len(rv.get_json()['tasks']) == 1
+
+    def test_search_rank_window(self, client):
+        """Seules les correspondances les plus récentes sont classées"""
+        client.application.config['SEARCH_RANK_WINDOW'] = 2
+        add_tasks(client, 'Pain pain pain', 'Acheter du pain', 'Pain de mie')
+        data = client.get('/api/tasks/search?q=pain').get_json()
+        assert sorted(task['id'] for task in data['tasks']) == [2, 3]
@@ -1,5 +1,4 @@
 import pytest
-import tempfile
 import os
 import sqlite3
 import json
@@ -7,42 +6,8 @@ import logging
 from unittest.mock import patch
 
 
-from app.app import create_app, JSONFormatter
-
-
-@pytest.fixture
-def client():
-    """Fixture pour créer un client de test avec base de données temporaire"""
-    db_fd, test_db = tempfile.mkstemp()
-    
-    # Configuration d'environnement pour les tests
-    os.environ['DATABASE_PATH'] = test_db
-    os.environ['FLASK_ENV'] = 'testing'
-    os.environ['SECRET_KEY'] = 'test-secret-key'
-    
-    app = create_app('testing')
-    app.config['TESTING'] = True
-    app.config['DATABASE_PATH'] = test_db
-    
-    with app.test_client() as client:
-        with app.app_context():
-            # Initialiser la base de données de test
-            conn = sqlite3.connect(test_db)
-            conn.execute('''CREATE TABLE IF NOT EXISTS tasks
-                            (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                             task TEXT NOT NULL,
-                             completed BOOLEAN DEFAULT FALSE)''')
-            conn.close()
-        yield client
-    
-    # Nettoyage
-    os.close(db_fd)
-    os.unlink(test_db)
-    
-    # Nettoyer les variables d'environnement
-    for key in ['DATABASE_PATH', 'FLASK_ENV', 'SECRET_KEY']:
-        if key in os.environ:
-            del os.environ[key]
+from app.app import (create_app, JSONFormatter, BoundedQueueHandler, get_serializer,
+                     ActionSamplingFilter, parse_sampling_rules)
 
 
 class TestHealthEndpoint:
@@ -251,6 +216,334 @@ class TestDatabaseOperations:
         assert tasks[0][0] == 'Persistent task'
 
 
+class TestPagination:
+    """Tests pour la pagination par id de la page d'accueil"""
+
+    def _add_tasks(self, client, count):
+        for i in range(1, count + 1):
+            client.post('/add', data={'task': 'Paged task {}'.format(i)})
+
+    def test_first_page_limited(self, client):
+        """La première page ne contient que `limit` tâches"""
+        self._add_tasks(client, 5)
+        rv = client.get('/?limit=2')
+        assert rv.status_code == 200
+        assert b'Paged task 1' in rv.data
+        assert b'Paged task 2' in rv.data
+        assert b'Paged task 3' not in rv.data
+        assert b'after=2' in rv.data
+
+    def test_next_page_after_cursor(self, client):
+        """La page suivante commence après l'id du curseur"""
+        self._add_tasks(client, 5)
+        rv = client.get('/?after=2&limit=2')
+        assert b'Paged task 2' not in rv.data
+        assert b'Paged task 3' in rv.data
+        assert b'Paged task 4' in rv.data
+        assert b'after=4' in rv.data
+
+    def test_last_page_has_no_next_link(self, client):
+        """La dernière page n'a pas de lien vers une page suivante"""
+        self._add_tasks(client, 3)
+        rv = client.get('/?after=2&limit=2')
+        assert b'Paged task 3' in rv.data
+        assert 'Tâches suivantes'.encode() not in rv.data
+
+    def test_streamed_index(self, client):
+        """Le mode streaming rend la même page"""
+        self._add_tasks(client, 3)
+        rv = client.get('/?stream=1&limit=2')
+        assert rv.status_code == 200
+        assert rv.is_streamed
+        assert b'Paged task 2' in rv.data
+        assert b'Paged task 3' not in rv.data
+        assert b'after=2' in rv.data
+
+    @pytest.mark.parametrize('query', ['', '&stream=1'])
+    def test_last_page_marker(self, client, query):
+        """Le marqueur de dernière page est juste, y compris en streaming"""
+        self._add_tasks(client, 3)
+        rv = client.get('/?limit=2' + query)
+        assert b'id="tasks-end" hidden data-last-page=""' in rv.data
+        rv = client.get('/?limit=2&after=2' + query)
+        assert b'id="tasks-end" hidden data-last-page="1"' in rv.data
+
+
+class TestStatusFilter:
+    """Tests pour le filtre des tâches ouvertes ou terminées"""
+
+    def test_index_open_tasks(self, client):
+        """?status=open n'affiche que les tâches à faire"""
+        client.post('/add', data={'task': 'Open task'})
+        client.post('/add', data={'task': 'Done task'})
+        client.get('/complete/2')
+
+        rv = client.get('/?status=open')
+        assert b'Open task' in rv.data
+        assert b'Done task' not in rv.data
+
+        rv = client.get('/?status=done')
+        assert b'Open task' not in rv.data
+        assert b'Done task' in rv.data
+
+    def test_api_status_filter(self, client):
+        """L'API accepte le même filtre"""
+        client.post('/add', data={'task': 'Open task'})
+        client.post('/add', data={'task': 'Done task'})
+        client.get('/complete/2')
+        data = client.get('/api/tasks?status=open').get_json()
+        assert [task['task'] for task in data['tasks']] == ['Open task']
+
+
+class TestSearch:
+    """Tests pour la page de recherche"""
+
+    def test_build_match_query(self):
+        """La saisie est convertie en termes FTS5 entre guillemets"""
+        from app.validation import build_match_query
+        assert build_match_query('pain frais') == '"pain" "frais"'
+        assert build_match_query('pa* a*') == '"pa"* "a"'
+        assert build_match_query('"OR" -') == '"OR"'
+        assert build_match_query('  ') is None
+
+    def test_search_page(self, client):
+        """La page affiche les tâches correspondantes"""
+        client.post('/add', data={'task': 'Acheter du pain'})
+        client.post('/add', data={'task': 'Réparer le vélo'})
+        rv = client.get('/search?q=pain')
+        assert rv.status_code == 200
+        assert b'Acheter du pain' in rv.data
+        assert 'Réparer'.encode() not in rv.data
+
+    def test_search_page_without_query(self, client):
+        """Sans requête, seul le formulaire est affiché"""
+        rv = client.get('/search')
+        assert rv.status_code == 200
+        assert 'Aucune tâche trouvée'.encode() not in rv.data
+
+
+class TestTaskListCache:
+    """Tests pour le cache de la liste des tâches et les ETag"""
+
+    def test_index_served_from_cache(self, client):
+        """La seconde consultation est servie depuis le cache"""
+        cache = client.application.extensions['task_cache']
+        client.post('/add', data={'task': 'Cached task'})
+        first = client.get('/')
+        second = client.get('/')
+        assert cache.stats()['size'] == 1
+        assert first.data == second.data
+        assert first.headers['ETag'] == second.headers['ETag']
+
+    def test_if_none_match_returns_304(self, client):
+        """Un ETag inchangé renvoie 304 sans corps"""
+        etag = client.get('/').headers['ETag']
+        rv = client.get('/', headers={'If-None-Match': etag})
+        assert rv.status_code == 304
+        assert rv.data == b''
+
+    def test_write_invalidates_cache(self, client):
+        """Chaque modification invalide les pages en cache"""
+        client.post('/add', data={'task': 'Before'})
+        etag = client.get('/').headers['ETag']
+
+        client.post('/add', data={'task': 'After'})
+        rv = client.get('/', headers={'If-None-Match': etag})
+        assert rv.status_code == 200
+        assert b'After' in rv.data
+
+        client.get('/delete/2')
+        assert b'After' not in client.get('/').data
+
+    def test_external_write_detected(self, client):
+        """Une écriture par une autre connexion (autre worker) est détectée"""
+        client.get('/')
+        conn = sqlite3.connect(os.environ['DATABASE_PATH'])
+        conn.execute("INSERT INTO tasks (task) VALUES ('Written elsewhere')")
+        conn.commit()
+        conn.close()
+        assert b'Written elsewhere' in client.get('/').data
+
+    def test_cache_hits_exported(self, client):
+        """Les succès et échecs du cache sont exposés dans /metrics"""
+        client.get('/')
+        client.get('/')
+        rv = client.get('/metrics')
+        assert b'task_cache_requests_total{result="hit"}' in rv.data
+
+    def test_mutation_renders_only_its_row(self, client):
+        """La page est assemblée à partir des lignes déjà rendues"""
+        fragments = client.application.extensions['fragment_cache']
+        client.post('/tasks/bulk', json=['Une', 'Deux', '<b>Trois</b>'])
+        rv = client.get('/')
+        assert b'&lt;b&gt;Trois&lt;/b&gt;' in rv.data
+        assert fragments.stats()['size'] == 3
+
+        rendered = []
+        render = fragments.render
+        fragments.render = lambda *key: rendered.append(key) or render(*key)
+        client.get('/complete/2')
+        rv = client.get('/')
+        assert rendered == [(2, 'Deux', True)]
+        assert b'<div class="task completed" data-id="2">' in rv.data
+
+
+class TestBulkAdd:
+    """Tests pour l'ajout de tâches en masse"""
+
+    def test_bulk_json_array(self, client):
+        """Un tableau JSON crée toutes les tâches et retourne leurs ids"""
+        rv = client.post('/tasks/bulk', json=['Bulk 1', {'task': ' Bulk 2 '}, 'Bulk 3'])
+        assert rv.status_code == 201
+        data = rv.get_json()
+        assert data['count'] == 3
+        assert data['ids'] == [1, 2, 3]
+
+        conn = sqlite3.connect(os.environ['DATABASE_PATH'])
+        rows = conn.execute('SELECT id, task FROM tasks ORDER BY id').fetchall()
+        conn.close()
+        assert rows == [(1, 'Bulk 1'), (2, 'Bulk 2'), (3, 'Bulk 3')]
+
+    def test_bulk_ndjson_chunked(self, client):
+        """Un flux NDJSON est inséré par lots"""
+        client.application.config['BULK_CHUNK_SIZE'] = 2
+        body = '\n'.join(json.dumps({'task': 'Line {}'.format(i)}) for i in range(5))
+        rv = client.post('/tasks/bulk', data=body,
+                         content_type='application/x-ndjson')
+        assert rv.status_code == 201
+        assert rv.get_json()['ids'] == [1, 2, 3, 4, 5]
+
+    def test_bulk_rejects_empty_tasks(self, client):
+        """Une tâche vide fait refuser tout le lot"""
+        rv = client.post('/tasks/bulk', json=['Valid', '   ', {'task': 42}])
+        assert rv.status_code == 400
+        assert rv.get_json()['invalid'] == [1, 2]
+
+        rv = client.get('/')
+        assert b'Valid' not in rv.data
+
+    def test_bulk_rejects_invalid_body(self, client):
+        """Un corps qui n'est pas un tableau est refusé"""
+        rv = client.post('/tasks/bulk', json={'task': 'Not a list'})
+        assert rv.status_code == 400
+
+    def test_bulk_rejects_too_many_tasks(self, client):
+        """Le nombre de tâches par requête est borné"""
+        client.application.config['BULK_MAX_TASKS'] = 2
+        rv = client.post('/tasks/bulk', json=['A', 'B', 'C'])
+        assert rv.status_code == 400
+
+
+@pytest.fixture
+def write_behind_app(tmp_path, monkeypatch):
+    """Fabrique d'applications de test avec un mode write-behind donné"""
+    from app.config import config
+    db_path = str(tmp_path / 'tasks.db')
+    apps = []
+
+    def make(mode):
+        monkeypatch.setattr(config['testing'], 'WRITE_BEHIND_MODE', mode)
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', db_path)
+        app = create_app('testing')
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        app.extensions['db_writer'].stop()
+        app.extensions['db_pool'].close_all()
+
+
+class TestWriteBehind:
+    """Tests pour les écritures groupées par le thread d'écriture"""
+
+    def test_durable_writes_visible_after_response(self, write_behind_app):
+        """En mode durable, la réponse suit la validation de l'écriture"""
+        client = write_behind_app('durable').test_client()
+        client.post('/add', data={'task': 'Grouped task'})
+        assert b'Grouped task' in client.get('/').data
+
+        client.get('/complete/1')
+        rv = client.get('/api/tasks/1')
+        assert rv.get_json()['completed'] is True
+
+        client.get('/delete/1')
+        assert b'Grouped task' not in client.get('/').data
+
+    def test_api_returns_committed_state(self, write_behind_app):
+        """Les routes de l'API retournent l'état validé, même en mode relaxed"""
+        client = write_behind_app('relaxed').test_client()
+        rv = client.post('/api/tasks', json={'task': 'API task'})
+        assert rv.status_code == 201
+        assert rv.get_json()['id'] == 1
+
+        rv = client.patch('/api/tasks/1', json={'task': 'Renamed'})
+        assert rv.get_json()['task'] == 'Renamed'
+        assert client.delete('/api/tasks/1').status_code == 204
+        assert client.get('/api/tasks/1').status_code == 404
+
+    def test_relaxed_writes_eventually_committed(self, write_behind_app):
+        """En mode relaxed, les formulaires n'attendent pas la validation"""
+        app = write_behind_app('relaxed')
+        client = app.test_client()
+        for i in range(5):
+            assert client.post('/add', data={'task': 'Relaxed {}'.format(i)}).status_code == 302
+        app.extensions['db_writer'].stop()
+        assert b'Relaxed 4' in client.get('/').data
+        assert app.extensions['db_writer'].stats()['operations'] == 5
+
+    def test_writer_metrics_exported(self, write_behind_app):
+        """La profondeur de file et la taille des lots sont exposées"""
+        client = write_behind_app('durable').test_client()
+        client.post('/add', data={'task': 'Measured'})
+        assert client.get('/health').get_json()['storage']['writer']['batches'] == 1
+        rv = client.get('/metrics')
+        assert b'write_behind_queue_depth' in rv.data
+        assert b'write_behind_batch_size_bucket' in rv.data
+
+    def test_invalid_mode_rejected(self, write_behind_app):
+        """Un mode inconnu est refusé au démarrage"""
+        with pytest.raises(ValueError):
+            write_behind_app('eventually')
+
+
+class TestMemoryBackend:
+    """Tests des routes avec le moteur de stockage en mémoire"""
+
+    @pytest.fixture
+    def memory_client(self, monkeypatch):
+        from app.config import config
+        monkeypatch.setattr(config['testing'], 'STORAGE_BACKEND', 'memory')
+        app = create_app('testing')
+        yield app.test_client()
+        app.extensions['task_repository'].close()
+
+    def test_routes_without_database(self, memory_client):
+        """Ajout, complétion, recherche et suppression sans fichier SQLite"""
+        assert 'db_pool' not in memory_client.application.extensions
+        memory_client.post('/add', data={'task': 'In memory'})
+        memory_client.post('/tasks/bulk', json=['Bulk one', 'Bulk two'])
+        memory_client.get('/complete/1')
+        assert memory_client.get('/api/tasks/1').get_json()['completed'] is True
+        assert b'Bulk two' in memory_client.get('/').data
+
+        rv = memory_client.get('/api/tasks/search?q=bulk')
+        assert [task['id'] for task in rv.get_json()['tasks']] == [3, 2]
+
+        memory_client.get('/delete/3')
+        assert b'Bulk two' not in memory_client.get('/').data
+        health = memory_client.get('/health').get_json()
+        assert health['storage'] == {'backend': 'memory', 'tasks': 2, 'stripes': 16,
+                                     'snapshots': 0, 'dirty': True}
+
+    def test_invalid_backend_rejected(self, monkeypatch):
+        """Un moteur de stockage inconnu est refusé au démarrage"""
+        from app.config import config
+        monkeypatch.setattr(config['testing'], 'STORAGE_BACKEND', 'redis')
+        with pytest.raises(ValueError):
+            create_app('testing')
+
+
 class TestSecurity:
     """Tests de sécurité basiques"""
 
@@ -278,11 +571,39 @@ class TestAppInitialization:
         assert app.config['TESTING'] is True
         assert app.config['DATABASE_PATH'] == '/tmp/test.db'
 
-    def test_app_creation_default_config(self):
+    def test_app_creation_runs_migrations(self):
+        """create_app applique les migrations au démarrage"""
+        from app.migrations import SCHEMA_VERSION
+        app = create_app('testing')
+        conn = sqlite3.connect(app.config['DATABASE_PATH'])
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.close()
+        assert version == SCHEMA_VERSION
+
+    def test_app_creation_default_config(self, monkeypatch, tmp_path):
         """Test de création d'app avec config par défaut"""
+        from app.config import config
+        monkeypatch.setattr(config['development'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
         app = create_app()
         assert app is not None
 
+    def test_import_has_no_side_effect(self):
+        """L'import du module ne crée pas d'application"""
+        import app.app as module
+        assert 'app' not in vars(module)
+
+    def test_template_bytecode_cache(self, monkeypatch, tmp_path):
+        """Le code compilé des templates est partagé entre applications"""
+        from app.config import config
+        cache_dir = tmp_path / 'jinja'
+        cache_dir.mkdir()
+        monkeypatch.setattr(config['testing'], 'TEMPLATE_BYTECODE_CACHE_DIR', str(cache_dir))
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+        app = create_app('testing')
+        assert app.test_client().get('/').status_code == 200
+        assert list(cache_dir.iterdir())
+        app.extensions['task_repository'].close()
+
 
 class TestLoggingConfiguration:
     """Tests pour la configuration du logging"""
@@ -304,3 +625,135 @@ class TestLoggingConfiguration:
             parsed = json.loads(result)
             assert parsed['level'] == 'ERROR'
             assert parsed['exception'] is True
+
+
+class RecordingHandler(logging.Handler):
+    """Handler de test qui conserve les enregistrements reçus"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_record(msg='Queued message'):
+    return logging.LogRecord(
+        name='test', level=logging.INFO, pathname='test.py', lineno=1,
+        msg=msg, args=(), exc_info=None
+    )
+
+
+class TestAsyncLogging:
+    """Tests pour le pipeline de logs asynchrone"""
+
+    def test_records_written_by_listener(self):
+        """Les enregistrements sont transmis au handler par le thread d'écoute"""
+        target = RecordingHandler()
+        handler = BoundedQueueHandler(target)
+        handler.start()
+        handler.handle(make_record())
+        handler.stop()
+        assert [r.getMessage() for r in target.records] == ['Queued message']
+
+    def test_drop_policy_counts_dropped_records(self):
+        """Une file pleine abandonne les enregistrements et les compte"""
+        handler = BoundedQueueHandler(RecordingHandler(), maxsize=2)
+        handler._pid = os.getpid()  # pas de thread d'écoute : la file se remplit
+        for _ in range(5):
+            handler.handle(make_record())
+        assert handler.dropped == 3
+
+    def test_block_policy_times_out(self):
+        """La politique 'block' attend puis abandonne si la file reste pleine"""
+        handler = BoundedQueueHandler(RecordingHandler(), maxsize=1,
+                                      policy='block', timeout=0.01)
+        handler._pid = os.getpid()
+        handler.handle(make_record())
+        handler.handle(make_record())
+        assert handler.dropped == 1
+
+    def test_invalid_policy(self):
+        """Une politique inconnue est refusée"""
+        with pytest.raises(ValueError):
+            BoundedQueueHandler(RecordingHandler(), policy='spill')
+
+    def test_production_logging_is_queued(self, monkeypatch, tmp_path):
+        """En production, le logger de l'application passe par la file"""
+        from app.config import config
+        monkeypatch.setattr(config['production'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+        app = create_app('production')
+        handler = app.logger.handlers[0]
+        try:
+            assert isinstance(handler, BoundedQueueHandler)
+            assert app.logger.propagate is False
+        finally:
+            handler.stop()
+            app.logger.handlers.clear()
+            app.logger.filters.clear()
+            app.logger.propagate = True
+            logging.getLogger().removeHandler(handler)
+            logging.logProcesses = True
+            logging.logMultiprocessing = True
+
+    def test_formatter_with_fast_serializer(self):
+        """Le formateur accepte un sérialiseur plus rapide"""
+        pytest.importorskip('orjson')
+        formatter = JSONFormatter(get_serializer('orjson'))
+        record = make_record('Tâche ajoutée')
+        record.task_id = 7
+        parsed = json.loads(formatter.format(record))
+        assert parsed['message'] == 'Tâche ajoutée'
+        assert parsed['task_id'] == 7
+
+
+class TestLogSampling:
+    """Tests pour l'échantillonnage des logs par action"""
+
+    def _record(self, action, level=logging.INFO):
+        record = make_record()
+        record.levelno = level
+        record.action = action
+        return record
+
+    def test_sample_one_in_n(self):
+        """Une règle 1/N garde un enregistrement sur N"""
+        log_filter = ActionSamplingFilter(parse_sampling_rules('health_check_success=1/3'))
+        kept = [log_filter.filter(self._record('health_check_success')) for _ in range(9)]
+        assert kept.count(True) == 3
+        assert log_filter.suppressed['health_check_success'] == 6
+
+    def test_sampled_records_carry_rate(self):
+        """Les enregistrements gardés indiquent le taux d'échantillonnage"""
+        log_filter = ActionSamplingFilter(parse_sampling_rules('view_tasks=1/10'))
+        record = self._record('view_tasks')
+        assert log_filter.filter(record)
+        assert record.sample_rate == 10
+
+    def test_rate_limit_per_second(self):
+        """Une règle X/s laisse passer au plus X enregistrements d'un coup"""
+        log_filter = ActionSamplingFilter(parse_sampling_rules('view_tasks=2/s'))
+        kept = [log_filter.filter(self._record('view_tasks')) for _ in range(5)]
+        assert kept.count(True) == 2
+        assert log_filter.suppressed['view_tasks'] == 3
+
+    def test_other_actions_and_warnings_kept(self):
+        """Les actions sans règle et les avertissements ne sont jamais écartés"""
+        log_filter = ActionSamplingFilter(parse_sampling_rules('add_task_success=1/1000'))
+        assert log_filter.filter(self._record('delete_task'))
+        assert log_filter.filter(make_record())
+        for _ in range(3):
+            assert log_filter.filter(self._record('add_task_success', logging.WARNING))
+
+    def test_invalid_rule(self):
+        """Une règle mal formée est refusée"""
+        with pytest.raises(ValueError):
+            parse_sampling_rules('view_tasks=3/10')
+
+    @pytest.mark.parametrize('spec', ['view_tasks=1/0', 'view_tasks=1/-5',
+                                      'view_tasks=0/s', 'view_tasks=-2/s'])
+    def test_non_positive_rate_rejected(self, spec):
+        """Un taux nul ou négatif est refusé au lieu d'échouer à l'usage"""
+        with pytest.raises(ValueError, match='Règle d\'échantillonnage invalide'):
+            parse_sampling_rules(spec)
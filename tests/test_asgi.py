@@ -0,0 +1,170 @@
+import asyncio
+import io
+
+import pytest
+
+from app.asgi import AsgiApplication, build_environ
+from tests.test_events import messages
+
+
+def scope(method, path, query=b'', headers=()):
+    return {'type': 'http', 'http_version': '1.1', 'method': method, 'path': path,
+            'root_path': '', 'query_string': query, 'headers': list(headers),
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 5555), 'scheme': 'http'}
+
+
+async def call(asgi, method, path, query=b'', headers=(), body=b'', disconnect_after=None,
+               pulled=None):
+    """(statut, en-têtes, corps) d'une requête ; la connexion est coupée
+    après `disconnect_after` secondes si le corps n'est pas terminé.
+
+    `body` peut être une liste de blocs, envoyés en autant de messages ;
+    les blocs lus par l'application sont ajoutés à la liste `pulled`.
+    """
+    sent = []
+    finished = asyncio.Event()
+    chunks = body if isinstance(body, list) else [body]
+    received = [{'type': 'http.request', 'body': chunk, 'more_body': position < len(chunks) - 1}
+                for position, chunk in enumerate(chunks)][::-1]
+
+    async def receive():
+        if received:
+            message = received.pop()
+            if pulled is not None:
+                pulled.append(message['body'])
+            return message
+        try:
+            await asyncio.wait_for(finished.wait(), disconnect_after)
+        except asyncio.TimeoutError:
+            pass
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+        if message['type'] == 'http.response.body' and not message.get('more_body'):
+            finished.set()
+
+    await asgi(scope(method, path, query, headers), receive, send)
+    start = sent[0]
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return start['status'], dict(start['headers']), body
+
+
+@pytest.fixture
+def asgi(client):
+    app = client.application
+    app.config.update(EVENTS_HEARTBEAT_SECONDS=0.05, EVENTS_STREAM_SECONDS=0.3)
+    asgi = AsgiApplication(app, threads=2)
+    yield asgi
+    asgi.executor.shutdown()
+    app.extensions['event_broker'].stop()
+
+
+class TestAsgiApplication:
+    """Tests pour l'adaptateur asyncio de l'application"""
+
+    def test_same_pages_as_wsgi(self, client, asgi):
+        """Les routes et templates sont ceux de l'application Flask"""
+        status, headers, body = asyncio.run(call(
+            asgi, 'POST', '/add', headers=[(b'content-type', b'application/x-www-form-urlencoded')],
+            body='task=Tâche asynchrone'.encode()))
+        assert status == 302
+
+        status, headers, body = asyncio.run(call(asgi, 'GET', '/'))
+        assert status == 200
+        assert headers[b'content-type'] == b'text/html; charset=utf-8'
+        assert 'Tâche asynchrone'.encode() in body
+        assert body == client.get('/').data
+
+    def test_streamed_response(self, client, asgi):
+        """Une réponse en plusieurs blocs est transmise en entier"""
+        client.post('/tasks/bulk', json=['Tâche {}'.format(i) for i in range(120)])
+        status, headers, body = asyncio.run(call(asgi, 'GET', '/', query=b'stream=1'))
+        assert status == 200
+        assert body == client.get('/?stream=1').data
+        assert body.count(b'class="task ') == 50
+
+    def test_request_body_read_on_demand(self, client, asgi):
+        """Le corps est lu bloc par bloc par la vue, pas chargé d'avance"""
+        lines = ['{{"task": "Importée {}"}}\n'.format(i) for i in range(300)]
+        data = ''.join(lines).encode()
+        chunks = [data[start:start + 1000] for start in range(0, len(data), 1000)]
+        pulled = []
+        status, headers, body = asyncio.run(call(
+            asgi, 'POST', '/import', headers=[(b'content-type', b'application/x-ndjson')],
+            body=chunks, pulled=pulled))
+        assert status == 201
+        assert pulled == chunks
+        assert client.get('/api/tasks/300').get_json()['task'] == 'Importée 299'
+
+        # Une vue qui ne lit pas le corps ne le reçoit jamais
+        pulled = []
+        status, headers, body = asyncio.run(call(asgi, 'GET', '/', body=chunks, pulled=pulled))
+        assert status == 200
+        assert pulled == []
+
+    def test_events_stream_live_deltas(self, asgi):
+        """Un flux /events reçoit les modifications sans occuper de thread"""
+        broker = asgi.broker
+
+        async def scenario():
+            stream = asyncio.ensure_future(call(asgi, 'GET', '/events'))
+            while broker.streams == 0:
+                await asyncio.sleep(0.01)
+            await call(asgi, 'POST', '/add', body=b'task=Direct',
+                       headers=[(b'content-type', b'application/x-www-form-urlencoded')])
+            return await stream
+
+        status, headers, body = asyncio.run(scenario())
+        assert status == 200
+        assert headers[b'content-type'] == b'text/event-stream; charset=utf-8'
+        received = messages(body)
+        assert received[0][2]['added'] == [[1, 'Direct', False]]
+        assert broker.streams == 0
+
+    def test_events_resume_after_last_event_id(self, client, asgi):
+        client.post('/add', data={'task': 'Une'})
+        client.post('/add', data={'task': 'Deux'})
+        status, headers, body = asyncio.run(call(asgi, 'GET', '/events',
+                                                 headers=[(b'last-event-id', b'1')]))
+        assert messages(body)[0][2]['added'] == [[2, 'Deux', False]]
+
+    def test_events_disconnect_releases_stream(self, asgi):
+        asgi.app.config['EVENTS_STREAM_SECONDS'] = 30
+        asyncio.run(call(asgi, 'GET', '/events', disconnect_after=0.1))
+        assert asgi.broker.streams == 0
+
+    def test_events_max_streams(self, asgi):
+        asgi.broker.max_streams = 0
+        status, headers, body = asyncio.run(call(asgi, 'GET', '/events'))
+        assert status == 503
+        assert headers[b'retry-after'] == b'5'
+
+    def test_lifespan(self, asgi):
+        received = [{'type': 'lifespan.shutdown'}, {'type': 'lifespan.startup'}]
+        sent = []
+
+        async def receive():
+            return received.pop()
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(asgi({'type': 'lifespan'}, receive, send))
+        assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+
+class TestBuildEnviron:
+    def test_headers(self):
+        environ = build_environ(scope('POST', '/add', b'a=1', [
+            (b'content-type', b'text/plain'), (b'x-forwarded-for', b'1.1.1.1'),
+            (b'x-forwarded-for', b'2.2.2.2')]), io.BytesIO(b'corps'))
+        assert environ['CONTENT_TYPE'] == 'text/plain'
+        assert environ['HTTP_X_FORWARDED_FOR'] == '1.1.1.1,2.2.2.2'
+        assert environ['QUERY_STRING'] == 'a=1'
+        assert environ['wsgi.input'].read() == b'corps'
+
+    def test_repeated_cookie_headers(self):
+        environ = build_environ(scope('GET', '/', headers=[
+            (b'cookie', b'a=1'), (b'cookie', b'b=2; c=3')]), io.BytesIO())
+        assert environ['HTTP_COOKIE'] == 'a=1; b=2; c=3'
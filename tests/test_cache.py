@@ -0,0 +1,80 @@
+import sqlite3
+
+from app.cache import FragmentCache, LRUCache, TaskListCache
+
+
+class TestLRUCache:
+    """Tests pour le cache LRU borné"""
+
+    def test_evicts_least_recently_used(self):
+        """L'entrée la moins récemment lue est évincée"""
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_zero_size_disables_cache(self):
+        """Une taille nulle ne conserve rien"""
+        cache = LRUCache(0)
+        cache.set('a', 1)
+        assert cache.get('a') is None
+
+
+class TestTaskListCache:
+    """Tests pour l'invalidation du cache des pages"""
+
+    def test_stale_value_not_stored(self):
+        """Une valeur lue avant une invalidation n'est pas conservée"""
+        cache = TaskListCache(4)
+        generation, value = cache.get('page')
+        assert value is None
+        cache.invalidate()
+        cache.put('page', 'stale', generation)
+        assert cache.get('page')[1] is None
+
+    def test_sync_detects_other_connection_writes(self, tmp_path):
+        """data_version révèle les écritures des autres connexions"""
+        db_path = str(tmp_path / 'tasks.db')
+        reader = sqlite3.connect(db_path)
+        writer = sqlite3.connect(db_path)
+        writer.execute('CREATE TABLE tasks (id INTEGER PRIMARY KEY)')
+        writer.commit()
+
+        cache = TaskListCache(4)
+        cache.sync(reader)
+        generation = cache.generation
+        cache.put('page', 'fresh', generation)
+
+        cache.sync(reader)
+        assert cache.get('page')[1] == 'fresh'
+
+        writer.execute('INSERT INTO tasks DEFAULT VALUES')
+        writer.commit()
+        cache.sync(reader)
+        assert cache.get('page')[1] is None
+        reader.close()
+        writer.close()
+
+
+class TestFragmentCache:
+    """Tests pour le cache des lignes rendues"""
+
+    def test_renders_each_version_once(self):
+        """Une ligne n'est rendue qu'une fois par contenu"""
+        rendered = []
+
+        def render(task_id, text, completed):
+            rendered.append((task_id, text, completed))
+            return '{}:{}:{}'.format(task_id, text, completed)
+
+        cache = FragmentCache(render, 8, chunk_size=2)
+        chunks = list(cache.rows([(1, 'Pain', 0), (2, 'Lait', 1), (1, 'Pain', False)]))
+        assert chunks == ['1:Pain:False\n    2:Lait:True', '1:Pain:False']
+        assert list(cache.rows([(1, 'Pain', 1)])) == ['1:Pain:True']
+        assert rendered == [(1, 'Pain', False), (2, 'Lait', True), (1, 'Pain', True)]
+        assert cache.stats() == {'size': 3, 'maxsize': 8}
+        assert list(cache.rows([])) == []
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import threading
+
+import pytest
+
+from app.db import ConnectionPool
+
+
+@pytest.fixture
+def db_config():
+    """Configuration minimale pointant vers une base temporaire"""
+    db_fd, db_path = tempfile.mkstemp()
+    config = {
+        'DATABASE_PATH': db_path,
+        'DATABASE_POOL_ENABLED': True,
+        'DATABASE_JOURNAL_MODE': 'WAL',
+        'DATABASE_SYNCHRONOUS': 'NORMAL',
+        'DATABASE_MMAP_SIZE': 1024 * 1024,
+        'DATABASE_CACHE_SIZE': -1000,
+    }
+    yield config
+    os.close(db_fd)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+
+
+class TestConnectionPool:
+    """Tests pour le pool de connexions SQLite"""
+
+    def test_connection_reused_in_same_thread(self, db_config):
+        """La même connexion est réutilisée par un thread"""
+        pool = ConnectionPool(db_config)
+        first = pool.acquire()
+        pool.release(first)
+        second = pool.acquire()
+        assert first is second
+        assert pool.stats()['opened'] == 1
+        assert pool.stats()['reused'] == 1
+        pool.close_all()
+
+    def test_one_connection_per_thread(self, db_config):
+        """Chaque thread obtient sa propre connexion"""
+        pool = ConnectionPool(db_config)
+        main_conn = pool.acquire()
+        other = []
+        thread = threading.Thread(target=lambda: other.append(pool.acquire()))
+        thread.start()
+        thread.join()
+        assert other[0] is not main_conn
+        assert pool.stats()['open'] == 2
+        pool.close_all()
+        assert pool.stats()['open'] == 0
+
+    def test_dead_threads_connections_closed(self, db_config):
+        """Un thread par requête : le pool reste borné aux threads vivants"""
+        pool = ConnectionPool(db_config)
+        for _ in range(50):
+            thread = threading.Thread(target=pool.acquire)
+            thread.start()
+            thread.join()
+            assert pool.stats()['open'] <= 1
+        pool.acquire()
+        stats = pool.stats()
+        assert stats['open'] == 1
+        assert stats['closed'] == stats['opened'] - 1 == 50
+        pool.close_all()
+
+    def test_pragmas_applied(self, db_config):
+        """Les pragmas sont appliqués à l'ouverture"""
+        pool = ConnectionPool(db_config)
+        conn = pool.acquire()
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1
+        assert conn.execute('PRAGMA cache_size').fetchone()[0] == -1000
+        pool.close_all()
+
+    def test_invalid_journal_mode(self, db_config):
+        """Un mode de journal inconnu est refusé"""
+        db_config['DATABASE_JOURNAL_MODE'] = 'WAL; DROP TABLE tasks'
+        pool = ConnectionPool(db_config)
+        with pytest.raises(ValueError):
+            pool.acquire()
+
+    def test_release_rolls_back_open_transaction(self, db_config):
+        """Une transaction non validée est annulée au retour dans le pool"""
+        pool = ConnectionPool(db_config)
+        conn = pool.acquire()
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        conn.execute('INSERT INTO t VALUES (1)')
+        assert conn.in_transaction
+        pool.release(conn)
+        assert not conn.in_transaction
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+        pool.close_all()
+
+    def test_disabled_pool_closes_connections(self, db_config):
+        """Sans pool, chaque acquisition ouvre une connexion fermée ensuite"""
+        db_config['DATABASE_POOL_ENABLED'] = False
+        pool = ConnectionPool(db_config)
+        first = pool.acquire()
+        pool.release(first)
+        second = pool.acquire()
+        pool.release(second)
+        assert first is not second
+        assert pool.stats()['opened'] == 2
+        assert pool.stats()['closed'] == 2
+
+    def test_database_path_change_reopens(self, db_config):
+        """Un changement de DATABASE_PATH ouvre une nouvelle connexion"""
+        pool = ConnectionPool(db_config)
+        first = pool.acquire()
+        db_config['DATABASE_PATH'] = ':memory:'
+        second = pool.acquire()
+        assert first is not second
+        assert pool.stats()['closed'] == 1
+        pool.close_all()
+
+    def test_connections_dropped_after_fork(self, db_config):
+        """Les connexions héritées d'un autre processus sont abandonnées"""
+        pool = ConnectionPool(db_config)
+        first = pool.acquire()
+        pool._pid = -1
+        second = pool.acquire()
+        assert first is not second
+        assert pool.stats()['pid'] == os.getpid()
+        first.close()
+        pool.close_all()
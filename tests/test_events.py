@@ -0,0 +1,184 @@
+import json
+
+import pytest
+
+from app.events import EventBroker, TooManyStreams, encode_events
+from app.memory import MemoryTaskRepository
+
+
+def make_broker(**kwargs):
+    repository = MemoryTaskRepository(object())
+    broker = EventBroker(repository, poll_interval=0.01, **kwargs)
+    return repository, broker
+
+
+def messages(chunk):
+    """(event, id, data) des messages SSE d'un fragment de flux"""
+    parsed = []
+    for block in chunk.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines()
+                      if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            parsed.append((fields['event'], fields.get('id'), json.loads(fields['data'])))
+    return parsed
+
+
+def next_messages(stream):
+    """Messages du prochain fragment qui en contient (hors keepalive)"""
+    for chunk in stream:
+        parsed = messages(chunk)
+        if parsed:
+            return parsed
+    return []
+
+
+class TestEncodeEvents:
+    def test_grouped_by_action(self):
+        message = encode_events([(1, 'added', 1, 'A', 0), (2, 'added', 2, 'B', 0),
+                                 (3, 'completed', 1, 'A', 1), (4, 'deleted', 2, None, None)])
+        assert (message.first_id, message.last_id) == (1, 4)
+        assert messages(message.data) == [('tasks', '4', {
+            'added': [[1, 'A', False], [2, 'B', False]], 'completed': [1], 'deleted': [2]})]
+
+
+class TestMemoryEvents:
+    """Journal du moteur en mémoire, identique aux triggers SQLite"""
+
+    def test_events_logged(self):
+        repository = MemoryTaskRepository(object())
+        repository.add_many(['A', 'B'])
+        repository.complete(1)
+        repository.complete(1)
+        repository.update(2, {'task': 'C'})
+        repository.delete(1)
+        assert repository.events(0) == [
+            (1, 'added', 1, 'A', False), (2, 'added', 2, 'B', False),
+            (3, 'completed', 1, 'A', True), (4, 'updated', 2, 'C', False),
+            (5, 'deleted', 1, None, None)]
+        assert repository.events(3, limit=1) == [(4, 'updated', 2, 'C', False)]
+        assert repository.events(5) == []
+        assert repository.last_event_id() == 5
+
+
+class TestEventBroker:
+    """Tests pour la diffusion des modifications"""
+
+    def test_live_deltas(self):
+        """Un flux sans curseur reçoit les modifications suivantes"""
+        repository, broker = make_broker()
+        repository.add('Avant')
+        stream = broker.stream(heartbeat=0.05, duration=2)
+        try:
+            assert next(stream).startswith(b'retry: ')
+            repository.add('Après')
+            repository.complete(2)
+            received = []
+            while sum(len(ids) for _, _, delta in received for ids in delta.values()) < 2:
+                received.extend(next_messages(stream))
+            assert received[0][2]['added'] == [[2, 'Après', False]]
+            assert received[-1][2].get('completed') == [2]
+            assert broker.streams == 1
+        finally:
+            stream.close()
+            broker.stop()
+        assert broker.streams == 0
+
+    def test_resume_from_buffer_and_log(self):
+        """Reprise depuis le tampon, ou depuis le journal s'il est dépassé"""
+        repository, broker = make_broker(buffer_size=1, batch_size=2)
+        broker.stream(duration=0).close()
+        repository.add_many(['A', 'B', 'C', 'D', 'E'])
+        broker.poll()
+        try:
+            stream = broker.stream(cursor=1, heartbeat=0.05, duration=0.2)
+            received = [message for chunk in stream for message in messages(chunk)]
+        finally:
+            broker.stop()
+        added = [task[0] for _, _, delta in received for task in delta['added']]
+        assert added == [2, 3, 4, 5]
+        assert received[-1][1] == '5'
+
+    def test_reset_when_events_lost(self):
+        """Un curseur purgé du journal ou inconnu déclenche un reset"""
+        repository, broker = make_broker()
+        repository.add_many(['A', 'B'])
+        repository._events.popleft()
+        try:
+            lost = next_messages(broker.stream(cursor=0, heartbeat=0.05, duration=0.2))
+            unknown = next_messages(broker.stream(cursor=99, heartbeat=0.05, duration=0.2))
+        finally:
+            broker.stop()
+        assert lost[0][0] == 'reset'
+        assert unknown[0][0] == 'reset'
+
+    def test_max_streams(self):
+        repository, broker = make_broker(max_streams=1)
+        stream = broker.stream(heartbeat=0.05, duration=1)
+        try:
+            next(stream)
+            with pytest.raises(TooManyStreams):
+                broker.stream()
+        finally:
+            stream.close()
+            broker.stop()
+
+    def test_position(self):
+        """Sans flux, la position est lue dans le stockage"""
+        repository, broker = make_broker()
+        repository.add('A')
+        assert broker.position() == 1
+        assert broker._thread is None
+
+    def test_position_cached(self):
+        """La position lue dans le stockage est gardée jusqu'à une écriture"""
+        repository, broker = make_broker()
+        broker.poll_interval = 60
+        reads = []
+        last_event_id = repository.last_event_id
+        repository.last_event_id = lambda: reads.append(1) or last_event_id()
+        assert [broker.position() for _ in range(3)] == [0, 0, 0]
+        assert len(reads) == 1
+
+        repository.add('A')
+        broker.notify(repository.sender)
+        assert broker.position() == 1
+        assert len(reads) == 2
+
+
+class TestEventsRoute:
+    """Tests de la route /events"""
+
+    @pytest.fixture
+    def events_client(self, client):
+        client.application.config.update(EVENTS_HEARTBEAT_SECONDS=0.05,
+                                         EVENTS_STREAM_SECONDS=0.3)
+        yield client
+        client.application.extensions['event_broker'].stop()
+
+    def test_page_links_stream(self, events_client):
+        events_client.post('/add', data={'task': 'Existante'})
+        rv = events_client.get('/')
+        assert b'data-events="/events?last_event_id=1"' in rv.data
+
+    def test_stream_resumes_after_last_event_id(self, events_client):
+        """Les modifications postérieures au jeton sont rejouées"""
+        events_client.post('/add', data={'task': 'Une'})
+        events_client.post('/add', data={'task': 'Deux'})
+        events_client.get('/delete/1')
+        rv = events_client.get('/events', headers={'Last-Event-ID': '1'})
+        assert rv.status_code == 200
+        assert rv.mimetype == 'text/event-stream'
+        received = messages(rv.data)
+        assert received[0][2]['added'] == [[2, 'Deux', False]]
+        assert received[0][2]['deleted'] == [1]
+
+    def test_disabled(self, monkeypatch, tmp_path):
+        from app.app import create_app
+        from app.config import config
+        monkeypatch.setattr(config['testing'], 'EVENTS_ENABLED', False)
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+        app = create_app('testing')
+        client = app.test_client()
+        assert client.get('/events').status_code == 404
+        assert b'data-events' not in client.get('/').data
+        app.extensions['task_repository'].close()
@@ -0,0 +1,126 @@
+import logging
+import os
+import time
+
+import pytest
+
+from app.health import HealthChecker
+
+
+class FlakyCheck:
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {'calls': self.calls}
+
+
+class TestHealthChecker:
+    """Tests pour la vérification mise en cache"""
+
+    def test_cached_between_refreshes(self):
+        """Les sondes réutilisent le résultat tant qu'il n'est pas périmé"""
+        check = FlakyCheck()
+        checker = HealthChecker(check, ttl=60)
+        try:
+            first = checker.result()
+            second = checker.result()
+        finally:
+            checker.stop()
+        assert first['ready'] and second['ready']
+        assert check.calls == 1
+        assert second['details'] == {'calls': 1}
+
+    def test_background_refresh(self):
+        check = FlakyCheck()
+        checker = HealthChecker(check, ttl=0.01)
+        try:
+            checker.result()
+            deadline = time.monotonic() + 2
+            while check.calls < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            checker.stop()
+        assert check.calls >= 3
+
+    def test_stale_result_refreshed_by_probe(self):
+        check = FlakyCheck()
+        checker = HealthChecker(check, ttl=60)
+        try:
+            checker.result()
+            checker._checked -= checker.stale_after + 1
+            assert checker.result()['details'] == {'calls': 2}
+        finally:
+            checker.stop()
+
+    def test_state_changes_logged_once(self, caplog):
+        """Échec et rétablissement sont journalisés, pas chaque vérification"""
+        check = FlakyCheck()
+        checker = HealthChecker(check, ttl=60, logger=logging.getLogger('test_health'))
+        with caplog.at_level(logging.INFO, logger='test_health'):
+            checker.refresh()
+            check.error = RuntimeError('disque plein')
+            failed = checker.refresh()
+            checker.refresh()
+            check.error = None
+            checker.refresh()
+            checker.refresh()
+        assert failed['ready'] is False
+        assert failed['error'] == 'disque plein'
+        assert [record.action for record in caplog.records] == [
+            'readiness_failed', 'readiness_recovered']
+
+
+class TestProbeRoutes:
+    """Tests des routes de sonde"""
+
+    @pytest.fixture(autouse=True)
+    def stop_checker(self, client):
+        yield
+        client.application.extensions['health_checker'].stop()
+
+    def test_livez(self, client):
+        rv = client.get('/livez')
+        assert rv.status_code == 200
+        assert rv.get_json() == {'status': 'alive'}
+
+    def test_readyz_details(self, client):
+        client.post('/add', data={'task': 'Écriture mesurée'})
+        rv = client.get('/readyz')
+        assert rv.status_code == 200
+        data = rv.get_json()
+        assert data['status'] == 'ready'
+        assert data['details']['database_bytes'] > 0
+        assert data['details']['wal_bytes'] >= 0
+        assert data['details']['last_write_ms'] > 0
+        assert data['details']['schema_version'] >= 1
+
+    def test_probes_share_cached_result(self, client):
+        """/readyz et /health n'interrogent la base qu'une fois par TTL"""
+        checker = client.application.extensions['health_checker']
+        checker.ttl = checker.stale_after = 60
+        checked_at = client.get('/readyz').get_json()['checked_at']
+        for _ in range(5):
+            client.get('/readyz')
+            client.get('/health')
+        assert checker.result()['checked_at'] == checked_at
+
+    def test_readyz_missing_database(self, monkeypatch, tmp_path):
+        """Une base disparue n'est pas recréée : le service n'est pas prêt"""
+        from app.app import create_app
+        from app.config import config
+        db_path = str(tmp_path / 'tasks.db')
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', db_path)
+        monkeypatch.setattr(config['testing'], 'INSTRUMENTATION_ENABLED', False)
+        app = create_app('testing')
+        app.extensions['db_pool'].close_all()
+        os.remove(db_path)
+        rv = app.test_client().get('/readyz')
+        assert rv.status_code == 503
+        assert rv.get_json()['status'] == 'unready'
+        assert not os.path.exists(db_path)
+        app.extensions['health_checker'].stop()
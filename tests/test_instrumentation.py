@@ -0,0 +1,127 @@
+import logging
+import sqlite3
+import threading
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.instrumentation import RowCountGauge, TimedConnection, statement_kind, time_logger
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestStatementKind:
+    """Tests pour la classification des instructions SQL"""
+
+    @pytest.mark.parametrize('sql, kind', [
+        ('SELECT id FROM tasks', 'select'),
+        ('  insert INTO tasks (task) VALUES (?)', 'insert'),
+        ('UPDATE tasks SET completed = TRUE', 'update'),
+        ('DELETE FROM tasks WHERE id = ?', 'delete'),
+        ('PRAGMA data_version', 'pragma'),
+        ('BEGIN IMMEDIATE', 'transaction'),
+        ('SAVEPOINT write_behind', 'transaction'),
+        ('CREATE TABLE t (x)', 'other'),
+        ('', 'other'),
+    ])
+    def test_kinds(self, sql, kind):
+        assert statement_kind(sql) == kind
+
+
+class TestTimedConnection:
+    """Tests pour la mesure des instructions SQL"""
+
+    def test_statements_and_commit_observed(self):
+        """execute, executemany et commit alimentent l'histogramme par type"""
+        before = {kind: sample('db_query_seconds_count', kind=kind)
+                  for kind in ('select', 'insert', 'commit', 'other')}
+        conn = sqlite3.connect(':memory:', factory=TimedConnection)
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        conn.executemany('INSERT INTO t VALUES (?)', [(1,), (2,)])
+        conn.commit()
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 2
+        conn.close()
+
+        for kind in before:
+            assert sample('db_query_seconds_count', kind=kind) == before[kind] + 1
+
+    def test_failed_statement_observed(self):
+        """Une instruction en erreur est mesurée puis l'erreur propagée"""
+        before = sample('db_query_seconds_count', kind='select')
+        conn = sqlite3.connect(':memory:', factory=TimedConnection)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute('SELECT * FROM missing')
+        conn.close()
+        assert sample('db_query_seconds_count', kind='select') == before + 1
+
+
+class TestTimeLogger:
+    """Tests pour la mesure du logging"""
+
+    def test_handle_timed_once(self):
+        """L'enveloppe ne se cumule pas et peut être retirée"""
+        logger = logging.getLogger('test_instrumentation')
+        logger.setLevel(logging.INFO)
+        time_logger(logger)
+        time_logger(logger)
+        before = sample('log_emit_seconds_count')
+        logger.info('Mesuré')
+        assert sample('log_emit_seconds_count') == before + 1
+
+        time_logger(logger, enabled=False)
+        logger.info('Non mesuré')
+        assert sample('log_emit_seconds_count') == before + 1
+        assert 'handle' not in logger.__dict__
+
+
+class TestAppInstrumentation:
+    """Tests de l'instrumentation des requêtes"""
+
+    def test_hot_path_metrics_exported(self, monkeypatch, tmp_path):
+        """Requêtes SQL, rendu, acquisition et nombre de tâches sont exportés"""
+        from app.app import create_app
+        from app.config import config
+        monkeypatch.setattr(config['testing'], 'INSTRUMENTATION_ENABLED', True)
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+        app = create_app('testing')
+        client = app.test_client()
+        client.post('/add', data={'task': 'Instrumented'})
+        client.get('/')
+        rv = client.get('/metrics')
+        assert b'db_query_seconds_count{kind="insert"}' in rv.data
+        assert b'template_render_seconds_count{template="index.html"}' in rv.data
+        assert b'db_connection_acquire_seconds_count' in rv.data
+        assert sample('tasks_rows') >= 0
+        app.extensions['row_count_gauge'].stop()
+        app.extensions['task_repository'].close()
+
+    def test_row_count_refreshed_in_background(self):
+        """La jauge du nombre de tâches est mise à jour hors des requêtes"""
+        counted = threading.Event()
+
+        def count():
+            counted.set()
+            return 42
+
+        gauge = RowCountGauge(count, interval=60)
+        gauge.start()
+        gauge.start()
+        assert counted.wait(5)
+        gauge.stop()
+        assert sample('tasks_rows') == 42
+
+    def test_disabled_uses_plain_connections(self, monkeypatch, tmp_path):
+        """Désactivée, l'instrumentation n'enveloppe ni connexions ni logger"""
+        from app.app import create_app
+        from app.config import config
+        monkeypatch.setattr(config['testing'], 'INSTRUMENTATION_ENABLED', False)
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+        app = create_app('testing')
+        before = sample('db_query_seconds_count', kind='select')
+        with app.app_context():
+            assert app.extensions['task_repository'].count() == 0
+        assert sample('db_query_seconds_count', kind='select') == before
+        assert 'handle' not in app.logger.__dict__
+        app.extensions['task_repository'].close()
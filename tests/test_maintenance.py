@@ -0,0 +1,188 @@
+import json
+import os
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.app import create_app
+from app.config import config
+from app.db import ConnectionPool
+from app.maintenance import (MaintenanceScheduler, archive, checkpoint, maintenance_jobs, optimize,
+                             vacuum)
+from app.migrations import migrate
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool({'DATABASE_PATH': str(tmp_path / 'tasks.db'),
+                           'DATABASE_AUTO_VACUUM': 'INCREMENTAL'})
+    conn = pool.connect()
+    migrate(conn)
+    conn.close()
+    return pool
+
+
+def fill(conn, count, text='x' * 500):
+    conn.executemany('INSERT INTO tasks (task, completed) VALUES (?, ?)',
+                     ((text, i % 2) for i in range(count)))
+    conn.commit()
+
+
+class TestJobs:
+    """Tests des travaux de maintenance"""
+
+    def test_incremental_vacuum_reclaims_pages(self, pool):
+        conn = pool.connect()
+        fill(conn, 2000)
+        conn.execute('DELETE FROM tasks')
+        conn.commit()
+        checkpoint(conn, pool.config['DATABASE_PATH'])
+        size = os.path.getsize(pool.config['DATABASE_PATH'])
+
+        reclaimed, details = vacuum(conn, pool.config['DATABASE_PATH'])
+        checkpoint(conn, pool.config['DATABASE_PATH'])
+        assert details == {'method': 'incremental', 'free_pages': 0}
+        assert reclaimed > 500 * 1000
+        assert os.path.getsize(pool.config['DATABASE_PATH']) <= size - reclaimed
+        conn.close()
+
+    def test_legacy_database_converted_once(self, tmp_path):
+        """Une base sans auto_vacuum est réécrite par un VACUUM complet"""
+        pool = ConnectionPool({'DATABASE_PATH': str(tmp_path / 'legacy.db'),
+                               'DATABASE_AUTO_VACUUM': 'NONE'})
+        conn = pool.connect()
+        migrate(conn)
+        fill(conn, 1000)
+        conn.execute('DELETE FROM tasks WHERE id > 100')
+        conn.commit()
+        conn.close()
+
+        pool.config['DATABASE_AUTO_VACUUM'] = 'INCREMENTAL'
+        conn = pool.connect()
+        reclaimed, details = vacuum(conn, pool.config['DATABASE_PATH'])
+        assert details['method'] == 'full' and reclaimed > 0
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        conn.close()
+
+    def test_checkpoint_truncates_wal(self, pool):
+        conn = pool.connect()
+        fill(conn, 200)
+        wal_path = pool.config['DATABASE_PATH'] + '-wal'
+        size = os.path.getsize(wal_path)
+        reclaimed, details = checkpoint(conn, pool.config['DATABASE_PATH'])
+        assert reclaimed == size
+        assert details['busy'] is False
+        assert os.path.getsize(wal_path) == 0
+        with pytest.raises(ValueError):
+            checkpoint(conn, pool.config['DATABASE_PATH'], 'SOMETIMES')
+        conn.close()
+
+    def test_optimize_collects_statistics(self, pool):
+        conn = pool.connect()
+        fill(conn, 10)
+        optimize(conn, pool.config['DATABASE_PATH'])
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl = 'tasks'").fetchone()[0] > 0
+        conn.close()
+
+    def test_archive_old_completed_tasks(self, pool):
+        conn = pool.connect()
+        conn.executemany('INSERT INTO tasks (task, completed, created_at) VALUES (?, ?, ?)', [
+            ('Ancienne finie', 1, '2020-01-01 00:00:00'),
+            ('Ancienne ouverte', 0, '2020-01-01 00:00:00'),
+            ('Récente finie', 1, '2999-01-01 00:00:00'),
+            ('Ancienne finie 2', 1, '2020-01-02 00:00:00'),
+        ])
+        conn.commit()
+        _, details = archive(conn, pool.config['DATABASE_PATH'], days=30, batch_size=1)
+        assert details == {'archived': 2}
+        assert conn.execute('SELECT id, task FROM tasks_archive').fetchall() == [
+            (1, 'Ancienne finie'), (4, 'Ancienne finie 2')]
+        assert conn.execute('SELECT id FROM tasks').fetchall() == [(2,), (3,)]
+        assert conn.execute("SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH 'finie'").fetchall() == [(3,)]
+        assert archive(conn, pool.config['DATABASE_PATH'], days=0) == (0, {'archived': 0})
+        conn.close()
+
+
+class TestScheduler:
+    """Tests pour l'ordonnanceur et l'élection du leader"""
+
+    def scheduler(self, pool, tmp_path, jobs=None):
+        return MaintenanceScheduler(
+            jobs or maintenance_jobs(dict(config['testing'].__dict__, **{
+                key: getattr(config['testing'], key) for key in dir(config['testing'])
+                if key.startswith('MAINTENANCE_')})),
+            lambda: [pool.config['DATABASE_PATH']], pool.connect, str(tmp_path / 'maintenance.lock'))
+
+    def test_single_leader(self, pool, tmp_path):
+        first, second = self.scheduler(pool, tmp_path), self.scheduler(pool, tmp_path)
+        assert first.acquire_leadership()
+        assert not second.acquire_leadership()
+        first.release_leadership()
+        assert second.acquire_leadership()
+        second.release_leadership()
+
+    def test_last_runs_survive_leader_change(self, pool, tmp_path):
+        first = self.scheduler(pool, tmp_path)
+        first.acquire_leadership()
+        first.last_runs = {'checkpoint': 10000.0}
+        first._save_last_runs()
+        first.release_leadership()
+
+        second = self.scheduler(pool, tmp_path)
+        second.acquire_leadership()
+        assert second.last_runs == {'checkpoint': 10000.0}
+        wait, due = second.next_due(now=10290.0)
+        assert 'checkpoint' not in due and 'optimize' in due
+        assert wait == 10.0
+        second.release_leadership()
+
+    def test_job_metrics_and_errors(self, pool, tmp_path):
+        def failing(conn, db_path):
+            raise RuntimeError('disque plein')
+
+        scheduler = self.scheduler(pool, tmp_path, jobs=[
+            ('checkpoint', 60, checkpoint), ('broken', 60, failing)])
+        conn = pool.connect()
+        fill(conn, 50)
+        conn.close()
+        before = REGISTRY.get_sample_value('maintenance_reclaimed_bytes_total',
+                                           {'job': 'checkpoint'}) or 0
+        result, = scheduler.run_job('checkpoint')
+        assert result['reclaimed_bytes'] > 0 and result['duration_ms'] >= 0
+        assert REGISTRY.get_sample_value('maintenance_reclaimed_bytes_total',
+                                         {'job': 'checkpoint'}) == before + result['reclaimed_bytes']
+        assert scheduler.run_job('broken')[0]['error'] == 'disque plein'
+
+    def test_thread_runs_due_jobs(self, pool, tmp_path):
+        scheduler = self.scheduler(pool, tmp_path, jobs=[('checkpoint', 3600, checkpoint)])
+        scheduler.ensure_started()
+        try:
+            for _ in range(200):
+                if 'checkpoint' in scheduler.results:
+                    break
+                scheduler._stop.wait(0.01)
+            assert scheduler.leader
+            assert scheduler.results['checkpoint'][0]['database'] == pool.config['DATABASE_PATH']
+        finally:
+            scheduler.stop()
+        assert not scheduler.leader
+        with open(str(tmp_path / 'maintenance.lock')) as lock_file:
+            assert 'checkpoint' in json.load(lock_file)
+
+
+class TestMaintenanceApplication:
+    def test_command_and_lazy_start(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+        monkeypatch.setattr(config['testing'], 'MAINTENANCE_ENABLED', True)
+        app = create_app('testing')
+        scheduler = app.extensions['maintenance']
+        assert scheduler._thread is None
+        try:
+            result = app.test_cli_runner().invoke(args=['run-maintenance', 'optimize'])
+            assert json.loads(result.output)['job'] == 'optimize'
+
+            app.test_client().get('/livez')
+            assert scheduler._thread is not None
+        finally:
+            scheduler.stop()
+            app.extensions['task_repository'].close()
@@ -0,0 +1,141 @@
+import threading
+
+from app.memory import MemoryTaskRepository
+from app.validation import PageArgs, SearchArgs, build_match_query
+
+
+def make_repository(**kwargs):
+    return MemoryTaskRepository(object(), **kwargs)
+
+
+class TestMemoryTaskRepository:
+    """Tests pour le moteur de stockage en mémoire"""
+
+    def test_keyset_pages(self):
+        """Les pages suivent l'ordre des ids à partir du curseur"""
+        repository = make_repository()
+        repository.add_many(['Task {}'.format(i) for i in range(5)])
+        page = repository.page(PageArgs(0, 2, None)).load()
+        assert [row[0] for row in page] == [1, 2]
+        assert page.next_after == 2
+        page = repository.page(PageArgs(4, 2, None)).load()
+        assert [row[0] for row in page] == [5]
+        assert page.next_after is None
+
+    def test_status_filter(self):
+        """Les filtres open et done s'appliquent avant la limite"""
+        repository = make_repository()
+        repository.add_many(['A', 'B', 'C', 'D'])
+        repository.complete(1)
+        repository.complete(3)
+        assert [row[0] for row in repository.page(PageArgs(0, 10, 'open'))] == [2, 4]
+        assert [row[0] for row in repository.page(PageArgs(0, 10, 'done'))] == [1, 3]
+
+    def test_status_index_follows_changes(self):
+        """Les index par statut suivent modifications et suppressions"""
+        repository = make_repository(stripes=3)
+        repository.add_many(['Task {}'.format(i) for i in range(10)])
+        for task_id in (2, 5, 7):
+            repository.complete(task_id)
+        repository.update(5, {'completed': False})
+        repository.delete(7)
+        assert [row[0] for row in repository.page(PageArgs(0, 10, 'done'))] == [2]
+        page = repository.page(PageArgs(2, 3, 'open')).load()
+        assert [row[0] for row in page] == [3, 4, 5] and page.next_after == 5
+        rows, next_offset = repository.search(SearchArgs(build_match_query('task'), 2, 3, 'open'))
+        assert [row[0] for row in rows] == [8, 6, 5] and next_offset == 5
+
+    def test_writes_take_only_their_stripe(self):
+        """Modifier une tâche n'attend pas le verrou des autres bandes"""
+        repository = make_repository(stripes=2)
+        repository.add_many(['Paire', 'Impaire'])
+        done = threading.Event()
+
+        def complete():
+            repository.complete(1)
+            repository.delete(1)
+            done.set()
+
+        with repository._stripe(2).lock:
+            threading.Thread(target=complete).start()
+            assert done.wait(5)
+        assert repository.count() == 1
+
+    def test_update_and_delete(self):
+        """Modification partielle puis suppression d'une tâche"""
+        repository = make_repository()
+        task_id = repository.add('Original')
+        assert repository.update(task_id, {'task': 'Renamed'}) == (task_id, 'Renamed', False)
+        repository.delete(task_id)
+        assert repository.get(task_id) is None
+        assert repository.update(task_id, {'completed': True}) is None
+        assert repository.add('Next') == task_id + 1
+
+    def test_expected_version(self):
+        """Une écriture conditionnelle échoue si la tâche a changé"""
+        repository = make_repository()
+        task_id = repository.add('Original')
+        stale = repository.get(task_id)
+        repository.update(task_id, {'task': 'Renamed'})
+        assert repository.update(task_id, {'completed': True}, expected=stale) is None
+        assert repository.delete(task_id, expected=stale) is False
+        assert repository.delete(task_id, expected=repository.get(task_id)) is True
+
+    def test_search_words_and_prefixes(self):
+        """Mots entiers ou préfixes, sans accents ni casse, plus récents d'abord"""
+        repository = make_repository()
+        repository.add_many(['Réviser le rapport', 'Rapporter le livre', 'Lire le rapport'])
+        rows, _ = repository.search(SearchArgs(build_match_query('RAPPORT'), 0, 10, None))
+        assert [row[0] for row in rows] == [3, 1]
+        rows, _ = repository.search(SearchArgs(build_match_query('rap* reviser'), 0, 10, None))
+        assert [row[0] for row in rows] == [1]
+        rows, next_offset = repository.search(SearchArgs(build_match_query('le'), 0, 2, None))
+        assert len(rows) == 2 and next_offset == 2
+
+    def test_changes_signalled(self):
+        """Chaque écriture émet tasks_changed pour l'émetteur configuré"""
+        from app.db import tasks_changed
+        repository = make_repository()
+        events = []
+
+        def receiver(sender, **extra):
+            events.append((extra['action'], extra['ids']))
+
+        tasks_changed.connect(receiver, sender=repository.sender)
+        task_id = repository.add('Signalled')
+        repository.complete(task_id)
+        repository.delete(task_id)
+        tasks_changed.disconnect(receiver, sender=repository.sender)
+        assert events == [('added', [1]), ('completed', [1]), ('deleted', [1])]
+
+    def test_concurrent_adds_get_unique_ids(self):
+        """Les ajouts concurrents obtiennent des ids distincts et ordonnés"""
+        repository = make_repository(stripes=4)
+
+        def add_tasks():
+            for i in range(200):
+                repository.add('Task {}'.format(i))
+
+        threads = [threading.Thread(target=add_tasks) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ids = [row[0] for row in repository.page(PageArgs(0, 1000, None))]
+        assert ids == list(range(1, 801))
+
+    def test_snapshot_round_trip(self, tmp_path):
+        """Un instantané restaure les tâches et le compteur d'ids"""
+        path = str(tmp_path / 'tasks.json')
+        repository = make_repository(snapshot_path=path, snapshot_interval=0)
+        repository.init()
+        repository.add_many(['Kept', 'Deleted', 'Done'])
+        repository.delete(2)
+        repository.complete(3)
+        repository.close()
+
+        restored = make_repository(snapshot_path=path, snapshot_interval=0)
+        restored.init()
+        assert list(restored.page(PageArgs(0, 10, None))) == [(1, 'Kept', False), (3, 'Done', True)]
+        assert restored.add('New') == 4
+        assert restored.stats()['tasks'] == 3
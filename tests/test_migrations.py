@@ -0,0 +1,115 @@
+import sqlite3
+
+import pytest
+
+from app.migrations import SCHEMA_VERSION, get_schema_version, migrate
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'tasks.db'))
+    yield conn
+    conn.close()
+
+
+def columns(conn):
+    return [row[1] for row in conn.execute('PRAGMA table_info(tasks)')]
+
+
+def indexes(conn):
+    return {row[1] for row in conn.execute('PRAGMA index_list(tasks)')}
+
+
+class TestMigrations:
+    """Tests pour le gestionnaire de migrations"""
+
+    def test_fresh_database(self, conn):
+        """Une base vide est amenée à la dernière version"""
+        assert migrate(conn) == SCHEMA_VERSION
+        assert columns(conn) == ['id', 'task', 'completed', 'created_at', 'user_id']
+        assert {'idx_tasks_open', 'idx_tasks_created_at'} <= indexes(conn)
+
+    def test_migrate_is_idempotent(self, conn):
+        """Un second passage ne modifie rien"""
+        migrate(conn)
+        conn.execute("INSERT INTO tasks (task) VALUES ('Kept')")
+        conn.commit()
+        assert migrate(conn) == SCHEMA_VERSION
+        assert conn.execute('SELECT task FROM tasks').fetchall() == [('Kept',)]
+
+    def test_legacy_database_upgraded(self, conn):
+        """Une base créée par l'ancien init_db conserve ses tâches et ses ids"""
+        migrate(conn, target=1)
+        conn.executemany('INSERT INTO tasks (task, completed) VALUES (?, ?)',
+                         [('Old 1', False), ('Old 2', True), ('Old 3', False)])
+        conn.execute('DELETE FROM tasks WHERE id = 3')
+        conn.commit()
+        assert get_schema_version(conn) == 1
+
+        migrate(conn)
+        rows = conn.execute('SELECT id, task, completed FROM tasks').fetchall()
+        assert rows == [(1, 'Old 1', 0), (2, 'Old 2', 1)]
+        assert conn.execute('SELECT COUNT(*) FROM tasks WHERE created_at IS NULL').fetchone()[0] == 0
+
+        # L'id 3 supprimé n'est pas réattribué
+        cursor = conn.execute("INSERT INTO tasks (task) VALUES ('New')")
+        assert cursor.lastrowid == 4
+
+    def test_full_text_index_built_from_existing_tasks(self, conn):
+        """L'index FTS5 reprend les tâches existantes puis suit les écritures"""
+        migrate(conn, target=2)
+        conn.execute("INSERT INTO tasks (task) VALUES ('Acheter du pain')")
+        conn.commit()
+        migrate(conn)
+
+        def search(term):
+            return [row[0] for row in conn.execute(
+                'SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?', (term,))]
+
+        assert search('pain') == [1]
+        conn.execute("INSERT INTO tasks (task) VALUES ('Pain complet')")
+        conn.execute("UPDATE tasks SET task = 'Acheter du lait' WHERE id = 1")
+        assert search('pain') == [2]
+        conn.execute('DELETE FROM tasks WHERE id = 2')
+        assert search('pain') == []
+
+    def test_open_tasks_use_partial_index(self, conn):
+        """La requête des tâches ouvertes utilise l'index partiel"""
+        migrate(conn)
+        plan = ' '.join(row[3] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT id, task, completed FROM tasks '
+            'WHERE id > 0 AND completed = 0 ORDER BY id LIMIT 10'))
+        assert 'idx_tasks_open' in plan
+
+
+class TestTaskEvents:
+    """Tests pour le journal des modifications (triggers task_events)"""
+
+    def events(self, conn):
+        return conn.execute(
+            'SELECT id, action, task_id, task, completed FROM task_events ORDER BY id').fetchall()
+
+    def test_writes_logged(self, conn):
+        """Ajout, complétion, modification et suppression sont journalisés"""
+        migrate(conn)
+        conn.execute("INSERT INTO tasks (task) VALUES ('A')")
+        conn.execute('UPDATE tasks SET completed = TRUE WHERE id = 1')
+        conn.execute('UPDATE tasks SET completed = TRUE WHERE id = 1')
+        conn.execute("UPDATE tasks SET task = 'B' WHERE id = 1")
+        conn.execute('DELETE FROM tasks WHERE id = 1')
+        assert self.events(conn) == [
+            (1, 'added', 1, 'A', 0),
+            (2, 'completed', 1, 'A', 1),
+            (3, 'updated', 1, 'B', 1),
+            (4, 'deleted', 1, None, None),
+        ]
+
+    def test_log_purged(self, conn, monkeypatch):
+        """Le journal est purgé par lots au-delà de sa taille"""
+        from app import migrations
+        monkeypatch.setattr(migrations, 'EVENT_LOG_SIZE', 10)
+        monkeypatch.setattr(migrations, 'EVENT_LOG_PURGE_EVERY', 5)
+        migrate(conn)
+        conn.executemany('INSERT INTO tasks (task) VALUES (?)', [('T',)] * 23)
+        ids = [row[0] for row in self.events(conn)]
+        assert ids == list(range(11, 24))
@@ -0,0 +1,138 @@
+import pstats
+import threading
+
+import pytest
+
+from app.app import create_app
+from app.profiling import ProfilerBusy, RequestProfiler, StackSampler
+
+TOKEN = 'secret-profiling-token'
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+class TestStackSampler:
+    """Tests pour l'échantillonnage des piles"""
+
+    def test_samples_other_threads(self):
+        """Les piles des autres threads sont relevées, pas celle de l'appelant"""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name='busy-worker')
+        worker.start()
+        try:
+            result = StackSampler(interval=0.001).sample(0.05)
+        finally:
+            stop.set()
+            worker.join()
+
+        assert result.samples >= 2
+        collapsed = result.collapsed()
+        assert 'busy-worker;' in collapsed
+        assert 'busy_loop (test_profiling.py:' in collapsed
+        assert 'test_samples_other_threads' not in collapsed
+        for line in collapsed.splitlines():
+            assert int(line.rsplit(' ', 1)[1]) >= 1
+
+    def test_speedscope_document(self):
+        """Un profil échantillonné par thread, indices de frames partagés"""
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name='busy-worker')
+        worker.start()
+        try:
+            document = StackSampler(interval=0.001).sample(0.02).speedscope()
+        finally:
+            stop.set()
+            worker.join()
+
+        frames = document['shared']['frames']
+        profile = next(p for p in document['profiles'] if p['name'] == 'busy-worker')
+        assert profile['type'] == 'sampled'
+        assert len(profile['samples']) == len(profile['weights'])
+        assert any(frames[stack[-1]]['name'] in ('busy_loop', 'is_set')
+                   for stack in profile['samples'])
+
+    def test_single_sampling_at_a_time(self):
+        sampler = StackSampler()
+        sampler._lock.acquire()
+        with pytest.raises(ProfilerBusy):
+            sampler.sample(0.01)
+
+
+class TestRequestProfiler:
+    """Tests pour le profilage d'une requête"""
+
+    def test_concurrency_cap(self, tmp_path):
+        """Au-delà de max_concurrent, start() ne profile pas"""
+        profiler = RequestProfiler(str(tmp_path), max_concurrent=1)
+        profile = profiler.start()
+        assert profiler.start() is None
+        filename = profiler.stop(profile, 'GET', '/api/tasks')
+        assert filename.endswith('-get-api_tasks.prof')
+        assert pstats.Stats(str(tmp_path / filename)).total_calls > 0
+
+        profile = profiler.start()
+        assert profile is not None
+        profiler.stop(profile, 'GET', '/')
+
+
+@pytest.fixture
+def profiling_client(tmp_path, monkeypatch):
+    from app.config import config
+    monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+    monkeypatch.setattr(config['testing'], 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(config['testing'], 'PROFILING_TOKEN', TOKEN)
+    monkeypatch.setattr(config['testing'], 'PROFILING_DIR', str(tmp_path / 'profiles'))
+    monkeypatch.setattr(config['testing'], 'PROFILING_MAX_CONCURRENT', 1)
+    app = create_app('testing')
+    yield app.test_client()
+    app.extensions['task_repository'].close()
+
+
+class TestProfilingRoutes:
+    """Tests des routes de profilage"""
+
+    def test_disabled_by_default(self, client):
+        assert client.get('/admin/profile',
+                          headers={'X-Admin-Token': TOKEN}).status_code == 404
+        assert 'X-Profile' not in client.get('/', headers={'X-Profile': '1'}).headers
+
+    def test_token_required(self, profiling_client):
+        assert profiling_client.get('/admin/profile').status_code == 403
+        rv = profiling_client.get('/admin/profile', headers={'X-Admin-Token': 'wrong'})
+        assert rv.status_code == 403
+        rv = profiling_client.get('/', headers={'X-Profile': '1', 'X-Admin-Token': 'wrong'})
+        assert rv.status_code == 200
+        assert 'X-Profile' not in rv.headers
+
+    def test_enabled_requires_token(self, monkeypatch):
+        from app.config import config
+        monkeypatch.setattr(config['testing'], 'PROFILING_ENABLED', True)
+        with pytest.raises(ValueError):
+            create_app('testing')
+
+    def test_sampling_formats(self, profiling_client):
+        headers = {'X-Admin-Token': TOKEN}
+        rv = profiling_client.get('/admin/profile?seconds=0.02', headers=headers)
+        assert rv.status_code == 200
+        assert rv.mimetype == 'text/plain'
+
+        rv = profiling_client.get('/admin/profile?seconds=0.02&format=speedscope',
+                                  headers=headers)
+        assert rv.status_code == 200
+        assert rv.get_json()['$schema'].startswith('https://www.speedscope.app/')
+
+        rv = profiling_client.get('/admin/profile?format=pprof', headers=headers)
+        assert rv.status_code == 400
+
+    def test_request_profile_written(self, profiling_client, tmp_path):
+        """L'en-tête X-Profile écrit le profil de la seule requête"""
+        rv = profiling_client.get('/api/tasks',
+                                  headers={'X-Profile': '1', 'X-Admin-Token': TOKEN})
+        assert rv.status_code == 200
+        filename = rv.headers['X-Profile']
+        stats = pstats.Stats(str(tmp_path / 'profiles' / filename))
+        assert any(name == 'api_list_tasks' for _, _, name in stats.stats)
+        assert 'X-Profile' not in profiling_client.get('/api/tasks').headers
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+
+import pytest
+
+from app.config import config
+from app.migrations import SCHEMA_VERSION
+from app.serve import gunicorn_options, migrate_databases, prepare_metrics_dir
+
+
+@pytest.fixture
+def multiproc_env():
+    """Sauvegarde et restaure PROMETHEUS_MULTIPROC_DIR"""
+    previous = os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    yield
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    if previous is not None:
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = previous
+
+
+class Settings(config['production']):
+    WEB_WORKERS = 3
+    WEB_THREADS = 8
+    WEB_MAX_REQUESTS = 1000
+
+
+class TestServe:
+    """Tests pour le point d'entrée de production"""
+
+    def test_gunicorn_options_from_config(self):
+        """Les options gunicorn reprennent la configuration"""
+        options = gunicorn_options(Settings)
+        assert options['workers'] == 3
+        assert options['threads'] == 8
+        assert options['worker_class'] == 'gthread'
+        assert options['max_requests_jitter'] == 100
+
+    def test_memory_backend_uses_one_worker(self):
+        """Le stockage en mémoire n'est pas partagé : un seul worker"""
+        class MemorySettings(Settings):
+            STORAGE_BACKEND = 'memory'
+        assert gunicorn_options(MemorySettings)['workers'] == 1
+
+    def test_single_worker_keeps_default_metrics(self, multiproc_env):
+        """Un seul worker n'active pas le mode multi-processus"""
+        Settings.WEB_WORKERS = 1
+        try:
+            assert prepare_metrics_dir(Settings) is None
+        finally:
+            Settings.WEB_WORKERS = 3
+        assert 'PROMETHEUS_MULTIPROC_DIR' not in os.environ
+
+    def test_multiple_workers_prepare_metrics_dir(self, multiproc_env, tmp_path):
+        """Plusieurs workers partagent un répertoire de métriques vidé au démarrage"""
+        metrics_dir = tmp_path / 'metrics'
+        metrics_dir.mkdir()
+        (metrics_dir / 'counter_1.db').write_text('stale')
+        (metrics_dir / 'README').write_text('fichier de l\'utilisateur')
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = str(metrics_dir)
+
+        assert prepare_metrics_dir(Settings) == str(metrics_dir)
+        # Seuls les fichiers de métriques sont supprimés
+        assert os.listdir(metrics_dir) == ['README']
+
+    def test_asgi_interface_uses_uvicorn_worker(self):
+        """WEB_INTERFACE=asgi : boucle asyncio par worker"""
+        class AsgiSettings(Settings):
+            WEB_INTERFACE = 'asgi'
+        assert gunicorn_options(AsgiSettings)['worker_class'] == 'uvicorn.workers.UvicornWorker'
+
+    def test_invalid_interface(self):
+        class InvalidSettings(Settings):
+            WEB_INTERFACE = 'cgi'
+        with pytest.raises(ValueError):
+            gunicorn_options(InvalidSettings)
+
+
+def schema_version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+
+class TestMigrateDatabases:
+    """Tests pour les migrations du processus maître"""
+
+    def test_migrates_without_app(self, tmp_path):
+        class SQLiteSettings(Settings):
+            DATABASE_PATH = str(tmp_path / 'data' / 'tasks.db')
+        assert migrate_databases(SQLiteSettings) == SCHEMA_VERSION
+        assert schema_version(SQLiteSettings.DATABASE_PATH) == SCHEMA_VERSION
+
+    def test_migrates_each_shard(self, tmp_path):
+        class ShardSettings(Settings):
+            DATABASE_PATH = str(tmp_path / 'tasks.db')
+            SHARD_COUNT = 2
+        assert migrate_databases(ShardSettings) == SCHEMA_VERSION
+        assert sorted(os.listdir(tmp_path)) == ['tasks-shard000.db', 'tasks-shard001.db']
+
+    def test_memory_backend_has_no_schema(self, tmp_path):
+        class MemorySettings(Settings):
+            STORAGE_BACKEND = 'memory'
+            DATABASE_PATH = str(tmp_path / 'tasks.db')
+        assert migrate_databases(MemorySettings) is None
+        assert os.listdir(tmp_path) == []
@@ -0,0 +1,193 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from app.app import create_app
+from app.config import config
+from app.db import ConnectionPool
+from app.migrations import SCHEMA_VERSION
+from app.shards import HashRing, ShardPool, shard_path
+
+
+def make_app(monkeypatch, tmp_path, **settings):
+    """Application de test dont les bases sont dans tmp_path"""
+    monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+    for name, value in settings.items():
+        monkeypatch.setattr(config['testing'], name, value)
+    return create_app('testing')
+
+
+@pytest.fixture
+def sharded(monkeypatch, tmp_path):
+    """Application avec trois partitions"""
+    app = make_app(monkeypatch, tmp_path, SHARD_COUNT=3)
+    app.extensions['db_init']()
+    yield app
+    app.extensions['task_repository'].close()
+
+
+def as_user(user_id):
+    return {'X-User-Id': user_id}
+
+
+def user_on_shard(ring, shard, prefix='user'):
+    return next('{}{}'.format(prefix, i) for i in range(1000)
+                if ring.shard_for('{}{}'.format(prefix, i)) == shard)
+
+
+class TestHashRing:
+    """Tests pour le hachage cohérent des utilisateurs"""
+
+    def test_spread_and_stable(self):
+        ring = HashRing(4)
+        users = ['user{}'.format(i) for i in range(4000)]
+        counts = [0] * 4
+        for user_id in users:
+            counts[ring.shard_for(user_id)] += 1
+        assert min(counts) > 700
+        assert [ring.shard_for(user_id) for user_id in users] == \
+            [HashRing(4).shard_for(user_id) for user_id in users]
+
+    def test_adding_a_shard_moves_few_users(self):
+        """Seuls les utilisateurs de la nouvelle partition changent de partition"""
+        before, after = HashRing(4), HashRing(5)
+        users = ['user{}'.format(i) for i in range(4000)]
+        moved = [user_id for user_id in users if before.shard_for(user_id) != after.shard_for(user_id)]
+        assert all(after.shard_for(user_id) == 4 for user_id in moved)
+        assert len(moved) < len(users) * 0.3
+
+    def test_invalid_count(self):
+        with pytest.raises(ValueError):
+            HashRing(0)
+
+
+class TestShardPool:
+    def test_idle_connections_bounded_lru(self, tmp_path):
+        config = {'DATABASE_PATH': str(tmp_path / 'tasks.db')}
+        shards = ShardPool(ConnectionPool(config), max_idle=2)
+        connections = {index: shards.acquire(index) for index in range(3)}
+        assert shard_path(config, 1) == str(tmp_path / 'tasks-shard001.db')
+        for index in (0, 1, 2):
+            shards.release(index, connections[index])
+
+        # La connexion de la partition 0, la moins récemment rendue, est fermée
+        with pytest.raises(sqlite3.ProgrammingError):
+            connections[0].execute('SELECT 1')
+        assert shards.acquire(2) is connections[2]
+        assert shards.stats() == {'acquired': 4, 'reused': 1, 'evicted': 1, 'idle': 1,
+                                  'idle_shards': 1, 'max_idle': 2}
+        shards.close_all()
+
+
+class TestShardedApplication:
+    """Tests des listes de tâches par utilisateur"""
+
+    def test_lists_are_per_user(self, sharded):
+        client = sharded.test_client()
+        client.post('/add', data={'task': 'Pain'}, headers=as_user('alice'))
+        client.post('/tasks/bulk', json=['Lait', 'Pain complet'], headers=as_user('bob'))
+
+        alice = client.get('/api/tasks', headers=as_user('alice')).get_json()['tasks']
+        assert [task['task'] for task in alice] == ['Pain']
+        bob = client.get('/api/tasks/search?q=pain', headers=as_user('bob')).get_json()['tasks']
+        assert [task['task'] for task in bob] == ['Pain complet']
+        assert client.get('/api/tasks', headers=as_user('carol')).get_json()['tasks'] == []
+
+    def test_other_users_tasks_are_not_found(self, sharded):
+        client = sharded.test_client()
+        ring = sharded.extensions['task_repository'].ring
+        alice, mallory = user_on_shard(ring, 0, 'alice'), user_on_shard(ring, 0, 'mallory')
+        task_id = client.post('/api/tasks', json={'task': 'Secret'},
+                              headers=as_user(alice)).get_json()['id']
+
+        assert client.get('/api/tasks/{}'.format(task_id), headers=as_user(mallory)).status_code == 404
+        client.get('/complete/{}'.format(task_id), headers=as_user(mallory))
+        client.get('/delete/{}'.format(task_id), headers=as_user(mallory))
+        task = client.get('/api/tasks/{}'.format(task_id), headers=as_user(alice)).get_json()
+        assert task == {'id': task_id, 'task': 'Secret', 'completed': False}
+
+    def test_tasks_stored_in_user_shard(self, sharded, tmp_path):
+        client = sharded.test_client()
+        repository = sharded.extensions['task_repository']
+        for user_id in ('alice', 'bob', 'carol', 'dave'):
+            client.post('/add', data={'task': user_id}, headers=as_user(user_id))
+        for user_id in ('alice', 'bob', 'carol', 'dave'):
+            path = str(tmp_path / 'tasks-shard{:03d}.db'.format(repository.shard_for(user_id)))
+            conn = sqlite3.connect(path)
+            assert conn.execute('SELECT task FROM tasks WHERE user_id = ?',
+                                (user_id,)).fetchall() == [(user_id,)]
+            conn.close()
+        assert not os.path.exists(str(tmp_path / 'tasks.db'))
+
+    def test_invalid_user_id(self, sharded):
+        client = sharded.test_client()
+        assert client.get('/', headers=as_user('a b')).status_code == 400
+        assert client.get('/', headers=as_user('x' * 129)).status_code == 400
+        # Sans en-tête : liste DEFAULT_USER_ID
+        assert client.get('/').status_code == 200
+
+    def test_export_user_list(self, sharded):
+        client = sharded.test_client()
+        client.post('/tasks/bulk', json=['Une', 'Deux'], headers=as_user('alice'))
+        client.post('/add', data={'task': 'Autre'}, headers=as_user('bob'))
+        data = client.get('/export?format=csv', headers=as_user('alice')).data.decode()
+        assert data == 'id,task,completed\n1,Une,0\n2,Deux,0\n'
+
+    def test_health_checks_every_shard(self, sharded):
+        details = sharded.extensions['task_repository'].check()
+        assert details['shard_count'] == 3
+        assert details['schema_version'] == SCHEMA_VERSION
+        health = sharded.test_client().get('/health').get_json()
+        assert health['storage']['shard_count'] == 3
+
+    def test_count_all_sums_every_shard(self, sharded):
+        client = sharded.test_client()
+        client.post('/tasks/bulk', json=['Une', 'Deux'], headers=as_user('alice'))
+        client.post('/add', data={'task': 'Autre'}, headers=as_user('bob'))
+        assert sharded.extensions['task_repository'].count_all() == 3
+
+    def test_requires_sqlite_direct_writes(self, monkeypatch, tmp_path):
+        with pytest.raises(ValueError):
+            make_app(monkeypatch, tmp_path, SHARD_COUNT=2, WRITE_BEHIND_MODE='durable')
+        with pytest.raises(ValueError):
+            make_app(monkeypatch, tmp_path, SHARD_COUNT=2, STORAGE_BACKEND='memory')
+
+
+class TestRebalance:
+    def test_rebalance_after_adding_shards(self, monkeypatch, tmp_path):
+        users = ['user{}'.format(i) for i in range(40)]
+        before = make_app(monkeypatch, tmp_path, SHARD_COUNT=2)
+        before.extensions['db_init']()
+        client = before.test_client()
+        for user_id in users:
+            client.post('/tasks/bulk', json=[user_id + ' a', user_id + ' b'],
+                        headers=as_user(user_id))
+        client.get('/complete/1', headers=as_user('user0'))
+        before.extensions['task_repository'].close()
+
+        after = make_app(monkeypatch, tmp_path, SHARD_COUNT=3)
+        repository = after.extensions['task_repository']
+        moving = [user_id for user_id in users if repository.shard_for(user_id) == 2]
+        runner = after.test_cli_runner()
+
+        result = runner.invoke(args=['rebalance-shards', '--previous', '2', '--dry-run'])
+        assert json.loads(result.output) == {'users': len(moving), 'tasks': 2 * len(moving),
+                                             'dry_run': True}
+        result = runner.invoke(args=['rebalance-shards', '--previous', '2'])
+        assert json.loads(result.output)['tasks'] == 2 * len(moving)
+        result = runner.invoke(args=['rebalance-shards'])
+        assert json.loads(result.output)['users'] == 0
+
+        client = after.test_client()
+        for user_id in users:
+            tasks = client.get('/api/tasks', headers=as_user(user_id)).get_json()['tasks']
+            assert [task['task'] for task in tasks] == [user_id + ' a', user_id + ' b']
+        first = client.get('/api/tasks', headers=as_user('user0')).get_json()['tasks'][0]
+        assert first['completed'] is True
+        # L'index plein texte et le journal de la partition cible suivent
+        mover = moving[0]
+        rv = client.get('/api/tasks/search?q=b', headers=as_user(mover))
+        assert [task['task'] for task in rv.get_json()['tasks']] == [mover + ' b']
+        repository.close()
@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import sqlite3
+
+import pytest
+
+from app.app import create_app
+from app.config import config
+from app.db import ConnectionPool
+from app.maintenance import maintenance_jobs
+from app.migrations import SCHEMA_VERSION, migrate
+from app.snapshot import list_snapshots, restore_snapshot, snapshot_source, take_snapshot
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool({'DATABASE_PATH': str(tmp_path / 'tasks.db')})
+    conn = pool.connect()
+    migrate(conn)
+    conn.executemany('INSERT INTO tasks (task) VALUES (?)',
+                     (('Tâche {}'.format(i),) for i in range(500)))
+    conn.commit()
+    conn.close()
+    return pool
+
+
+def task_names(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute('SELECT task FROM tasks ORDER BY id')]
+    finally:
+        conn.close()
+
+
+class TestSnapshot:
+    """Tests pour les instantanés compressés"""
+
+    def test_snapshot_is_consistent_and_compressed(self, pool, tmp_path):
+        db_path = pool.config['DATABASE_PATH']
+        conn = pool.connect()
+        # Écriture encore dans le WAL : l'instantané la contient
+        conn.execute("INSERT INTO tasks (task) VALUES ('Dans le WAL')")
+        conn.commit()
+        _, details = take_snapshot(conn, db_path, str(tmp_path / 'snapshots'))
+        conn.close()
+
+        assert details['tasks'] == 501
+        assert details['compressed_bytes'] < details['bytes']
+        assert snapshot_source(details['snapshot']) == 'tasks'
+        with gzip.open(details['snapshot']) as compressed:
+            assert compressed.read(16) == b'SQLite format 3\x00'
+        assert os.listdir(str(tmp_path / 'snapshots')) == [os.path.basename(details['snapshot'])]
+
+    def test_keeps_latest_snapshots(self, pool, tmp_path):
+        directory = str(tmp_path / 'snapshots')
+        conn = pool.connect()
+        paths = [take_snapshot(conn, pool.config['DATABASE_PATH'], directory, keep=2)[1]['snapshot']
+                 for _ in range(3)]
+        conn.close()
+        assert list_snapshots(directory, 'tasks') == paths[1:]
+        # Les instantanés d'une autre base ne sont pas confondus
+        assert list_snapshots(directory, 'tasks-shard000') == []
+
+
+class TestRestore:
+    """Tests pour la restauration d'un instantané"""
+
+    def test_restore_replaces_database(self, pool, tmp_path):
+        db_path = pool.config['DATABASE_PATH']
+        conn = pool.connect()
+        _, details = take_snapshot(conn, db_path, str(tmp_path / 'snapshots'))
+        conn.execute("DELETE FROM tasks WHERE id > 10")
+        conn.commit()
+        conn.close()
+
+        result = restore_snapshot(details['snapshot'], db_path)
+        assert result['tasks'] == 500
+        assert result['schema_version'] == SCHEMA_VERSION
+        assert not os.path.exists(db_path + '-wal')
+        assert len(task_names(db_path)) == 500
+
+    def test_older_schema_is_migrated(self, tmp_path):
+        old_path = str(tmp_path / 'old.db')
+        conn = sqlite3.connect(old_path)
+        migrate(conn, target=1)
+        conn.execute("INSERT INTO tasks (task) VALUES ('Ancienne')")
+        conn.commit()
+        _, details = take_snapshot(conn, old_path, str(tmp_path / 'snapshots'))
+        conn.close()
+
+        db_path = str(tmp_path / 'tasks.db')
+        assert restore_snapshot(details['snapshot'], db_path)['schema_version'] == SCHEMA_VERSION
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH 'ancienne'").fetchall() == [(1,)]
+        conn.close()
+
+    def test_invalid_snapshot_keeps_database(self, pool, tmp_path):
+        db_path = pool.config['DATABASE_PATH']
+        source = str(tmp_path / 'tasks-20260101T000000000000Z.snapshot.gz')
+        with gzip.open(source, 'wb') as compressed:
+            compressed.write(b'pas une base SQLite' * 100)
+        with pytest.raises(sqlite3.DatabaseError):
+            restore_snapshot(source, db_path)
+        assert len(task_names(db_path)) == 500
+        assert not os.path.exists(db_path + '.restore')
+
+
+class TestSnapshotCommands:
+    def test_snapshot_then_restore(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+        app = create_app('testing')
+        client = app.test_client()
+        client.post('/tasks/bulk', json=['Une', 'Deux'])
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(args=['snapshot-tasks'])
+        snapshot = json.loads(result.output)
+        assert snapshot['tasks'] == 2
+        assert os.path.dirname(snapshot['snapshot']) == str(tmp_path / 'snapshots')
+
+        client.post('/add', data={'task': 'Après'})
+        result = runner.invoke(args=['restore-snapshot'])
+        assert result.exit_code != 0
+        result = runner.invoke(args=['restore-snapshot', '--yes'])
+        assert json.loads(result.output)['tasks'] == 2
+        tasks = client.get('/api/tasks').get_json()['tasks']
+        assert [task['task'] for task in tasks] == ['Une', 'Deux']
+        app.extensions['task_repository'].close()
+
+    def test_sharded_snapshot(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(config['testing'], 'DATABASE_PATH', str(tmp_path / 'tasks.db'))
+        monkeypatch.setattr(config['testing'], 'SHARD_COUNT', 2)
+        app = create_app('testing')
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['snapshot-tasks', '--output-dir', str(tmp_path / 'out')])
+        names = [snapshot_source(json.loads(line)['snapshot']) for line in result.output.splitlines()]
+        assert names == ['tasks-shard000', 'tasks-shard001']
+
+        # Instantané d'une base inconnue
+        other = tmp_path / 'out' / 'other-20260101T000000000000Z.snapshot.gz'
+        other.write_bytes(b'')
+        result = runner.invoke(args=['restore-snapshot', '--yes', str(other)])
+        assert 'Aucune base ne correspond' in result.output
+        app.extensions['task_repository'].close()
+
+    def test_maintenance_job(self):
+        settings = {key: getattr(config['testing'], key) for key in dir(config['testing'])
+                    if key.isupper()}
+        assert 'snapshot' not in [name for name, _, _ in maintenance_jobs(settings)]
+        settings['MAINTENANCE_SNAPSHOT_INTERVAL'] = 86400
+        assert 'snapshot' in [name for name, _, _ in maintenance_jobs(settings)]
@@ -0,0 +1,112 @@
+import io
+import json
+
+from app.memory import MemoryTaskRepository
+from app.transfer import export_chunks, iter_lines, parse_csv, parse_ndjson
+
+
+class TestFormats:
+    """Tests pour l'encodage et l'analyse des formats d'export"""
+
+    def test_ndjson_round_trip(self):
+        chunks = export_chunks([[(1, 'Une "tâche"', 1), (2, 'Deux\nlignes', 0)]], 'ndjson')
+        data = b''.join(chunks)
+        assert [json.loads(line) for line in data.splitlines()] == [
+            {'id': 1, 'task': 'Une "tâche"', 'completed': True},
+            {'id': 2, 'task': 'Deux\nlignes', 'completed': False}]
+        assert list(parse_ndjson(io.BytesIO(data))) == [
+            (1, 'Une "tâche"', True), (2, 'Deux\nlignes', False)]
+
+    def test_csv_round_trip(self):
+        data = b''.join(export_chunks([[(1, 'a, b', 1)], [(2, 'Deux\nlignes', 0)]], 'csv'))
+        assert data.startswith(b'id,task,completed\n1,"a, b",1\n')
+        assert list(parse_csv(io.BytesIO(data))) == [
+            (2, 'a, b', True), (4, 'Deux\nlignes', False)]
+
+    def test_invalid_lines(self):
+        """Lignes illisibles ou vides signalées avec leur numéro"""
+        data = b'"Seule"\n\n{"task": " "}\npas du json\n{"task": "T", "completed": "peut-etre"}\n'
+        assert list(parse_ndjson(io.BytesIO(data))) == [
+            (1, 'Seule', False), (3, None, False), (4, None, False), (5, None, False)]
+
+    def test_lines_across_chunks(self):
+        data = b'abc\ndefgh\nij'
+        assert list(iter_lines(io.BytesIO(data), chunk_size=4)) == [b'abc\n', b'defgh\n', b'ij']
+
+
+class TestMemoryTransfer:
+    def test_export_and_import_many(self):
+        repository = MemoryTaskRepository(object())
+        assert repository.import_many([('A', True), ('B', False), ('C', False)]) == [1, 2, 3]
+        repository.delete(2)
+        assert list(repository.export(batch_size=1)) == [[(1, 'A', True)], [(3, 'C', False)]]
+
+
+class TestTransferRoutes:
+    """Tests des routes /export et /import"""
+
+    def test_export_ndjson(self, client):
+        client.post('/tasks/bulk', json=['Une', 'Deux'])
+        client.get('/complete/1')
+        rv = client.get('/export')
+        assert rv.status_code == 200
+        assert rv.mimetype == 'application/x-ndjson'
+        assert rv.headers.get('Content-Length') is None
+        assert rv.data == (b'{"id":1,"task":"Une","completed":true}\n'
+                           b'{"id":2,"task":"Deux","completed":false}\n')
+
+    def test_export_unknown_format(self, client):
+        assert client.get('/export?format=xml').status_code == 400
+
+    def test_import_csv_in_batches(self, client):
+        client.application.config['IMPORT_BATCH_SIZE'] = 2
+        data = 'task,completed\nA,1\nB,0\n,1\nC,true\n'.encode()
+        rv = client.post('/import', data=data, content_type='text/csv')
+        assert rv.status_code == 201
+        assert rv.get_json() == {'count': 3, 'batches': 2, 'invalid_count': 1, 'invalid': [4]}
+        exported = client.get('/export?format=csv').data.decode()
+        assert exported == 'id,task,completed\n1,A,1\n2,B,0\n3,C,1\n'
+
+    def test_import_export_round_trip(self, client):
+        client.post('/tasks/bulk', json=['Tâche {}'.format(i) for i in range(30)])
+        exported = client.get('/export').data
+        rv = client.post('/import', data=exported, content_type='application/x-ndjson')
+        assert rv.get_json()['count'] == 30
+        assert client.get('/api/tasks/31').get_json()['task'] == 'Tâche 0'
+
+    def test_import_keeps_search_and_events(self, client):
+        """Les triggers remplacés le temps d'un lot sont appliqués puis restaurés"""
+        app = client.application
+        conn = app.extensions['db_pool'].connect()
+        list_triggers = "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"
+        triggers = conn.execute(list_triggers).fetchall()
+        client.post('/import', data=b'"Acheter du pain"\n"Lire"\n',
+                    content_type='application/x-ndjson')
+        client.post('/add', data={'task': 'Pain perdu'})
+        try:
+            assert conn.execute(list_triggers).fetchall() == triggers
+            assert conn.execute("SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH 'pain' "
+                                "ORDER BY rowid").fetchall() == [(1,), (3,)]
+        finally:
+            conn.close()
+        assert [event[1:3] for event in app.extensions['task_repository'].events(0)] == [
+            ('added', 1), ('added', 2), ('added', 3)]
+
+    def test_import_csv_without_task_column(self, client):
+        rv = client.post('/import?format=csv', data=b'id,text\n1,a\n')
+        assert rv.status_code == 400
+
+
+class TestTransferCommands:
+    def test_export_import_commands(self, client, tmp_path):
+        runner = client.application.test_cli_runner()
+        source = tmp_path / 'tasks.csv'
+        source.write_text('task\nUne\nDeux\n', encoding='utf-8')
+        result = runner.invoke(args=['import-tasks', str(source)])
+        assert result.exit_code == 0
+        assert json.loads(result.output)['count'] == 2
+
+        output = tmp_path / 'export.ndjson'
+        result = runner.invoke(args=['export-tasks', '-o', str(output)])
+        assert result.exit_code == 0
+        assert output.read_bytes().count(b'\n') == 2
@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.writer import WriteBehindWriter
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Base temporaire avec une table tasks minimale"""
+    path = str(tmp_path / 'tasks.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE tasks (id INTEGER PRIMARY KEY, task TEXT NOT NULL)')
+    conn.commit()
+    conn.close()
+    return path
+
+
+def make_writer(db_path, **kwargs):
+    return WriteBehindWriter(
+        lambda: sqlite3.connect(db_path, check_same_thread=False), **kwargs)
+
+
+def insert(task):
+    return lambda conn: conn.execute('INSERT INTO tasks (task) VALUES (?)', (task,)).lastrowid
+
+
+def count_tasks(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+    conn.close()
+    return count
+
+
+class TestWriteBehindWriter:
+    """Tests pour le thread d'écriture à validation groupée"""
+
+    def test_operation_result_returned(self, db_path):
+        """Le Future reçoit le résultat de l'opération une fois validée"""
+        writer = make_writer(db_path)
+        assert writer.submit(insert('one')).result(5) == 1
+        assert count_tasks(db_path) == 1
+        writer.stop()
+
+    def test_concurrent_submissions_grouped(self, db_path):
+        """Les opérations de plusieurs threads partagent un COMMIT"""
+        writer = make_writer(db_path, max_batch=50, max_delay=0.05)
+        futures = []
+        lock = threading.Lock()
+
+        def submit(i):
+            future = writer.submit(insert('task {}'.format(i)))
+            with lock:
+                futures.append(future)
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(future.result(5) for future in futures) == list(range(1, 21))
+        stats = writer.stats()
+        assert stats['operations'] == 20
+        assert stats['batches'] < 20
+        writer.stop()
+
+    def test_failed_operation_isolated(self, db_path):
+        """Une opération en erreur est annulée sans affecter le lot"""
+        writer = make_writer(db_path, max_delay=0.05)
+
+        def failing(conn):
+            conn.execute("INSERT INTO tasks (task) VALUES ('partial')")
+            conn.execute('INSERT INTO missing VALUES (1)')
+
+        first = writer.submit(insert('kept'))
+        failed = writer.submit(failing)
+        last = writer.submit(insert('also kept'))
+        assert first.result(5) == 1
+        with pytest.raises(sqlite3.OperationalError):
+            failed.result(5)
+        assert last.result(5) is not None
+        assert count_tasks(db_path) == 2
+        assert writer.stats()['failed'] == 1
+        writer.stop()
+
+    def test_on_commit_runs_before_result(self, db_path):
+        """on_commit est appelé après la validation, avant la résolution"""
+        writer = make_writer(db_path)
+        seen = []
+        future = writer.submit(insert('notified'),
+                               lambda task_id: seen.append((task_id, count_tasks(db_path))))
+        assert future.result(5) == 1
+        assert seen == [(1, 1)]
+        writer.stop()
+
+    def test_stop_flushes_pending_operations(self, db_path):
+        """L'arrêt valide les opérations encore en file"""
+        writer = make_writer(db_path, max_delay=1.0)
+        futures = [writer.submit(insert('pending {}'.format(i))) for i in range(5)]
+        writer.stop()
+        assert all(future.done() for future in futures)
+        assert count_tasks(db_path) == 5
+
+    def test_restarted_after_fork(self, db_path):
+        """Un thread d'écriture hérité d'un autre processus est recréé"""
+        writer = make_writer(db_path)
+        writer.submit(insert('parent')).result(5)
+        parent_thread = writer._thread
+        writer._pid = -1
+        writer.submit(insert('child')).result(5)
+        assert writer._thread is not parent_thread
+        writer.stop()